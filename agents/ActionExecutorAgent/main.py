@@ -1,7 +1,21 @@
-import time, json
-from agents._lib.memory import find_pending_tasks, claim_task, complete_task, log_event
+import os, json, queue, socket, threading, multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from agents._lib.memory import LeaseHeartbeat, claim_tasks, complete_tasks, log_event, log_events
 
 AGENT = "Executor"
+WORKER = f"{AGENT}-{socket.gethostname()}-{os.getpid()}"  # claimed_by; several executors can share the role
+# tasks claimed per round trip; their leases (MCP_TASK_LEASE) are renewed until they complete,
+# so only a dead executor's tasks go back to pending
+BATCH = int(os.getenv("EXECUTOR_BATCH", "20"))
+WORKERS = int(os.getenv("EXECUTOR_WORKERS", "8"))  # handler threads
+INFLIGHT = int(os.getenv("EXECUTOR_INFLIGHT", str(2 * WORKERS)))  # claimed but not yet completed, at most
+LIMITS = json.loads(os.getenv("EXECUTOR_LIMITS", "{}"))  # task_type -> max running at once, e.g. {"call_api": 2}
+# CPU-bound task types run in a pool of EXECUTOR_PROCESSES processes instead of the threads;
+# their handlers must be module-level functions (the processes are spawned and import them)
+PROCESSES = int(os.getenv("EXECUTOR_PROCESSES", "0"))
+PROCESS_TYPES = {t.strip() for t in os.getenv("EXECUTOR_PROCESS_TYPES", "").split(",") if t.strip()}
 
 def handle_publish_artifact(task):
     src = task.get("payload", {}).get("source_key")
@@ -14,34 +28,122 @@ HANDLERS = {
     "publish_artifact": handle_publish_artifact
 }
 
-def loop():
-    log_event(AGENT, "lifecycle", {"status": "starting"})
-    while True:
-        # Look for work assigned to Executor
-        tasks = find_pending_tasks(for_role="Executor", limit=20)
-        for rec in tasks:
-            key = rec.get("key")
-            data = rec.get("data", {})
-            task_type = data.get("task_type")
-            claimed = claim_task(key, claimer=AGENT)
-            if not claimed:
-                continue  # someone else got it
-
-            handler = HANDLERS.get(task_type)
-            if not handler:
-                complete_task(key, {"status":"skipped","reason":"no_handler"})
-                continue
+class Executor:
+    """
+    Claims tasks for `role` ahead of execution and runs them on a pool: the claim loop
+    keeps up to `inflight` tasks claimed but unfinished, handlers run on `workers` threads
+    (or `processes` processes for `process_types`) with at most limits[task_type] of a
+    type running at once, and a completer thread sends results back in batches.
+    """
+
+    def __init__(self, role: str = AGENT, worker: str = WORKER, handlers: dict = HANDLERS, workers: int = WORKERS,
+                 inflight: int = INFLIGHT, limits: dict = LIMITS, processes: int = PROCESSES,
+                 process_types: set = PROCESS_TYPES, batch: int = BATCH, claim_wait: float = 25):
+        self.role, self.worker, self.handlers, self.limits = role, worker, handlers, limits
+        self.inflight, self.batch, self.claim_wait = max(1, inflight), batch, claim_wait
+        self.process_types = process_types if processes else set()
+        self.threads = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="handler")
+        # spawn, not fork: the claim loop, lease keeper and completer threads (and their locks
+        # and pooled sockets) would be copied mid-use into every forked worker
+        self.procs = (ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context("spawn"))
+                      if processes else None)
+        self.lock = threading.Lock()
+        self.running, self.waiting = {}, {}  # task_type -> count running, deque of tasks held by its limit
+        self.cond = threading.Condition()
+        self.outstanding = 0  # claimed, not yet completed
+        self.done = queue.Queue()  # (key, result, event or None); None ends the completer
+        self.hb = None
+
+    def _start(self, rec: dict) -> None:
+        key, task_type = rec["key"], rec["data"].get("task_type")
+        if task_type not in self.handlers:
+            self.done.put((key, {"status":"skipped","reason":"no_handler"}, None))
+            return
+        with self.lock:
+            if self.running.get(task_type, 0) >= self.limits.get(task_type, float("inf")):
+                self.waiting.setdefault(task_type, deque()).append(rec)
+                return
+            self.running[task_type] = self.running.get(task_type, 0) + 1
+        self._submit(rec)
+
+    def _submit(self, rec: dict) -> None:
+        task_type = rec["data"].get("task_type")
+        pool = self.procs if task_type in self.process_types else self.threads
+        pool.submit(self.handlers[task_type], rec["data"]).add_done_callback(partial(self._finished, rec))
 
+    def _finished(self, rec: dict, fut) -> None:
+        key, task_type = rec["key"], rec["data"].get("task_type")
+        try:
+            result = fut.result()
+            self.done.put((key, result, ("exec", {"task_key": key, "task_type": task_type, "result": result})))
+        except Exception as e:
+            self.done.put((key, {"status":"error","error":str(e)}, ("error", {"task_key": key, "err": str(e)})))
+        with self.lock:  # hand the slot to the next task of this type, if one is held back
+            held = self.waiting.get(task_type)
+            nxt = held.popleft() if held else None
+            if nxt is None:
+                self.running[task_type] -= 1
+        if nxt is not None:
+            self._submit(nxt)
+
+    def _complete_loop(self) -> None:
+        while True:
+            items = [self.done.get()]
+            while items[-1] is not None and len(items) < self.batch:
+                try:
+                    items.append(self.done.get_nowait())
+                except queue.Empty:
+                    break
+            last = items[-1] is None
+            items = [x for x in items if x is not None]
             try:
-                result = handler(claimed)
-                complete_task(key, result)
-                log_event(AGENT, "exec", {"task_key": key, "task_type": task_type, "result": result})
+                # a task whose lease was lost was handed to another worker; its result is theirs to write
+                results = [(k, res) for k, res, _ in items if k not in self.hb.lost]
+                if results:
+                    complete_tasks(results, claimer=self.worker)
+                log_events(AGENT, [ev for _, _, ev in items if ev])
             except Exception as e:
-                complete_task(key, {"status":"error","error":str(e)})
-                log_event(AGENT, "error", {"task_key": key, "err": str(e)})
+                print(f"[{AGENT}] complete failed: {e}", flush=True)
+            for k, _, _ in items:
+                self.hb.discard(k)
+            with self.cond:
+                self.outstanding -= len(items)
+                self.cond.notify_all()
+            if last:
+                return
+
+    def run(self, stop: threading.Event | None = None) -> None:
+        """Claim and run tasks until `stop` is set, then finish the ones in flight."""
+        stop = stop or threading.Event()
+        completer = threading.Thread(target=self._complete_loop, daemon=True)
+        with LeaseHeartbeat(self.worker) as self.hb:
+            completer.start()
+            while not stop.is_set():
+                with self.cond:
+                    while self.outstanding >= self.inflight and not stop.is_set():
+                        self.cond.wait(1)
+                    free = self.inflight - self.outstanding
+                if stop.is_set():
+                    break
+                # blocks up to claim_wait for the first task; a backlog comes back min(BATCH, free) at a time
+                batch = claim_tasks(self.role, min(self.batch, free), claimer=self.worker, wait=self.claim_wait)
+                with self.cond:
+                    self.outstanding += len(batch)
+                for rec in batch:
+                    self.hb.add(rec["key"])
+                    self._start(rec)
+            with self.cond:
+                while self.outstanding:
+                    self.cond.wait(1)
+            self.done.put(None)
+            completer.join()
+        self.threads.shutdown()
+        if self.procs:
+            self.procs.shutdown()
 
-        # steady cadence
-        time.sleep(5)
+def loop():
+    log_event(AGENT, "lifecycle", {"status": "starting"})
+    Executor().run()
 
 if __name__ == "__main__":
     loop()
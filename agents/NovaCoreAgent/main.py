@@ -1,39 +1,57 @@
-import time
-from agents._lib.memory import mem_search, enqueue_task, log_event
+import os, time
+from agents._lib.memory import mem_query, mem_watch_batches, enqueue_task, log_event, QueueFull
 
 AGENT = "NovaCore"
-
-def loop():
-    log_event(AGENT, "lifecycle", {"status": "starting"})
-    seen = set()
-
-    while True:
-        # Look for fresh artifacts from PerplexityFetcher
-        artifacts = mem_search('"agent":"PerplexityFetcher","type":"artifact"', limit=30)
-        created = 0
-        for rec in artifacts:
-            key = rec.get("key")
-            if not key or key in seen: 
-                continue
-            seen.add(key)
-
-            # Turn artifacts into executable tasks (placeholder: publish/store)
-            enqueue_task(
+ARTIFACTS = {"agent": "PerplexityFetcher", "type": "artifact"}
+# when the Executor queue is saturated: block (wait for it to drain), shed or sample
+ON_FULL = os.getenv("NOVACORE_ON_FULL", "block")
+
+def plan(artifacts):
+    created = skipped = 0
+    for rec in artifacts:
+        key = rec.get("key")
+        if not key:
+            continue
+
+        # Turn artifacts into executable tasks (placeholder: publish/store). The dedupe key
+        # is kept by the memory server, so a restarted or second planner skips artifacts
+        # already planned instead of queueing them again; one dropped under backpressure
+        # holds no dedupe key, so a later re-plan can still queue it.
+        try:
+            queued = enqueue_task(
                 task_type="publish_artifact",
                 payload={"source_key": key, "artifact": rec.get("data")},
                 assigned_to="Executor",
-                created_by=AGENT
+                created_by=AGENT,
+                dedupe_key=f"publish_artifact:{key}",
+                on_full=ON_FULL,
             )
+        except QueueFull:
+            queued = None
+        if queued:
             created += 1
+        else:
+            skipped += 1
 
-        if created:
-            log_event(AGENT, "planner", {"created_tasks": created})
+    if created or skipped:
+        log_event(AGENT, "planner", {"created_tasks": created, "skipped": skipped})
+
+def loop():
+    log_event(AGENT, "lifecycle", {"status": "starting"})
+    last_beat = 0.0
+
+    # Take the feed offset before catching up, so nothing written in between is missed
+    _, offset = next(mem_watch_batches(ARTIFACTS, wait=0))
+    plan(mem_query(ARTIFACTS, limit=30))
+
+    # Then wake up on new artifacts instead of polling; empty polls return every 25s
+    for artifacts, offset in mem_watch_batches(ARTIFACTS, after=offset, wait=25):
+        plan(artifacts)
 
         # Heartbeat every 30s
-        if int(time.time()) % 30 == 0:
+        if time.time() - last_beat >= 30:
             log_event(AGENT, "heartbeat", {"alive": True})
-
-        time.sleep(5)
+            last_beat = time.time()
 
 if __name__ == "__main__":
     loop()
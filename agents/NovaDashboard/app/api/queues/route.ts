@@ -0,0 +1,16 @@
+import { NextResponse } from 'next/server';
+import axios from 'axios';
+
+export const dynamic = 'force-dynamic';
+
+// Per-role task queue depth and drain rate, from the memory server's memory.queue_stats
+export async function GET() {
+  const memoryUrl = process.env.MCP_MEMORY_URL || 'http://localhost:8000';
+  try {
+    const response = await axios.post(`${memoryUrl}/tools/memory.queue_stats`, {}, { timeout: 5000 });
+    return NextResponse.json({ roles: response.data.roles || {}, lastUpdated: new Date().toISOString() });
+  } catch (error) {
+    console.error('Error fetching queue stats:', error);
+    return NextResponse.json({ roles: {}, error: 'unavailable', lastUpdated: new Date().toISOString() });
+  }
+}
@@ -6,6 +6,7 @@ export const dynamic = 'force-dynamic';
 const redis = Redis.fromEnv();  
 
 const MetricsChart = NextDynamic(() => import('./components/MetricsChart'));  
+const QueueDepth = NextDynamic(() => import('@/components/QueueDepth'));  
 
 export default async function Home() {  
   let streams = 1;  
@@ -44,6 +45,8 @@ export default async function Home() {
       </div>  
       <h2 className="text-xl font-bold mb-4">Metrics Overview</h2>  
       <MetricsChart chartData={chartData} />  
+      <h2 className="text-xl font-bold my-4">Task Queues</h2>  
+      <QueueDepth />  
     </main>  
   );  
 }  
@@ -1 +1,83 @@
-export default function QueueDepth() { return <div>Queue Depth: [TODO]</div> }
\ No newline at end of file
+'use client';
+
+import { useEffect, useState } from 'react';
+
+type RoleStats = {
+  pending: number;
+  claimed: number;
+  blocked: number;
+  done_last_min: number;
+  drain_per_min: number;
+  eta_s: number | null;
+  high: number;
+  low: number;
+  saturated: boolean;
+};
+
+function eta(s: number | null, pending: number) {
+  if (!pending) return '-';
+  if (s === null) return 'stalled';
+  return s < 60 ? `${Math.round(s)}s` : s < 3600 ? `${Math.round(s / 60)}m` : `${(s / 3600).toFixed(1)}h`;
+}
+
+export default function QueueDepth({ interval = 5000 }: { interval?: number }) {
+  const [roles, setRoles] = useState<Record<string, RoleStats>>({});
+  const [error, setError] = useState<string | null>(null);
+
+  useEffect(() => {
+    const load = async () => {
+      try {
+        const js = await (await fetch('/api/queues', { cache: 'no-store' })).json();
+        setRoles(js.roles || {});
+        setError(js.error || null);
+      } catch (e) {
+        setError('unavailable');
+      }
+    };
+    load();
+    const id = setInterval(load, interval);
+    return () => clearInterval(id);
+  }, [interval]);
+
+  const names = Object.keys(roles).sort();
+  return (
+    <div className="p-4 border rounded">
+      <h2 className="mb-2">Queue Depth{error && <span className="ml-2 text-sm text-red-600">({error})</span>}</h2>
+      {names.length === 0 ? (
+        <p className="text-sm text-gray-500">No queued tasks.</p>
+      ) : (
+        <table className="w-full text-sm">
+          <thead>
+            <tr className="text-left">
+              <th>Role</th><th>Pending</th><th>Claimed</th><th>Blocked</th>
+              <th className="w-1/4">vs high watermark</th><th>Drain/min</th><th>Done last min</th><th>ETA</th><th></th>
+            </tr>
+          </thead>
+          <tbody>
+            {names.map((name) => {
+              const st = roles[name];
+              const fill = Math.min(100, (st.pending / Math.max(1, st.high)) * 100);
+              return (
+                <tr key={name} className="border-t">
+                  <td>{name}</td>
+                  <td>{st.pending}</td>
+                  <td>{st.claimed}</td>
+                  <td>{st.blocked}</td>
+                  <td>
+                    <div className="h-2 bg-gray-200 rounded" title={`${st.pending} / ${st.high} (low ${st.low})`}>
+                      <div className={`h-2 rounded ${st.saturated ? 'bg-red-500' : 'bg-[#8884d8]'}`} style={{ width: `${fill}%` }} />
+                    </div>
+                  </td>
+                  <td>{st.drain_per_min}</td>
+                  <td>{st.done_last_min}</td>
+                  <td>{eta(st.eta_s, st.pending)}</td>
+                  <td>{st.saturated && <span className="px-2 rounded bg-red-100 text-red-700">saturated</span>}</td>
+                </tr>
+              );
+            })}
+          </tbody>
+        </table>
+      )}
+    </div>
+  );
+}
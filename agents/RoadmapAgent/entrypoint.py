@@ -14,10 +14,20 @@ try:
 except Exception:
     telemetry = None
 
+transport = None
+try:
+    from agents._lib import transport as _transport  # pooled keep-alive session, shared with telemetry
+    transport = _transport
+except Exception:
+    transport = None  # e.g. requests missing: one urllib connection per post
+
 MEM_URL = os.environ.get("NOVA_MEM_URL", "https://novaosmem.onrender.com").rstrip("/")
 
 def _post_mem(data: dict):
     try:
+        if transport:
+            transport.post_json(f"{MEM_URL}/tools/memory.write", {"data": data}, timeout=10)
+            return
         req = urllib.request.Request(
             f"{MEM_URL}/tools/memory.write",
             data=json.dumps({"data": data}).encode("utf-8"),
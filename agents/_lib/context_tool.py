@@ -1,13 +1,12 @@
-import os, requests
+import os
+from agents._lib import transport
 
 MEMORY_URL = os.environ.get("MEMORY_API_URL")  # Set this on Render for services that need memory
 
 def fetch_context(task_text: str, k: int = 8):
     if not MEMORY_URL:
         return []
-    r = requests.get(f"{MEMORY_URL}/search", params={"q": task_text, "k": k}, timeout=30)
-    r.raise_for_status()
-    return r.json()
+    return transport.get_json(f"{MEMORY_URL}/search", params={"q": task_text, "k": k}, timeout=30)
 
 def learn(title: str, body: str, tags=None):
     if not MEMORY_URL:
@@ -19,6 +18,5 @@ def learn(title: str, body: str, tags=None):
         "content": body,
         "metadata": {"tags": tags or []}
     }
-    r = requests.post(f"{MEMORY_URL}/upsert", json=payload, timeout=60)
-    r.raise_for_status()
-    return r.json()
+    # an upsert by doc_id: safe to retry
+    return transport.post_json(f"{MEMORY_URL}/upsert", payload, timeout=60, idempotent=True)
@@ -1,38 +1,172 @@
-import os, time, uuid, json, requests
-from typing import Any, Dict, List, Optional
+import os, time, uuid, json, threading, requests
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from agents._lib import memory_backend
 
-MCP_MEMORY_URL = os.getenv("MCP_MEMORY_URL")
+# MEMORY_BACKEND=http (MCP_MEMORY_URL) | redis | embedded, see memory_backend.py
 
-def _url(path: str) -> str:
-    if not MCP_MEMORY_URL:
-        raise RuntimeError("MCP_MEMORY_URL not set")
-    return MCP_MEMORY_URL.rstrip("/") + path
+def _call(tool: str, body: Dict[str, Any], timeout: float = 10) -> Dict[str, Any]:
+    return memory_backend.get().call(tool, body, timeout=timeout)
 
 def mem_write(data: Dict[str, Any], key: Optional[str] = None) -> str:
     """Write/overwrite a record. Returns the key."""
     payload = {"data": data}
     if key:
         payload["key"] = key
-    r = requests.post(_url("/tools/memory.write"), json=payload, timeout=10)
-    r.raise_for_status()
-    return r.json().get("key")
+    return _call("memory.write", payload).get("key")
+
+def mem_write_batch(records: List[Dict[str, Any]], atomic: bool = False) -> List[str]:
+    """Write many records in one round trip. Each record is {"data": ..., "key": optional}.
+    Returns the keys in input order."""
+    js = _call("memory.write_batch", {"records": records, "atomic": atomic}, timeout=30)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.write_batch failed: {js.get('error')}")
+    return js.get("keys", [])
 
 def mem_read(key: str) -> Optional[Dict[str, Any]]:
-    r = requests.post(_url("/tools/memory.read"), json={"key": key}, timeout=10)
-    if r.ok:
-        js = r.json()
-        if js.get("ok"):
-            return {"key": key, "data": js["data"], "ts": js.get("ts")}
+    try:
+        js = _call("memory.read", {"key": key})
+    except requests.HTTPError:
+        return None
+    if js.get("ok"):
+        return {"key": key, "data": js["data"], "ts": js.get("ts")}
     return None
 
+def mem_read_many(keys: List[str], chunk: int = 500) -> List[Optional[Dict[str, Any]]]:
+    """Read many keys, one round trip per `chunk`. Results follow `keys`; missing keys are None."""
+    out: List[Optional[Dict[str, Any]]] = []
+    for i in range(0, len(keys), chunk):
+        js = _call("memory.read_many", {"keys": keys[i:i + chunk]}, timeout=15)
+        if not js.get("ok"):
+            raise RuntimeError(f"memory.read_many failed: {js.get('error')}")
+        out.extend(js["results"])
+    return out
+
 def mem_search(q: str, limit: int = 50) -> List[Dict[str, Any]]:
-    r = requests.post(_url("/tools/memory.search"), json={"q": q, "limit": limit}, timeout=15)
-    r.raise_for_status()
-    return r.json().get("results", [])
+    return _call("memory.search", {"q": q, "limit": limit}, timeout=15).get("results", [])
+
+def mem_scan(q: str, limit: int = 50, cursor: Optional[str] = None,
+             budget: Optional[int] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """Substring search over the whole index, newest first, until `limit` hits or the
+    server's scan budget is spent. Returns (results, cursor); pass cursor back to resume,
+    None means the index is exhausted."""
+    body = {"q": q, "limit": limit, "scan": True, "cursor": cursor, "budget": budget}
+    js = _call("memory.search", body, timeout=30)
+    return js.get("results", []), js.get("cursor")
+
+def mem_fts(q: str, op: str = "and", limit: int = 20) -> List[Dict[str, Any]]:
+    """Ranked term search (needs MCP_FTS=1 on the server). op is "and" or "or"."""
+    js = _call("memory.fts", {"q": q, "op": op, "limit": limit}, timeout=15)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.fts failed: {js.get('error')}")
+    return js.get("results", [])
+
+def mem_query(where: Dict[str, Any], limit: int = 20, order: str = "desc", wait: float = 0) -> List[Dict[str, Any]]:
+    """Exact-match query on indexed fields (type, status, assigned_to, agent, topic, task_type).
+    With `wait`, the server holds an empty result until a matching record is written or
+    `wait` seconds pass."""
+    js = _call("memory.query", {"where": where, "limit": limit, "order": order, "wait": wait}, timeout=wait + 15)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.query failed: {js.get('error')}")
+    return js.get("results", [])
+
+def mem_watch_batches(where: Dict[str, Any], after: str = "$", wait: float = 25,
+                      limit: int = 100) -> Iterator[Tuple[List[Dict[str, Any]], str]]:
+    """Long-poll memory.watch forever. Yields (records, offset) per poll, including empty
+    polls so callers can do periodic work; resume later by passing offset as `after`."""
+    while True:
+        try:
+            js = _call("memory.watch", {"where": where, "after": after, "wait": wait, "limit": limit},
+                       timeout=wait + 15)
+        except requests.RequestException as e:
+            print(f"[memory] watch failed, retrying: {e}", flush=True)
+            time.sleep(2)
+            continue
+        if not js.get("ok"):
+            raise RuntimeError(f"memory.watch failed: {js.get('error')}")
+        after = js["offset"]
+        yield js.get("results", []), after
+
+def mem_watch(where: Dict[str, Any], after: str = "$", wait: float = 25) -> Iterator[Dict[str, Any]]:
+    """Yield records matching `where` (indexed fields) as they are written. Each record
+    carries its feed "offset"."""
+    for results, _ in mem_watch_batches(where, after=after, wait=wait):
+        yield from results
+
+# -------- Task helpers --------
 
-# -------- Task helpers (naive, single-claimer) --------
+# producer backpressure (enqueue_task on_full): how often a role's saturation is
+# re-checked, how long "block" waits, and the 1-in-N kept by "sample"
+QUEUE_CHECK_INTERVAL = float(os.getenv("NOVA_QUEUE_CHECK_INTERVAL", "1"))
+QUEUE_BLOCK_MAX = float(os.getenv("NOVA_QUEUE_BLOCK_MAX", "300"))
+QUEUE_SAMPLE = int(os.getenv("NOVA_QUEUE_SAMPLE", "10"))
+_queue_checked: Dict[str, Tuple[float, bool]] = {}
+_queue_sampled: Dict[str, int] = {}
+_queue_lock = threading.Lock()
 
-def enqueue_task(task_type: str, payload: Dict[str, Any], assigned_to: str, created_by: str) -> str:
+class QueueFull(RuntimeError):
+    """enqueue_task(on_full="block") gave up: the role stayed saturated for QUEUE_BLOCK_MAX s."""
+
+def queue_stats(roles: Optional[List[str]] = None, recount: bool = False) -> Dict[str, Dict[str, Any]]:
+    """{role: {pending, claimed, blocked, done_last_min, drain_per_min, eta_s, high, low,
+    saturated}}; every role with queued tasks by default."""
+    js = _call("memory.queue_stats", {"roles": roles, "recount": recount}, timeout=30)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.queue_stats failed: {js.get('error')}")
+    return js["roles"]
+
+def _saturated(role: str, fresh: bool = False) -> bool:
+    # one queue_stats call per role per QUEUE_CHECK_INTERVAL, shared by the process's threads
+    now = time.monotonic()
+    with _queue_lock:
+        hit = _queue_checked.get(role)
+    if fresh or hit is None or now - hit[0] >= QUEUE_CHECK_INTERVAL:
+        hit = (now, bool(queue_stats([role])[role]["saturated"]))
+        with _queue_lock:
+            _queue_checked[role] = hit
+    return hit[1]
+
+def _admit(role: str, on_full: str) -> bool:
+    """Backpressure for one enqueue: False drops the task, QueueFull if blocking timed out."""
+    if on_full not in ("block", "shed", "sample"):
+        raise ValueError(f"on_full must be block, shed or sample, not {on_full!r}")
+    if not _saturated(role):
+        return True
+    if on_full == "shed":
+        return False
+    if on_full == "sample":
+        with _queue_lock:
+            n = _queue_sampled[role] = _queue_sampled.get(role, 0) + 1
+        return (n - 1) % max(1, QUEUE_SAMPLE) == 0
+    deadline = time.monotonic() + QUEUE_BLOCK_MAX
+    while _saturated(role):
+        if time.monotonic() >= deadline:
+            raise QueueFull(f"{role}: queue saturated for {QUEUE_BLOCK_MAX:.0f}s")
+        time.sleep(QUEUE_CHECK_INTERVAL)
+    return True
+
+def enqueue_task(task_type: str, payload: Dict[str, Any], assigned_to: str, created_by: str,
+                 priority: Optional[str] = None, deadline_ts: Optional[float] = None,
+                 dedupe_key: Optional[str] = None, dedupe_ttl: Optional[float] = None,
+                 depends_on: Optional[List[str]] = None, dag: Optional[str] = None,
+                 on_full: Optional[str] = None) -> Optional[str]:
+    """Queue a task for `assigned_to`. `priority` is a lane name on the server (default
+    lanes: urgent, high, normal, low); claims take the most urgent lane first. A task
+    still unclaimed at `deadline_ts` is dead-lettered (status "dead") instead of run.
+
+    With `dedupe_key`, the task is queued only if no task was queued under the same
+    key within `dedupe_ttl` seconds (server default MCP_DEDUPE_TTL, 7 days), by any
+    process; returns None for such a duplicate, else the task key.
+
+    With `depends_on` (task keys or ids), the task is "blocked" until every parent is
+    done; the server queues it when the last parent completes, and dead-letters it if a
+    parent dies. `dag` groups tasks for dag_report; children inherit their parents'.
+
+    `on_full` applies backpressure once `assigned_to` is saturated (its pending tasks hit
+    the server's high watermark, until they drain to the low one): "block" waits for it
+    to drain (QueueFull after NOVA_QUEUE_BLOCK_MAX s), "shed" drops the task and "sample"
+    keeps one in NOVA_QUEUE_SAMPLE; a dropped task returns None. Default: no check."""
+    if on_full is not None and not _admit(assigned_to, on_full):
+        return None
     task = {
         "type": "task",
         "status": "pending",
@@ -43,34 +177,166 @@ def enqueue_task(task_type: str, payload: Dict[str, Any], assigned_to: str, crea
         "ts": time.time(),
         "task_id": uuid.uuid4().hex,
     }
-    return mem_write(task, key=f"nova:task:{task['task_id']}")
-
-def find_pending_tasks(for_role: str, limit: int = 20) -> List[Dict[str, Any]]:
-    # substring search: look for type task + role + pending
-    q = f'"type":"task","status":"pending","assigned_to":"{for_role}"'
-    # memory.search is substring-only; this is good enough for now
-    return mem_search(q, limit=limit)
-
-def claim_task(task_key: str, claimer: str) -> Optional[Dict[str, Any]]:
-    rec = mem_read(task_key)
-    if not rec: return None
-    data = rec["data"]
-    if data.get("status") != "pending":
+    if priority is not None:
+        task["priority"] = priority
+    if deadline_ts is not None:
+        task["deadline_ts"] = deadline_ts
+    if depends_on:
+        parents = [p if p.startswith("nova:task:") else f"nova:task:{p}" for p in depends_on]
+        task.update(status="blocked", depends_on=parents, waiting_on=parents)
+        if dag is None:
+            dag = next((rec["data"].get("dag") for rec in mem_read_many(parents) if rec and rec["data"].get("dag")), None)
+    if dag is not None:
+        task["dag"] = dag
+    key = f"nova:task:{task['task_id']}"
+    js = _call("memory.write", {"key": key, "data": task, "dedupe_key": dedupe_key, "dedupe_ttl": dedupe_ttl})
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.write failed: {js.get('error')}")
+    return None if js.get("duplicate") else js["key"]
+
+def find_pending_tasks(for_role: str, limit: int = 20, wait: float = 0) -> List[Dict[str, Any]]:
+    # oldest first, served from the server's field indexes; with `wait`, returns as soon
+    # as a task for the role is enqueued instead of polling
+    return mem_query({"type": "task", "status": "pending", "assigned_to": for_role}, limit=limit, order="asc", wait=wait)
+
+def claim_task(task_key: str, claimer: str, lease: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Atomically move a task from pending to claimed. Returns its data, or None if
+    it is gone or someone else claimed it first."""
+    js = _call("memory.claim", {"key": task_key, "claimer": claimer, "lease": lease})
+    return js["data"] if js.get("ok") else None
+
+def claim_next_task(role: str, claimer: str, wait: float = 0, lease: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Claim the next task queued for `role`, waiting up to `wait` seconds for one to be
+    enqueued. Returns {"key", "data", "ts"} or None. The claim is a lease of `lease`
+    seconds (server default MCP_TASK_LEASE): a task not completed or renewed in time
+    goes back to pending for another worker, and is dead-lettered after
+    MCP_TASK_MAX_ATTEMPTS expired leases."""
+    js = _call("memory.claim", {"role": role, "claimer": claimer, "wait": wait, "lease": lease}, timeout=wait + 10)
+    if not js.get("ok"):
+        if js.get("error") != "no_pending":
+            raise RuntimeError(f"memory.claim failed: {js.get('error')}")
         return None
-    data["status"] = "claimed"
-    data["claimed_by"] = claimer
-    data["claimed_ts"] = time.time()
-    mem_write(data, key=task_key)
-    return data
-
-def complete_task(task_key: str, result: Dict[str, Any]) -> None:
-    rec = mem_read(task_key)
-    if not rec: return
-    data = rec["data"]
-    data["status"] = "done"
-    data["result"] = result
-    data["done_ts"] = time.time()
-    mem_write(data, key=task_key)
+    return {"key": js["key"], "data": js["data"], "ts": js.get("ts")}
+
+def claim_tasks(role: str, n: int, claimer: str, wait: float = 0, lease: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Claim up to `n` tasks queued for `role` in one round trip, oldest first. With `wait`,
+    blocks until at least one is queued. Returns [{"key", "data", "ts"}], maybe empty."""
+    js = _call("memory.claim_batch", {"role": role, "n": n, "claimer": claimer, "wait": wait, "lease": lease},
+               timeout=wait + 30)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.claim_batch failed: {js.get('error')}")
+    return js["results"]
+
+def renew_leases(keys: List[str], claimer: str, lease: Optional[float] = None) -> List[str]:
+    """Extend `claimer`'s leases on `keys` by `lease` seconds from now, in one round trip.
+    Returns the keys whose lease was lost: reaped, completed or claimed by someone else."""
+    if not keys:
+        return []
+    js = _call("memory.renew", {"keys": keys, "claimer": claimer, "lease": lease})
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.renew failed: {js.get('error')}")
+    return [x["key"] for x in js["results"] if not x["ok"]]
+
+def renew_lease(task_key: str, claimer: str, lease: Optional[float] = None) -> bool:
+    """renew_leases for one task. False means the lease was lost; stop working on it."""
+    return not renew_leases([task_key], claimer, lease)
+
+class LeaseHeartbeat:
+    """Renews `claimer`'s leases on the tasks it holds every lease/3 seconds from a
+    background thread, so long handlers keep their tasks:
+
+        with LeaseHeartbeat(WORKER, [r["key"] for r in batch]) as hb:
+            ...; hb.discard(key) once a task is completed; skip keys in hb.lost
+
+    Keys whose lease was lost are dropped and collected in `lost`."""
+
+    def __init__(self, claimer: str, keys: List[str] = (), lease: Optional[float] = None):
+        self.claimer, self.lease = claimer, lease
+        self.keys, self.lost = set(keys), set()
+        self.every = (lease or float(os.getenv("MCP_TASK_LEASE", "300"))) / 3
+        self._lock, self._stop = threading.Lock(), threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def add(self, key: str) -> None:
+        with self._lock:
+            self.keys.add(key)
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self.keys.discard(key)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.every):
+            with self._lock:
+                keys = list(self.keys)
+            try:
+                lost = renew_leases(keys, self.claimer, self.lease)
+            except Exception as e:  # keep beating; the lease outlasts a few missed renewals
+                print(f"[lease] renew failed: {e}", flush=True)
+                continue
+            with self._lock:
+                self.keys.difference_update(lost)
+                self.lost.update(lost)
+
+    def __enter__(self) -> "LeaseHeartbeat":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def complete_tasks(results: List[Tuple[str, Dict[str, Any]]], claimer: Optional[str] = None) -> List[str]:
+    """complete_task for many (key, result) pairs in one round trip. Returns the keys
+    not completed: gone, or (with `claimer`) no longer claimed by it."""
+    js = _call("memory.complete_batch", {"items": [{"key": k, "result": res, "claimer": claimer} for k, res in results]},
+               timeout=30)
+    if not js.get("ok"):
+        raise RuntimeError(f"memory.complete_batch failed: {js.get('error')}")
+    return [x["key"] for x in js["results"] if not x["ok"]]
+
+def complete_task(task_key: str, result: Dict[str, Any], claimer: Optional[str] = None) -> bool:
+    """Mark a task done with its result; acks it on the role's queue so it is not redelivered.
+    With `claimer`, only while it still holds the claim. False if it was not completed."""
+    return bool(_call("memory.complete", {"key": task_key, "result": result, "claimer": claimer}).get("ok"))
+
+def dag_report(dag: str, limit: int = 1000) -> Dict[str, Any]:
+    """Progress and critical path of the tasks tagged `dag`. The critical path runs back
+    from the last task to finish through, at each step, the parent that finished last
+    (the one that released it); its latency splits into queue wait (ready to claimed),
+    run time (claimed to done) and release delay (parent done to child ready)."""
+    tasks = {t["key"]: t["data"] for t in mem_query({"dag": dag}, limit=limit, order="asc")}
+    counts: Dict[str, int] = {}
+    for d in tasks.values():
+        counts[d.get("status")] = counts.get(d.get("status"), 0) + 1
+    finished = [k for k, d in tasks.items() if d.get("done_ts")]
+    report = {"dag": dag, "tasks": len(tasks), "status": counts, "critical_path": [], "critical_path_s": None}
+    if not finished:
+        return report
+    path = [max(finished, key=lambda k: tasks[k]["done_ts"])]
+    while True:
+        parents = [p for p in tasks[path[0]].get("depends_on") or [] if tasks.get(p, {}).get("done_ts")]
+        if not parents:
+            break
+        path.insert(0, max(parents, key=lambda p: tasks[p]["done_ts"]))
+    wait = run = release = 0.0
+    for i, k in enumerate(path):
+        d = tasks[k]
+        ready = d.get("ready_ts") or d["ts"]
+        claimed = d.get("claimed_ts") or ready
+        wait += claimed - ready
+        run += d["done_ts"] - claimed
+        if i:
+            release += ready - tasks[path[i - 1]]["done_ts"]
+    report.update(critical_path=path, critical_path_s=round(tasks[path[-1]]["done_ts"] - tasks[path[0]]["ts"], 4),
+                  wait_s=round(wait, 4), run_s=round(run, 4), release_s=round(release, 4))
+    return report
 
 def log_event(agent: str, topic: str, payload: Dict[str, Any]) -> None:
     mem_write({"agent": agent, "type": "event", "topic": topic, "payload": payload, "ts": time.time()})
+
+def log_events(agent: str, events: List[Tuple[str, Dict[str, Any]]]) -> None:
+    """log_event for many (topic, payload) pairs in one round trip."""
+    if events:
+        mem_write_batch([{"data": {"agent": agent, "type": "event", "topic": t, "payload": p, "ts": time.time()}}
+                         for t, p in events])
@@ -0,0 +1,607 @@
+# agents/_lib/memory_backend.py
+"""
+Where agents' memory calls go. MEMORY_BACKEND picks one:
+
+- "http" (default): POST to the memory server at MCP_MEMORY_URL.
+- "redis": run the memory server's own tool handlers in-process against REDIS_URL
+  (or REDIS_URLS), skipping the HTTP hop. Same code as the server, same semantics.
+- "embedded": SQLite at MEMORY_SQLITE (default ":memory:") for tests and single-box
+  deployments. A file path is shared by every agent process on the box.
+
+Each backend has call(tool, body, timeout) returning the reply the memory server
+would send for POST /tools/<tool>.
+"""
+import os, sys, json, math, time, uuid, sqlite3, threading, inspect
+
+MODE = os.getenv("MEMORY_BACKEND", "http").lower()
+SERVER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "mcp", "memory_server"))
+
+class HttpBackend:
+    """POST over the pooled keep-alive session in transport.py. Only the tools that
+    change nothing (or only refresh a lease) are retried: a repeated write or claim
+    could apply twice."""
+    IDEMPOTENT = {"memory.read", "memory.read_many", "memory.search", "memory.query", "memory.watch",
+                  "memory.fts", "memory.queue_stats", "memory.renew"}
+
+    def __init__(self, base_url: str | None):
+        self.base_url = (base_url or "").rstrip("/")
+
+    def call(self, tool: str, body: dict, timeout: float = 10) -> dict:
+        from agents._lib import transport
+        if not self.base_url:
+            raise RuntimeError("MCP_MEMORY_URL not set")
+        return transport.post_json(f"{self.base_url}/tools/{tool}", body, timeout=timeout,
+                                   idempotent=tool in self.IDEMPOTENT)
+
+class RedisBackend:
+    """The memory server's route handlers, called directly (needs redis, fastapi, pydantic)."""
+
+    def __init__(self):
+        if SERVER_DIR not in sys.path:
+            sys.path.insert(0, SERVER_DIR)
+        import server
+        self.server = server
+        self.tools = {}
+        for route in server.app.routes:
+            path = getattr(route, "path", "")
+            if path.startswith("/tools/"):
+                fn = getattr(route.endpoint, "__wrapped__", route.endpoint)  # the sync body of a long_poll route
+                model = next(iter(inspect.signature(fn).parameters.values())).annotation
+                self.tools[path[len("/tools/"):]] = (fn, model)
+        if server.cache.enabled:
+            # keep this process's read cache in step with writes made by other processes
+            threading.Thread(target=server.invalidator.listen, args=(server.r,), daemon=True).start()
+
+    def call(self, tool: str, body: dict, timeout: float = 10) -> dict:
+        if tool not in self.tools:
+            return {"ok": False, "error": "unsupported_tool"}
+        endpoint, model = self.tools[tool]
+        return endpoint(model(**body))
+
+class EmbeddedBackend:
+    """The memory tools on SQLite: same replies, keys, ordering and cursors as the server
+    with its defaults (no full-text index, no retention)."""
+
+    def __init__(self, path: str = ":memory:"):
+        if SERVER_DIR not in sys.path:
+            sys.path.insert(0, SERVER_DIR)
+        import indexes, shards  # dependency-free, shared with the server
+        self.ix, self.shards = indexes, shards
+        self.namespace = os.getenv("MCP_NAMESPACE", "nova:mem")
+        self.write_batch_max = int(os.getenv("MCP_WRITE_BATCH_MAX", "1000"))
+        self.read_many_max = int(os.getenv("MCP_READ_MANY_MAX", "500"))
+        self.scan_page = int(os.getenv("MCP_SCAN_PAGE", "200"))
+        self.scan_budget = int(os.getenv("MCP_SCAN_BUDGET", "5000"))
+        self.feed_maxlen = int(os.getenv("MCP_FEED_MAXLEN", "100000"))
+        self.watch_max_wait = float(os.getenv("MCP_WATCH_MAX_WAIT", "30"))
+        self.task_lease = float(os.getenv("MCP_TASK_LEASE", "300"))
+        self.dedupe_ttl = float(os.getenv("MCP_DEDUPE_TTL", "604800"))
+        self.queue_high = int(os.getenv("MCP_QUEUE_HIGH", "1000"))
+        self.queue_low = int(os.getenv("MCP_QUEUE_LOW", "500"))
+        self.queue_watermarks = json.loads(os.getenv("MCP_QUEUE_WATERMARKS", "{}"))
+        self.queue_drain_window = int(os.getenv("MCP_QUEUE_DRAIN_WINDOW", "5"))
+        self.saturated = set()
+        self.task_max_attempts = int(os.getenv("MCP_TASK_MAX_ATTEMPTS", "5"))
+        self.priorities = [p.strip() for p in os.getenv("MCP_TASK_PRIORITIES", "urgent,high,normal,low").split(",") if p.strip()]
+        default = os.getenv("MCP_TASK_DEFAULT_PRIORITY", "normal")
+        self.default_rank = self.priorities.index(default) if default in self.priorities else 0
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        if path != ":memory:":
+            self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS records (key TEXT PRIMARY KEY, data TEXT NOT NULL, ts REAL NOT NULL, idx TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS records_ts ON records (ts, key);
+            CREATE TABLE IF NOT EXISTS idx (field TEXT, value TEXT, key TEXT, ts REAL, PRIMARY KEY (field, value, key));
+            CREATE INDEX IF NOT EXISTS idx_ts ON idx (field, value, ts);
+            CREATE INDEX IF NOT EXISTS idx_key ON idx (key, field);
+            CREATE TABLE IF NOT EXISTS feed (id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT, ts REAL, idx TEXT);
+            CREATE TABLE IF NOT EXISTS dedupe (dk TEXT PRIMARY KEY, key TEXT NOT NULL, expires REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS dedupe_expires ON dedupe (expires);
+        """)
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock)
+        self.tools = {
+            "memory.write": self.write, "memory.write_batch": self.write_batch,
+            "memory.read": self.read, "memory.read_many": self.read_many,
+            "memory.search": self.search, "memory.query": self.query, "memory.watch": self.watch,
+            "memory.claim": self.claim, "memory.complete": self.complete,
+            "memory.claim_batch": self.claim_batch, "memory.complete_batch": self.complete_batch,
+            "memory.renew": self.renew, "memory.sweep": self.sweep, "memory.queue_stats": self.queue_stats,
+            "memory.fts": lambda body: {"ok": False, "error": "fts_disabled"},
+        }
+
+    def call(self, tool: str, body: dict, timeout: float = 10) -> dict:
+        fn = self.tools.get(tool)
+        if fn is None:
+            return {"ok": False, "error": "unsupported_tool"}
+        return fn(body)
+
+    # -- writes ---------------------------------------------------------------
+
+    def _put(self, key: str, data: dict) -> None:
+        ts = time.time()
+        idx = self.ix.index_values(data)
+        self.db.execute("INSERT OR REPLACE INTO records (key, data, ts, idx) VALUES (?, ?, ?, ?)",
+                        (key, json.dumps(data), ts, json.dumps(idx)))
+        self.db.execute("DELETE FROM idx WHERE key = ?", (key,))
+        self.db.executemany("INSERT INTO idx (field, value, key, ts) VALUES (?, ?, ?, ?)",
+                            [(f, v, key, ts) for f, v in idx.items()])
+        cur = self.db.execute("INSERT INTO feed (key, ts, idx) VALUES (?, ?, ?)", (key, ts, json.dumps(idx)))
+        if cur.lastrowid % 1000 == 0:
+            self.db.execute("DELETE FROM feed WHERE id <= ?", (cur.lastrowid - self.feed_maxlen,))
+
+    def _write(self, items: list, records: list = ()) -> dict:
+        """Write [(key, data)] in one transaction, skipping those whose record (same
+        position in `records`) carries a dedupe key still held. Returns {key: holder}."""
+        reqs = [(k, rec["dedupe_key"], rec.get("dedupe_ttl") or self.dedupe_ttl)
+                for (k, _), rec in zip(items, records) if rec.get("dedupe_key")]
+        dup = {}
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                if reqs:
+                    now = time.time()
+                    self.db.execute("DELETE FROM dedupe WHERE expires <= ?", (now,))
+                    for key, dk, ttl in reqs:
+                        row = self.db.execute("SELECT key FROM dedupe WHERE dk = ?", (dk,)).fetchone()
+                        if row:
+                            dup[key] = row[0]
+                        else:
+                            self.db.execute("INSERT INTO dedupe (dk, key, expires) VALUES (?, ?, ?)", (dk, key, now + ttl))
+                for key, data in items:
+                    if key not in dup:
+                        self._put(key, data)
+                if any(self._blocked(data) for _, data in items):
+                    self._release()  # parents that settled before it was written
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.changed.notify_all()
+        return dup
+
+    def _invalid(self, records: list) -> dict | None:
+        """The server's write validation (taskq.bad_task): the error for the first bad task."""
+        for i, rec in enumerate(records):
+            data = rec["data"]
+            if data.get("type") != "task":
+                continue
+            deadline = data.get("deadline_ts")
+            if deadline is not None:
+                try:
+                    ok = not isinstance(deadline, bool) and math.isfinite(float(deadline))
+                except (TypeError, ValueError):
+                    ok = False
+                if not ok:
+                    return {"ok": False, "error": "bad_deadline_ts", "index": i}
+            if data.get("priority") is not None and data["priority"] not in self.priorities:
+                return {"ok": False, "error": "bad_priority", "index": i, "priorities": list(self.priorities)}
+            if not self._parents_ok(data):
+                return {"ok": False, "error": "bad_waiting_on", "index": i}
+        return None
+
+    @staticmethod
+    def _parents_ok(data: dict) -> bool:
+        waiting = data.get("waiting_on")
+        if waiting is None:
+            return data.get("status") != "blocked"
+        return isinstance(waiting, list) and all(isinstance(p, str) and p for p in waiting) \
+            and (bool(waiting) or data.get("status") != "blocked")
+
+    def write(self, body: dict) -> dict:
+        bad = self._invalid([body])
+        if bad:
+            return bad
+        key = body.get("key") or f"{self.namespace}:{uuid.uuid4().hex}"
+        dup = self._write([(key, body["data"])], [body])
+        if dup:
+            return {"ok": True, "key": dup[key], "duplicate": True}
+        return {"ok": True, "key": key}
+
+    def write_batch(self, body: dict) -> dict:
+        records = body["records"]
+        if len(records) > self.write_batch_max:
+            return {"ok": False, "error": "batch_too_large", "max": self.write_batch_max}
+        bad = self._invalid(records)
+        if bad:
+            return bad
+        keys = [rec.get("key") or f"{self.namespace}:{uuid.uuid4().hex}" for rec in records]
+        dup = self._write([(k, rec["data"]) for k, rec in zip(keys, records)], records)
+        return {"ok": True, "keys": [dup.get(k, k) for k in keys], "duplicates": [i for i, k in enumerate(keys) if k in dup]}
+
+    # -- reads ----------------------------------------------------------------
+
+    def _fetch_map(self, keys: list[str]) -> dict:
+        found = {}
+        with self.lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows = self.db.execute(f"SELECT key, data, ts FROM records WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+                for k, data, ts in rows:
+                    found[k] = {"key": k, "data": json.loads(data), "ts": ts}
+        return found
+
+    def _fetch(self, keys: list[str]) -> list[dict]:
+        found = self._fetch_map(keys)
+        return [found[k] for k in keys if k in found]
+
+    def read(self, body: dict) -> dict:
+        recs = self._fetch([body["key"]])
+        if not recs:
+            return {"ok": False, "error": "not_found"}
+        return {"ok": True, "data": recs[0]["data"], "ts": recs[0]["ts"]}
+
+    def read_many(self, body: dict) -> dict:
+        keys = body["keys"]
+        if len(keys) > self.read_many_max:
+            return {"ok": False, "error": "too_many_keys", "max": self.read_many_max}
+        found = self._fetch_map(keys)
+        return {"ok": True, "results": [found.get(k) for k in keys]}
+
+    def _newest(self, max_score, skip: int, n: int) -> list:
+        """Like ZREVRANGEBYSCORE index max_score -inf LIMIT skip n WITHSCORES."""
+        with self.lock:
+            return self.db.execute("SELECT key, ts FROM records WHERE ts <= ? ORDER BY ts DESC, key DESC LIMIT ? OFFSET ?",
+                                   (float(max_score), n, skip)).fetchall()
+
+    def search(self, body: dict) -> dict:
+        q = body["q"].lower()
+        limit = body.get("limit", 20)
+        hit = lambda rec: q in json.dumps(rec["data"]).lower()
+        if not body.get("scan"):
+            return {"ok": True, "results": [rec for rec in self._fetch([k for k, _ in self._newest("inf", 0, limit)]) if hit(rec)]}
+
+        budget = min(body.get("budget") or self.scan_budget, self.scan_budget)
+        positions = self.shards.parse_cursor(body.get("cursor"), 1)
+        if positions is None:
+            return {"ok": False, "error": "stale_cursor"}
+        if positions[0] is None:
+            return {"ok": True, "results": [], "cursor": None, "scanned": 0}
+        max_score, skip = positions[0]
+        out, scanned, exhausted = [], 0, False
+        while len(out) < limit and scanned < budget:
+            n = min(self.scan_page, budget - scanned)
+            entries = self._newest(max_score, skip, n)
+            recs = self._fetch_map([k for k, _ in entries])
+            for k, score in entries:
+                if score == max_score:
+                    skip += 1
+                else:
+                    max_score, skip = score, 1
+                scanned += 1
+                rec = recs.get(k)
+                if rec and hit(rec):
+                    out.append(rec)
+                    if len(out) >= limit:
+                        break
+            else:
+                if len(entries) < n:
+                    exhausted = True
+                    break
+        cursor = None if exhausted else f"{max_score!r}:{skip}"
+        return {"ok": True, "results": out, "cursor": cursor, "scanned": scanned}
+
+    def _bad_fields(self, where: dict) -> dict | None:
+        bad = [f for f in where if f not in self.ix.INDEX_FIELDS]
+        if bad:
+            return {"ok": False, "error": "unindexed_field", "fields": bad, "indexed": list(self.ix.INDEX_FIELDS)}
+        return None
+
+    def query(self, body: dict) -> dict:
+        where = body["where"]
+        err = self._bad_fields(where)
+        if err or not where:
+            return err or {"ok": False, "error": "unindexed_field", "fields": [], "indexed": list(self.ix.INDEX_FIELDS)}
+        desc = body.get("order", "desc") != "asc"
+        norm = {f: self.ix._norm(v) for f, v in where.items()}
+        cond = " OR ".join("(field = ? AND value = ?)" for _ in norm)
+        args = [x for fv in norm.items() for x in fv]
+        deadline = time.monotonic() + min(body.get("wait", 0), self.watch_max_wait)
+        while True:
+            with self.lock:
+                keys = [k for k, in self.db.execute(
+                    f"SELECT key FROM idx WHERE {cond} GROUP BY key HAVING COUNT(*) = ? "
+                    f"ORDER BY MAX(ts) {'DESC' if desc else 'ASC'}, key {'DESC' if desc else 'ASC'} LIMIT ?",
+                    args + [len(norm), body.get("limit", 20)])]
+                left = deadline - time.monotonic()
+                if keys or left <= 0:
+                    break
+                self.changed.wait(min(left, 0.05))
+        return {"ok": True, "results": [rec for rec in self._fetch(keys) if self.ix.matches(rec["data"], where)]}
+
+    def _role_tasks(self, role, status: str, before: float, n: int) -> list:
+        """Task keys of `role` in `status`, most urgent priority first, then oldest."""
+        rank = " ".join(f"WHEN ? THEN {i}" for i in range(len(self.priorities)))
+        return [k for k, in self.db.execute(
+            "SELECT idx.key FROM idx JOIN records ON records.key = idx.key "
+            "WHERE (field = 'type' AND value = 'task') OR (field = 'status' AND value = ?) "
+            "OR (field = 'assigned_to' AND value = ?) GROUP BY idx.key HAVING COUNT(*) = 3 AND MAX(idx.ts) <= ? "
+            f"ORDER BY CASE json_extract(records.data, '$.priority') {rank} ELSE {self.default_rank} END, "
+            "MAX(idx.ts), idx.key LIMIT ?", (status, self.ix._norm(role), before, *self.priorities, n))]
+
+    @staticmethod
+    def _blocked(data: dict) -> bool:
+        return data.get("type") == "task" and data.get("status") == "blocked" and bool(data.get("waiting_on"))
+
+    def _release(self) -> None:
+        """The server's dependency release, inside the caller's transaction: blocked tasks
+        drop parents that are done and become pending once none are left, or go dead
+        ("parent_dead") with a dead parent, until nothing changes."""
+        changed = True
+        while changed:
+            changed = False
+            rows = self.db.execute(
+                "SELECT records.key, records.data FROM idx JOIN records ON records.key = idx.key "
+                "WHERE field = 'status' AND value = 'blocked'").fetchall()
+            tasks = [(k, json.loads(raw)) for k, raw in rows]
+            parents = {p for _, d in tasks if self._blocked(d) for p in d["waiting_on"]}
+            status = {}
+            for k in parents:
+                row = self.db.execute("SELECT data FROM records WHERE key = ?", (k,)).fetchone()
+                status[k] = json.loads(row[0]).get("status") if row else None
+            now = time.time()
+            for key, data in tasks:
+                if not self._blocked(data):
+                    continue
+                left = [p for p in data["waiting_on"] if status.get(p) != "done"]
+                if any(status.get(p) == "dead" for p in data["waiting_on"]):
+                    data.update(status="dead", dead_reason="parent_dead", dead_ts=now)
+                elif len(left) == len(data["waiting_on"]):
+                    continue
+                else:
+                    data["waiting_on"] = left
+                    if not left:
+                        data.update(status="pending", ready_ts=now)
+                self._put(key, data)
+                changed = changed or data["status"] == "dead"
+
+    def _reap(self) -> tuple[int, int, int]:
+        """The server's lease sweep, run inside the caller's transaction: claims whose
+        lease ran out go back to pending with attempts + 1, or dead after max attempts.
+        Returns (checked, requeued, dead)."""
+        now = time.time()
+        rows = self.db.execute(
+            "SELECT records.key, records.data FROM idx JOIN records ON records.key = idx.key "
+            "WHERE field = 'status' AND value = 'claimed' AND json_extract(records.data, '$.lease_until') <= ?",
+            (now,)).fetchall()
+        requeued = dead = 0
+        for key, raw in rows:
+            data = json.loads(raw)
+            data["attempts"] = int(data.get("attempts", 0)) + 1
+            if data["attempts"] >= self.task_max_attempts:
+                data.update(status="dead", dead_reason="max_attempts", dead_ts=now)
+                dead += 1
+            elif data.get("deadline_ts") is not None and float(data["deadline_ts"]) <= now:
+                data.update(status="dead", dead_reason="deadline_expired", dead_ts=now)
+                dead += 1
+            else:
+                for f in ("claimed_by", "claimed_ts", "lease_until"):
+                    data.pop(f, None)
+                data["status"] = "pending"
+                requeued += 1
+            self._put(key, data)
+        if dead:
+            self._release()
+        return len(rows), requeued, dead
+
+    def _claim_once(self, body: dict, n: int = 1) -> tuple[list, str | None]:
+        """One claim attempt in its own transaction: (claimed keys, None) or ([], error)."""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")  # serializes claimers across processes too
+            try:
+                self._reap()  # no sweeper thread here; expired leases are reaped as claims come in
+                if body.get("key"):
+                    keys = [body["key"]]
+                else:
+                    keys = self._role_tasks(body["role"], "pending", float("inf"), n)
+                claimed, err, died = [], "no_pending", False
+                for key in keys:
+                    row = self.db.execute("SELECT data FROM records WHERE key = ?", (key,)).fetchone()
+                    data = json.loads(row[0]) if row else None
+                    if data is None or data.get("status") != "pending":
+                        err = "not_pending" if data else "not_found"
+                        continue
+                    now = time.time()
+                    if data.get("deadline_ts") is not None and float(data["deadline_ts"]) <= now:
+                        data.update(status="dead", dead_reason="deadline_expired", dead_ts=now)
+                        self._put(key, data)
+                        err, died = "deadline_expired", True
+                        continue
+                    data.update(status="claimed", claimed_by=body["claimer"], claimed_ts=now,
+                                lease_until=now + (body.get("lease") or self.task_lease))
+                    self._put(key, data)
+                    claimed.append(key)
+                if died:
+                    self._release()
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            if claimed:
+                self.changed.notify_all()
+        return claimed, (None if claimed else err if body.get("key") else "no_pending")
+
+    def _claim_wait(self, body: dict, n: int) -> tuple[list, str | None]:
+        deadline = time.monotonic() + min(body.get("wait", 0), self.watch_max_wait)
+        while True:
+            keys, err = self._claim_once(body, n)
+            left = deadline - time.monotonic()
+            if keys or body.get("key") or left <= 0:
+                return keys, err
+            with self.lock:
+                self.changed.wait(min(left, 0.05))
+
+    def claim(self, body: dict) -> dict:
+        if not body.get("key") and not body.get("role"):
+            return {"ok": False, "error": "key_or_role_required"}
+        keys, err = self._claim_wait(body, 1)
+        if not keys:
+            return {"ok": False, "error": err}
+        return {"ok": True, **self._fetch(keys)[0]}
+
+    def claim_batch(self, body: dict) -> dict:
+        if body.get("n", 20) < 1:
+            return {"ok": False, "error": "bad_n"}
+        if body.get("n", 20) > self.write_batch_max:
+            return {"ok": False, "error": "batch_too_large", "max": self.write_batch_max}
+        keys, _ = self._claim_wait({**body, "key": None}, body.get("n", 20))
+        return {"ok": True, "results": self._fetch(keys)}
+
+    def renew(self, body: dict) -> dict:
+        keys = body["keys"]
+        if len(keys) > self.write_batch_max:
+            return {"ok": False, "error": "batch_too_large", "max": self.write_batch_max}
+        results = []
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for key in keys:
+                    row = self.db.execute("SELECT data FROM records WHERE key = ?", (key,)).fetchone()
+                    data = json.loads(row[0]) if row else None
+                    err = ("not_found" if data is None else "not_claimed" if data.get("status") != "claimed"
+                           else "not_owner" if data.get("claimed_by") != body["claimer"] else None)
+                    if err:
+                        results.append({"ok": False, "key": key, "error": err})
+                        continue
+                    data["lease_until"] = time.time() + (body.get("lease") or self.task_lease)
+                    # the lease only: no re-index or feed entry on every heartbeat
+                    self.db.execute("UPDATE records SET data = ? WHERE key = ?", (json.dumps(data), key))
+                    results.append({"ok": True, "key": key, "lease_until": data["lease_until"]})
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+        return {"ok": True, "results": results}
+
+    def sweep(self, body: dict) -> dict:
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                checked, requeued, dead = self._reap()
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            if requeued:
+                self.changed.notify_all()
+        return {"ok": True, "report": {"checked": checked, "requeued": requeued, "dead_lettered": dead}}
+
+    def queue_stats(self, body: dict) -> dict:
+        """Same reply as the server's, counted from the field indexes (no counters to drift);
+        a completion is timed by the write that set the task done."""
+        now = time.time()
+        since = (int(now // 60) - self.queue_drain_window) * 60
+        roles = body.get("roles")
+        join = ("FROM idx s JOIN idx a ON a.key = s.key AND a.field = 'assigned_to' "
+                "JOIN idx t ON t.key = s.key AND t.field = 'type' AND t.value = 'task' WHERE s.field = 'status' ")
+        if roles:
+            join += f"AND a.value IN ({', '.join('?' * len(roles))}) "
+        args = [self.ix._norm(r) for r in roles or ()]
+        with self.lock:
+            depth = {(role, st): n for role, st, n in self.db.execute(
+                f"SELECT a.value, s.value, COUNT(*) {join}AND s.value IN ('pending', 'claimed', 'blocked') "
+                "GROUP BY a.value, s.value", args)}
+            done = {}
+            for role, ts in self.db.execute(f"SELECT a.value, s.ts {join}AND s.value = 'done' AND s.ts >= ?", (*args, since)):
+                done.setdefault(role, []).append(int(ts // 60))
+        roles = roles or sorted({role for role, _ in depth})
+        out = {}
+        for role in roles:
+            st = {s: depth.get((role, s), 0) for s in ("pending", "claimed", "blocked")}
+            minutes = done.get(role, [])
+            rate = len(minutes) / (self.queue_drain_window + (now % 60) / 60)
+            high, low = self.queue_watermarks.get(role, (self.queue_high, self.queue_low))
+            if st["pending"] >= high:
+                self.saturated.add(role)
+            elif st["pending"] <= low:
+                self.saturated.discard(role)
+            out[role] = {**st, "done_last_min": minutes.count(int(now // 60) - 1), "drain_per_min": round(rate, 2),
+                         "eta_s": round(st["pending"] / rate * 60, 1) if rate else None, "high": high, "low": low,
+                         "saturated": role in self.saturated}
+        return {"ok": True, "roles": out}
+
+    def complete_batch(self, body: dict) -> dict:
+        items = body["items"]
+        if len(items) > self.write_batch_max:
+            return {"ok": False, "error": "batch_too_large", "max": self.write_batch_max}
+        done, refused = set(), set()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                for it in items:
+                    row = self.db.execute("SELECT data FROM records WHERE key = ?", (it["key"],)).fetchone()
+                    if not row:
+                        continue
+                    data = json.loads(row[0])
+                    if it.get("claimer") is not None and (data.get("status") != "claimed"
+                                                          or data.get("claimed_by") != it["claimer"]):
+                        refused.add(it["key"])
+                        continue
+                    data.update(status="done", result=it.get("result", {}), done_ts=time.time())
+                    self._put(it["key"], data)
+                    done.add(it["key"])
+                self._release()
+                self.db.execute("COMMIT")
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.changed.notify_all()
+        found = self._fetch_map(list(done))
+        return {"ok": True, "results": [{"ok": True, "key": it["key"], "ts": found[it["key"]]["ts"]} if it["key"] in found
+                                        else {"ok": False, "key": it["key"],
+                                              "error": "not_owner" if it["key"] in refused else "not_found"}
+                                        for it in items]}
+
+    def complete(self, body: dict) -> dict:
+        res = self.complete_batch({"items": [body]})["results"][0]
+        return {k: v for k, v in res.items() if k != "key" or res["ok"]}
+
+    def watch(self, body: dict) -> dict:
+        where = body.get("where") or {}
+        err = self._bad_fields(where)
+        if err:
+            return err
+        limit = body.get("limit", 100)
+        after = body.get("after", "$")
+        with self.lock:
+            if after == "$":
+                after = str(self.db.execute("SELECT COALESCE(MAX(id), 0) FROM feed").fetchone()[0])
+            deadline = time.monotonic() + min(body.get("wait", 25), self.watch_max_wait)
+            hits = []
+            while True:
+                rows = self.db.execute("SELECT id, key, idx FROM feed WHERE id > ? ORDER BY id LIMIT ?",
+                                       (int(after), limit)).fetchall()
+                for entry_id, key, idx in rows:
+                    after = str(entry_id)
+                    if self.ix.matches(self.ix.parse_idx(idx), where):
+                        hits.append((after, key))
+                left = deadline - time.monotonic()
+                if hits or left <= 0:
+                    break
+                if not rows:
+                    # local writes wake us at once; writes from other processes within 50ms
+                    self.changed.wait(min(left, 0.05))
+        found = self._fetch_map([k for _, k in hits])
+        return {"ok": True, "results": [{**found[k], "offset": eid} for eid, k in hits if k in found], "offset": after}
+
+_backend = None
+
+def get():
+    """The process-wide backend, built from the environment on first use."""
+    global _backend
+    if _backend is None:
+        if MODE == "http":
+            _backend = HttpBackend(os.getenv("MCP_MEMORY_URL"))
+        elif MODE == "redis":
+            _backend = RedisBackend()
+        elif MODE == "embedded":
+            _backend = EmbeddedBackend(os.getenv("MEMORY_SQLITE", ":memory:"))
+        else:
+            raise RuntimeError(f"unknown MEMORY_BACKEND {MODE!r} (http, redis, embedded)")
+    return _backend
+
+def use(backend) -> None:
+    """Swap the backend (tests, conformance runs, embedding in another process)."""
+    global _backend, MODE
+    _backend = backend
+    MODE = {HttpBackend: "http", RedisBackend: "redis", EmbeddedBackend: "embedded"}.get(type(backend), "custom")
@@ -1,28 +1,18 @@
 # agents/_lib/telemetry.py
 import os
-import json
 import time
-import urllib.request
-import urllib.error
+
+from agents._lib import memory_backend, transport
 
 # Memory service base URL. Uses env var if set, otherwise defaults to your Render memory service.
 MEM_URL = os.getenv("NOVA_MEM_URL", "https://novaosmem.onrender.com").rstrip("/")
 
 def _post_json(path: str, data: dict, timeout: int = 5) -> dict:
-    url = f"{MEM_URL}{path}"
-    body = json.dumps(data).encode("utf-8")
-    req = urllib.request.Request(
-        url,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        method="POST",
-    )
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        raw = resp.read().decode("utf-8") or "{}"
-        try:
-            return json.loads(raw)
-        except Exception:
-            return {"ok": False, "raw": raw}
+    # MEMORY_BACKEND=redis|embedded: write locally instead of over HTTP (see memory_backend.py)
+    if memory_backend.MODE != "http":
+        return memory_backend.get().call(path.rsplit("/", 1)[-1], data, timeout=timeout)
+    # pooled keep-alive connection (transport.py): no new TCP/TLS handshake per event
+    return transport.post_json(f"{MEM_URL}{path}", data, timeout=timeout)
 
 def emit(agent: str, type: str, topic: str, payload: dict) -> dict:
     """
@@ -47,9 +37,34 @@ def emit(agent: str, type: str, topic: str, payload: dict) -> dict:
         print(f"[telemetry] FAILED {agent}:{topic}: {e}")
         return {"ok": False, "error": str(e)}
 
+def emit_batch(events: list) -> dict:
+    """
+    Send many telemetry events in one request via memory.write_batch.
+    Each event is a dict with agent/type/topic/payload (ts is filled in if missing).
+    Safe like emit(): returns {'ok': False} instead of raising.
+    """
+    now = time.time()
+    records = [
+        {"data": {
+            "agent": e["agent"],
+            "type": e.get("type", "event"),
+            "topic": e["topic"],
+            "payload": e.get("payload", {}),
+            "ts": e.get("ts", now),
+        }}
+        for e in events
+    ]
+    try:
+        res = _post_json("/tools/memory.write_batch", {"records": records}, timeout=15)
+        print(f"[telemetry] wrote batch of {len(records)} -> ok={res.get('ok')}")
+        return res
+    except Exception as e:
+        print(f"[telemetry] FAILED batch of {len(records)}: {e}")
+        return {"ok": False, "error": str(e)}
+
 # Optional helpers if you want them later:
 def lifecycle(agent: str, status: str) -> dict:
     return emit(agent, "event", "lifecycle", {"status": status})
 
 def heartbeat(agent: str) -> dict:
-    return emit(agent, "event", "heartbeat", {"alive": True})
+    return emit(agent, "event", "heartbeat", {"alive": True, "http": transport.stats()})
@@ -0,0 +1,152 @@
+# agents/_lib/transport.py
+"""
+The agents' HTTP client: one pooled keep-alive session per process, shared by every
+thread, so heartbeats and memory calls reuse a connection (and its TLS session)
+instead of opening one per request.
+
+- HTTP/1.1 keep-alive through requests, up to NOVA_HTTP_POOL connections per host.
+  NOVA_HTTP2=1 switches to httpx with HTTP/2 (one multiplexed connection per host)
+  when httpx and h2 are installed; otherwise it stays on HTTP/1.1.
+- Every call takes its own timeout (read), with connects capped at
+  NOVA_HTTP_CONNECT_TIMEOUT.
+- Idempotent calls (GET, or idempotent=True) are retried up to NOVA_HTTP_RETRIES
+  times on connection errors, timeouts and 429/502/503/504, sleeping a full-jitter
+  exponential backoff: uniform(0, min(NOVA_HTTP_BACKOFF_MAX, NOVA_HTTP_BACKOFF * 2^n)).
+  Other calls are retried only when the connection failed before the request went out.
+- stats() counts requests, connections opened and retries; reused = requests that
+  went over an already open connection.
+
+Errors are requests' exceptions in either mode (requests.HTTPError for 4xx/5xx).
+"""
+import os, json, time, random, threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+POOL = int(os.getenv("NOVA_HTTP_POOL", "10"))
+HTTP2 = os.getenv("NOVA_HTTP2", "0") == "1"
+CONNECT_TIMEOUT = float(os.getenv("NOVA_HTTP_CONNECT_TIMEOUT", "5"))
+RETRIES = int(os.getenv("NOVA_HTTP_RETRIES", "3"))
+BACKOFF = float(os.getenv("NOVA_HTTP_BACKOFF", "0.2"))
+BACKOFF_MAX = float(os.getenv("NOVA_HTTP_BACKOFF_MAX", "5"))
+RETRY_STATUS = (429, 502, 503, 504)
+
+_stats = {"requests": 0, "connections": 0, "retries": 0, "errors": 0}
+_lock = threading.Lock()
+_client = None
+_pid = None
+
+def _count(name: str, n: int = 1) -> None:
+    with _lock:
+        _stats[name] += n
+
+def stats() -> dict:
+    """{requests, connections, reused, reuse_ratio, retries, errors, http} since start (or reset)."""
+    with _lock:
+        out = dict(_stats)
+    out["reused"] = max(0, out["requests"] - out["connections"])
+    out["reuse_ratio"] = round(out["reused"] / out["requests"], 3) if out["requests"] else None
+    out["http"] = "2" if _client is not None and not isinstance(_client, requests.Session) else "1.1"
+    return out
+
+def reset_stats() -> None:
+    with _lock:
+        for k in _stats:
+            _stats[k] = 0
+
+class _HttpPool(HTTPConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+class _HttpsPool(HTTPSConnectionPool):
+    def _new_conn(self):
+        _count("connections")
+        return super()._new_conn()
+
+class _Adapter(HTTPAdapter):
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HttpPool, "https": _HttpsPool}
+
+def _trace(event: str, info: dict) -> None:
+    if event == "connection.connect_tcp.started":
+        _count("connections")
+
+def _new_client():
+    if HTTP2:
+        try:
+            import httpx
+            return httpx.Client(http2=True, limits=httpx.Limits(max_connections=POOL, max_keepalive_connections=POOL))
+        except ImportError as e:
+            print(f"[transport] NOVA_HTTP2=1 but {e}; using HTTP/1.1", flush=True)
+    s = requests.Session()
+    adapter = _Adapter(pool_connections=POOL, pool_maxsize=POOL)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+    return s
+
+def client():
+    """This process's session (a new one after fork: pooled sockets are not shared)."""
+    global _client, _pid
+    if _client is None or _pid != os.getpid():
+        with _lock:
+            if _client is None or _pid != os.getpid():
+                _client, _pid = _new_client(), os.getpid()
+    return _client
+
+def _send(method: str, url: str, body, params, timeout: float):
+    c = client()
+    if isinstance(c, requests.Session):
+        r = c.request(method, url, json=body, params=params, timeout=(min(CONNECT_TIMEOUT, timeout), timeout))
+        return r.status_code, r.text, r.reason
+    import httpx
+    try:
+        r = c.request(method, url, json=body, params=params, extensions={"trace": _trace},
+                      timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)))
+    except httpx.ConnectError as e:
+        raise requests.ConnectionError(NewConnectionError(None, str(e))) from e
+    except httpx.TimeoutException as e:
+        raise requests.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.ConnectionError(str(e)) from e
+    return r.status_code, r.text, r.reason_phrase
+
+def _unsent(e: Exception) -> bool:
+    # the request never left: safe to retry even when the call is not idempotent
+    reason = getattr(e.args[0], "reason", e.args[0]) if e.args else None
+    return isinstance(e, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+def request(method: str, url: str, body=None, params=None, timeout: float = 10,
+            idempotent: bool | None = None) -> dict:
+    """Send one JSON request and return the reply's JSON ({"ok": False, "raw": text}
+    if it is not JSON). Raises requests.HTTPError on 4xx/5xx."""
+    if idempotent is None:
+        idempotent = method.upper() in ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+    for attempt in range(RETRIES + 1):
+        _count("requests")
+        try:
+            status, text, reason = _send(method, url, body, params, timeout)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt == RETRIES or not (idempotent or _unsent(e)):
+                _count("errors")
+                raise
+        else:
+            if status not in RETRY_STATUS or not idempotent or attempt == RETRIES:
+                break
+        _count("retries")
+        time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF * 2 ** attempt)))
+    if status >= 400:
+        _count("errors")
+        raise requests.HTTPError(f"{status} {reason} for url: {url}")
+    try:
+        return json.loads(text or "{}")
+    except ValueError:
+        return {"ok": False, "raw": text}
+
+def post_json(url: str, body: dict, timeout: float = 10, idempotent: bool = False) -> dict:
+    return request("POST", url, body=body, timeout=timeout, idempotent=idempotent)
+
+def get_json(url: str, params: dict | None = None, timeout: float = 10) -> dict:
+    return request("GET", url, params=params, timeout=timeout)
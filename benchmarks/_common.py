@@ -0,0 +1,6 @@
+"""Helpers shared by the benchmark scripts (run as scripts, so this directory is on sys.path)."""
+
+def pct(samples, p: float) -> float:
+    """The p-th percentile (nearest rank) of `samples`, in their unit; 0.0 when empty."""
+    s = sorted(samples)
+    return s[min(len(s) - 1, int(len(s) * p / 100))] if s else 0.0
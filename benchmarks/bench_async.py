@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Load test: sync server (server:app) vs async server (server_async:app).
+
+Starts each app under uvicorn against REDIS_URL (a real Redis is required: the
+two apps run in separate processes) and drives it with N concurrent simulated
+agents, each looping write / read / search. Reports requests/sec and latency
+percentiles. --waiters adds that many idle agents long-polling alongside them
+(memory.watch and memory.claim with --wait, on topics and roles nothing writes to),
+as executors and watchers do between tasks:
+
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_async.py --agents 200 --seconds 20
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_async.py --agents 200 --waiters 100
+"""
+import os, sys, time, random, asyncio, argparse, subprocess, statistics
+
+import httpx
+
+from _common import pct
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVER_DIR = os.path.join(ROOT, "mcp", "memory_server")
+
+async def _agent(client, i, deadline, lat, keys, errors):
+    rnd = random.Random(i)
+    while time.perf_counter() < deadline:
+        op = rnd.random()
+        t0 = time.perf_counter()
+        try:
+            if op < 0.6 or not keys:
+                res = await client.post("/tools/memory.write", json={"data": {
+                    "agent": f"Agent{i}", "type": "event", "topic": "heartbeat", "payload": {"alive": True}}})
+                res.raise_for_status()
+                keys.append(res.json()["key"])
+            elif op < 0.9:
+                (await client.post("/tools/memory.read", json={"key": rnd.choice(keys)})).raise_for_status()
+            else:
+                (await client.post("/tools/memory.search", json={"q": f"agent{i}", "limit": 20})).raise_for_status()
+        except httpx.HTTPError as e:
+            errors.append(repr(e))
+            continue
+        lat.append(time.perf_counter() - t0)
+
+async def _waiter(client, i, deadline, wait, polls, errors):
+    while time.perf_counter() < deadline:
+        path, body = (("/tools/memory.watch", {"where": {"topic": f"bench-idle-{i}"}, "wait": wait}) if i % 2 else
+                      ("/tools/memory.claim", {"role": f"bench-idle-{i}", "claimer": f"Waiter{i}", "wait": wait}))
+        try:
+            (await client.post(path, json=body, timeout=wait + 30)).raise_for_status()
+            polls.append(1)
+        except httpx.HTTPError as e:
+            errors.append(repr(e))
+
+async def _drive(url, agents, seconds, waiters=0, wait=5):
+    # a client per agent: one shared httpx pool of hundreds of connections makes the
+    # client, not the server, the bottleneck
+    limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+    clients = [httpx.AsyncClient(base_url=url, limits=limits, timeout=30) for _ in range(agents + waiters)]
+    lat, keys, errors, polls = [], [], [], []
+    deadline = time.perf_counter() + seconds
+    t0 = time.perf_counter()
+    await asyncio.gather(*(_agent(clients[i], i, deadline, lat, keys, errors) for i in range(agents)),
+                         *(_waiter(clients[agents + i], i, deadline, wait, polls, errors) for i in range(waiters)))
+    elapsed = time.perf_counter() - t0
+    for c in clients:
+        await c.aclose()
+    return lat, errors, elapsed, len(polls)
+
+def _serve(module, port, workers):
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", f"{module}:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=SERVER_DIR, env={**os.environ, "MCP_CACHE_SIZE": os.getenv("MCP_CACHE_SIZE", "10000")},
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).raise_for_status()
+            return proc
+        except Exception:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError(f"{module} did not start")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--agents", type=int, default=200)
+    ap.add_argument("--seconds", type=float, default=20)
+    ap.add_argument("--workers", type=int, default=1)
+    ap.add_argument("--waiters", type=int, default=0, help="extra agents long-polling watch/claim")
+    ap.add_argument("--wait", type=float, default=5, help="seconds each long-poll waits")
+    args = ap.parse_args()
+    if not os.getenv("REDIS_URL"):
+        sys.exit("set REDIS_URL to a running redis-server")
+
+    for i, module in enumerate(("server", "server_async")):
+        port = 8710 + i
+        proc = _serve(module, port, args.workers)
+        try:
+            lat, errors, elapsed, polls = asyncio.run(_drive(f"http://127.0.0.1:{port}", args.agents, args.seconds,
+                                                             args.waiters, args.wait))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{module:<13} agents={args.agents} reqs={len(lat):>7} rps={len(lat) / elapsed:8.0f} "
+              f"p50={statistics.median(lat) * 1000:7.1f}ms p99={pct(lat, 99) * 1000:7.1f}ms errors={len(errors)}"
+              + (f" waiters={args.waiters} polls={polls}" if args.waiters else ""))
+        if errors:
+            print("  first error:", errors[0])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+A planner burst against a slower executor, with enqueue_task backpressure off and in
+each on_full mode.
+
+A producer enqueues --tasks tasks as fast as it can while an ActionExecutorAgent
+Executor (--workers handler threads sleeping --sleep seconds) drains them. A sampler
+polls queue_stats every 50ms. Reports the peak pending depth, the tasks queued and
+dropped, and how long the producer spent enqueueing (blocked time included). The
+watermarks come from MCP_QUEUE_HIGH / MCP_QUEUE_LOW, set here from --high / --low
+before the backend starts:
+
+    python benchmarks/bench_backpressure.py                                   # embedded SQLite
+    python benchmarks/bench_backpressure.py --tasks 2000 --high 200 --low 100 --modes off block
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_backpressure.py --backend redis --out backpressure.json
+
+(with --backend http, the server's own watermarks apply.)
+"""
+import os, sys, json, time, uuid, argparse, threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+def run(mode: str, args, m, executor) -> dict:
+    role = f"bench-bp-{mode}-{uuid.uuid4().hex[:6]}"
+    ex = executor.Executor(role=role, worker=f"bench-{mode}", workers=args.workers, inflight=2 * args.workers,
+                           handlers={"sleep": lambda task: time.sleep(args.sleep) or {}}, batch=20, claim_wait=0.2)
+    stop, done = threading.Event(), threading.Event()
+    peak = [0]
+
+    def sample():
+        while not done.is_set():
+            peak[0] = max(peak[0], m.queue_stats([role])[role]["pending"])
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=ex.run, args=(stop,), daemon=True), threading.Thread(target=sample, daemon=True)]
+    for t in threads:
+        t.start()
+    t0 = time.time()
+    keys = [m.enqueue_task("sleep", {}, assigned_to=role, created_by="bench", on_full=None if mode == "off" else mode)
+            for _ in range(args.tasks)]
+    produced = time.time() - t0
+    queued = [k for k in keys if k]
+    while time.time() < t0 + args.timeout:
+        st = m.queue_stats([role])[role]
+        if not st["pending"] and not st["claimed"]:
+            break
+        time.sleep(0.1)
+    done.set()
+    stop.set()
+    for t in threads:
+        t.join()
+    return {"mode": mode, "tasks": args.tasks, "queued": len(queued), "dropped": args.tasks - len(queued),
+            "peak_pending": peak[0], "produce_s": round(produced, 2), "total_s": round(time.time() - t0, 2)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["embedded", "redis", "http"], default="embedded")
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    ap.add_argument("--modes", nargs="+", choices=["off", "block", "shed", "sample"],
+                    default=["off", "block", "shed", "sample"])
+    ap.add_argument("--tasks", type=int, default=1000)
+    ap.add_argument("--workers", type=int, default=8)
+    ap.add_argument("--sleep", type=float, default=0.02, help="seconds per task")
+    ap.add_argument("--high", type=int, default=100)
+    ap.add_argument("--low", type=int, default=50)
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    os.environ["MCP_QUEUE_HIGH"], os.environ["MCP_QUEUE_LOW"] = str(args.high), str(args.low)
+    os.environ.setdefault("NOVA_QUEUE_CHECK_INTERVAL", "0.05")
+    from agents._lib import memory_backend
+    from agents._lib import memory as m
+    from agents.ActionExecutorAgent import main as executor
+
+    if args.backend == "embedded":
+        memory_backend.use(memory_backend.EmbeddedBackend(args.sqlite))
+    elif args.backend == "redis":
+        memory_backend.use(memory_backend.RedisBackend())
+    else:
+        memory_backend.use(memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL")))
+
+    results = []
+    for mode in args.modes:
+        res = run(mode, args, m, executor)
+        results.append(res)
+        print(f"{mode:<7} queued {res['queued']:>5}/{res['tasks']} (dropped {res['dropped']:>5})  peak pending "
+              f"{res['peak_pending']:>5}  producer {res['produce_s']:>6.2f}s  all done {res['total_s']:>6.2f}s", flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {"backend": args.backend, **vars(args), "time": time.time()}, "results": results},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Stored payload size and decode cost per codec spec.
+
+For each spec, loads the same records (small heartbeats plus ~2 KB artifacts)
+with that codec, then reports the mean stored payload bytes, the pure decode
+time for one scan page, and the end-to-end time of a full memory.search scan
+(read cache off, so every hit is decoded). Uses REDIS_URL if set, otherwise an
+in-memory fakeredis.
+
+    python benchmarks/bench_codec.py --records 5000
+"""
+import os, sys, time, random, argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "mcp", "memory_server"))
+os.environ["MCP_CACHE_SIZE"] = "0"
+
+import server, codec  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+SPECS = ["json", "orjson", "msgpack", "json+zlib", "orjson+zlib", "msgpack+zlib", "msgpack+zstd"]
+
+def _records(n: int) -> list[dict]:
+    rnd = random.Random(7)
+    words = [f"term{i}" for i in range(800)]
+    out = []
+    for i in range(n):
+        if i % 4:
+            out.append({"agent": f"Agent{i % 20}", "type": "event", "topic": "heartbeat",
+                        "payload": {"alive": True}, "ts": time.time()})
+        else:
+            out.append({"agent": "PerplexityFetcher", "type": "artifact", "ts": time.time(),
+                        "payload": {"query": " ".join(rnd.choices(words, k=8)),
+                                    "answer": " ".join(rnd.choices(words, k=300)),
+                                    "sources": [f"https://example.com/{rnd.randint(0, 10**6)}" for _ in range(5)]}})
+    return out
+
+def _fresh():
+    if os.getenv("REDIS_URL"):
+        server.r.flushdb()
+        return
+    import fakeredis
+    fake = fakeredis.FakeServer()
+    server.bind(fakeredis.FakeRedis(server=fake, decode_responses=True), fakeredis.FakeRedis(server=fake))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=5000)
+    args = ap.parse_args()
+    recs = _records(args.records)
+    server.SCAN_BUDGET = args.records
+
+    print(f"{'spec':<14}{'bytes/rec':>10}{'decode/page':>14}{'scan search':>14}")
+    for spec in SPECS:
+        try:
+            server.CODECS = codec.CodecMap(spec)
+        except ValueError as e:
+            print(f"{spec:<14} skipped: {e}")
+            continue
+        _fresh()
+        pipe = server.r.pipeline(transaction=False)
+        for i, data in enumerate(recs):
+            server._queue_write(pipe, f"{server.NAMESPACE}:{i}", data, time.time())
+        pipe.execute()
+
+        keys = [f"{server.NAMESPACE}:{i}" for i in range(args.records)]
+        pipe = server.rb.pipeline(transaction=False)
+        for k in keys:
+            pipe.hmget(k, "payload", "enc")
+        raws = pipe.execute()
+        size = sum(len(p) for p, _ in raws) / len(raws)
+
+        page = raws[:server.SCAN_PAGE]
+        t0 = time.perf_counter()
+        for _ in range(20):
+            for p, enc in page:
+                codec.decode(p, enc)
+        decode_ms = (time.perf_counter() - t0) / 20 * 1000
+
+        client = TestClient(server.app)
+        t0 = time.perf_counter()
+        client.post("/tools/memory.search", json={"q": "no-such-term", "limit": 1, "scan": True}).raise_for_status()
+        search_ms = (time.perf_counter() - t0) * 1000
+        print(f"{spec:<14}{size:>10.0f}{decode_ms:>12.2f}ms{search_ms:>12.0f}ms")
+
+if __name__ == "__main__":
+    main()
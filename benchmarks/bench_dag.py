@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Dependency DAGs end to end: --dags copies of a launch pipeline modelled on the
+C-suite agents' stages, with one fan-out and one join,
+
+    compliance -> experience_plan, research_summary, cost_estimate -> clarity_check
+               -> staff_update -> final_report
+
+run by --executors ActionExecutorAgent executors (one handler thread each) whose
+handlers sleep --sleep seconds. Children are released by their parents' completion,
+so the three middle branches can run on different executors at once. Reports per-DAG
+critical-path latency from dag_report, and its split into run time, queue wait and
+release delay:
+
+    python benchmarks/bench_dag.py                                   # embedded SQLite
+    python benchmarks/bench_dag.py --executors 1 3 --dags 10
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_dag.py --backend redis --out dag.json
+"""
+import os, sys, json, time, uuid, argparse, threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import memory_backend
+from agents._lib import memory as m
+from agents.ActionExecutorAgent import main as executor
+from _common import pct
+
+STAGES = [  # (stage, parents)
+    ("compliance", []),
+    ("experience_plan", ["compliance"]),
+    ("research_summary", ["compliance"]),
+    ("cost_estimate", ["compliance"]),
+    ("clarity_check", ["experience_plan", "research_summary", "cost_estimate"]),
+    ("staff_update", ["clarity_check"]),
+    ("final_report", ["staff_update"]),
+]
+
+def _enqueue_dag(role: str) -> str:
+    dag = uuid.uuid4().hex[:12]
+    keys = {}
+    for stage, parents in STAGES:
+        keys[stage] = m.enqueue_task(stage, {}, assigned_to=role, created_by="bench",
+                                     depends_on=[keys[p] for p in parents] or None, dag=dag)
+    return dag
+
+def run(n_exec: int, args) -> dict:
+    role = f"bench-dag-{uuid.uuid4().hex[:6]}"
+    sleep = lambda task: time.sleep(args.sleep) or {"ok": True}
+    stop = threading.Event()
+    threads = []
+    for i in range(n_exec):
+        ex = executor.Executor(role=role, worker=f"bench-{i}", handlers={s: sleep for s, _ in STAGES},
+                               workers=1, inflight=1, batch=1, claim_wait=0.2)
+        threads.append(threading.Thread(target=ex.run, args=(stop,), daemon=True))
+        threads[-1].start()
+    t0 = time.time()
+    dags = [_enqueue_dag(role) for _ in range(args.dags)]
+    reports = {}
+    while len(reports) < len(dags) and time.time() < t0 + args.timeout:
+        for d in dags:
+            if d not in reports:
+                rep = m.dag_report(d)
+                if rep["status"].get("done") == len(STAGES):
+                    reports[d] = rep
+        time.sleep(0.1)
+    stop.set()
+    for t in threads:
+        t.join()
+    cp = [r["critical_path_s"] for r in reports.values()]
+    mean = lambda f: round(sum(r[f] for r in reports.values()) / len(reports), 4) if reports else None
+    return {"executors": n_exec, "dags": len(dags), "completed": len(reports), "seconds": round(time.time() - t0, 2),
+            "critical_path_p50_s": round(pct(cp, 50), 3), "critical_path_max_s": round(max(cp), 3) if cp else None,
+            "run_s": mean("run_s"), "wait_s": mean("wait_s"), "release_s": mean("release_s"),
+            "ideal_critical_path_s": round(5 * args.sleep, 3)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["embedded", "redis", "http"], default="embedded")
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    ap.add_argument("--executors", type=int, nargs="+", default=[1, 3])
+    ap.add_argument("--dags", type=int, default=1)
+    ap.add_argument("--sleep", type=float, default=0.2, help="seconds per task")
+    ap.add_argument("--timeout", type=float, default=120)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    if args.backend == "embedded":
+        memory_backend.use(memory_backend.EmbeddedBackend(args.sqlite))
+    elif args.backend == "redis":
+        memory_backend.use(memory_backend.RedisBackend())
+    else:
+        memory_backend.use(memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL")))
+
+    results = []
+    for n in args.executors:
+        res = run(n, args)
+        results.append(res)
+        print(f"executors {n:>2}  {res['completed']}/{res['dags']} dags in {res['seconds']:>6.2f}s  critical path "
+              f"p50 {res['critical_path_p50_s']}s (ideal {res['ideal_critical_path_s']}s): run {res['run_s']}s "
+              f"wait {res['wait_s']}s release {res['release_s']}s", flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {"backend": args.backend, "sleep": args.sleep, "time": time.time()}, "results": results},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Duplicate tasks from NovaCore-style planners, with a process-local `seen` set vs
+enqueue_task(dedupe_key=...).
+
+--planners planners run side by side. Artifacts arrive one at a time; on each, every
+planner re-plans the newest --window artifacts (what NovaCore's catch-up query does),
+and each planner restarts every --restart-every artifacts (local mode: its seen set
+is lost). Reports tasks queued per artifact: duplicates (queued more than once) and
+false positives (never queued although new), plus enqueue latency and the bytes the
+dedupe keys store (key + value strings, before Redis per-key overhead):
+
+    python benchmarks/bench_dedupe.py                                   # embedded SQLite
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_dedupe.py --backend redis --out dedupe.json
+"""
+import os, sys, json, time, uuid, argparse, threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import memory_backend
+from agents._lib import memory as m
+from _common import pct
+
+def run(mode: str, args) -> dict:
+    role = f"bench-dedupe-{mode}-{uuid.uuid4().hex[:6]}"
+    artifacts = [f"{role}:artifact:{i}" for i in range(args.artifacts)]
+    queued, lat, lock = {}, [], threading.Lock()
+
+    def planner(p: int):
+        seen = set()
+        for i in range(len(artifacts)):
+            if i % args.restart_every == p % args.restart_every:
+                seen = set()  # restart
+            for a in artifacts[max(0, i - args.window + 1):i + 1]:
+                if mode == "local" and a in seen:
+                    continue
+                seen.add(a)
+                t0 = time.perf_counter()
+                key = m.enqueue_task("publish_artifact", {"source_key": a}, assigned_to=role, created_by=f"planner{p}",
+                                     dedupe_key=f"publish_artifact:{a}" if mode == "dedupe" else None)
+                with lock:
+                    lat.append(time.perf_counter() - t0)
+                    if key:
+                        queued[a] = queued.get(a, 0) + 1
+
+    threads = [threading.Thread(target=planner, args=(p,)) for p in range(args.planners)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - t0
+    ns = os.getenv("MCP_NAMESPACE", "nova:mem")
+    stored = sum(len(f"{ns}:dedupe:publish_artifact:{a}") + len("nova:task:") + 32 for a in artifacts)
+    return {"mode": mode, "artifacts": len(artifacts), "planners": args.planners, "enqueue_calls": len(lat),
+            "tasks_queued": sum(queued.values()),
+            "duplicates": sum(n - 1 for n in queued.values()),
+            "false_positives": sum(1 for a in artifacts if a not in queued),
+            "enqueue_p50_ms": round(pct(lat, 50) * 1000, 2), "enqueue_p95_ms": round(pct(lat, 95) * 1000, 2),
+            "seconds": round(seconds, 2),
+            "dedupe_bytes": stored if mode == "dedupe" else 0}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["embedded", "redis", "http"], default="embedded")
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    ap.add_argument("--artifacts", type=int, default=300)
+    ap.add_argument("--planners", type=int, default=2)
+    ap.add_argument("--window", type=int, default=30, help="artifacts re-planned on each arrival")
+    ap.add_argument("--restart-every", type=int, default=50)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    if args.backend == "embedded":
+        memory_backend.use(memory_backend.EmbeddedBackend(args.sqlite))
+    elif args.backend == "redis":
+        memory_backend.use(memory_backend.RedisBackend())
+    else:
+        memory_backend.use(memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL")))
+
+    results = []
+    for mode in ("local", "dedupe"):
+        res = run(mode, args)
+        results.append(res)
+        print(f"{mode:<7} {res['tasks_queued']:>6} tasks for {res['artifacts']} artifacts: "
+              f"{res['duplicates']} duplicates, {res['false_positives']} false positives; "
+              f"enqueue p50 {res['enqueue_p50_ms']}ms p95 {res['enqueue_p95_ms']}ms"
+              + (f"; dedupe keys {res['dedupe_bytes'] / 1024:.1f} KiB" if res["dedupe_bytes"] else ""), flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {"backend": args.backend, **vars(args), "time": time.time()}, "results": results},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main()
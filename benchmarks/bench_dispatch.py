@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Task dispatch: memory requests made by an idle executor, and the delay from
+enqueue_task to an executor claiming the task, for three executor loops:
+
+    poll      find_pending_tasks, then sleep --poll seconds when nothing is pending
+    longpoll  find_pending_tasks(wait=30): the server holds the call until a task lands
+    claim     claim_next_task(wait=30): the role's task stream (ActionExecutorAgent today)
+
+Each mode runs one executor thread: first --idle seconds with no tasks (requests
+counted), then --tasks tasks enqueued at random gaps averaging --gap seconds.
+Runs through agents._lib.memory on any backend:
+
+    python benchmarks/bench_dispatch.py                                   # embedded SQLite
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_dispatch.py --backend redis
+    MCP_MEMORY_URL=http://localhost:8000 python benchmarks/bench_dispatch.py --backend http --out dispatch.json
+"""
+import os, sys, json, time, uuid, random, argparse, threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import memory_backend
+from agents._lib import memory as m
+from _common import pct
+
+class _Counting:
+    """Wraps a backend and counts calls per tool."""
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def call(self, tool, body, timeout=10):
+        with self.lock:
+            self.calls[tool] = self.calls.get(tool, 0) + 1
+        return self.inner.call(tool, body, timeout=timeout)
+
+    def total(self) -> int:
+        with self.lock:
+            return sum(self.calls.values())
+
+def _executor(mode: str, role: str, poll: float, seen: dict, stop: threading.Event) -> None:
+    while not stop.is_set():
+        if mode == "claim":
+            rec = m.claim_next_task(role, claimer="bench", wait=30)
+            got = [(rec["key"], rec["data"])] if rec else []
+        else:
+            tasks = m.find_pending_tasks(role, limit=20, wait=30 if mode == "longpoll" else 0)
+            got = [(t["key"], m.claim_task(t["key"], claimer="bench")) for t in tasks]
+            if not tasks and mode == "poll":
+                stop.wait(poll)
+        now = time.time()
+        for key, data in got:
+            if data:
+                seen[key] = now - data["payload"]["t0"]
+                m.complete_task(key, {"ok": True})
+
+def run(mode: str, args, counter: _Counting) -> dict:
+    role = f"bench-{mode}-{uuid.uuid4().hex[:6]}"
+    seen, stop = {}, threading.Event()
+    t = threading.Thread(target=_executor, args=(mode, role, args.poll, seen, stop), daemon=True)
+    t.start()
+    time.sleep(0.2)
+    before = counter.total()
+    time.sleep(args.idle)
+    idle_requests = counter.total() - before
+
+    rnd = random.Random(11)
+    keys = []
+    for _ in range(args.tasks):
+        time.sleep(rnd.uniform(0, 2 * args.gap))
+        keys.append(m.enqueue_task("noop", {"t0": time.time()}, assigned_to=role, created_by="bench"))
+    deadline = time.time() + args.poll + 35
+    while len(seen) < len(keys) and time.time() < deadline:
+        time.sleep(0.05)
+    stop.set()
+    lat = [seen[k] for k in keys if k in seen]
+    return {"mode": mode, "idle_seconds": args.idle, "idle_requests": idle_requests,
+            "idle_requests_per_min": round(idle_requests * 60 / args.idle, 1),
+            "tasks": len(keys), "dispatched": len(lat),
+            "dispatch_p50_ms": round(pct(lat, 50) * 1000, 1), "dispatch_p95_ms": round(pct(lat, 95) * 1000, 1),
+            "dispatch_max_ms": round(max(lat) * 1000, 1) if lat else 0.0}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["embedded", "redis", "http"], default="embedded")
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    ap.add_argument("--modes", nargs="+", choices=["poll", "longpoll", "claim"], default=["poll", "longpoll", "claim"])
+    ap.add_argument("--poll", type=float, default=5.0, help="poll mode: sleep between empty polls")
+    ap.add_argument("--idle", type=float, default=60.0, help="seconds with no tasks, to count idle requests")
+    ap.add_argument("--tasks", type=int, default=20)
+    ap.add_argument("--gap", type=float, default=1.0, help="mean seconds between enqueues")
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    if args.backend == "embedded":
+        inner = memory_backend.EmbeddedBackend(args.sqlite)
+    elif args.backend == "redis":
+        inner = memory_backend.RedisBackend()
+    else:
+        inner = memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL"))
+    counter = _Counting(inner)
+    memory_backend.use(counter)
+
+    results = []
+    for mode in args.modes:
+        res = run(mode, args, counter)
+        results.append(res)
+        print(f"{mode:<9} idle {res['idle_requests_per_min']:>7.1f} req/min   dispatch p50 {res['dispatch_p50_ms']:>8.1f}ms"
+              f"  p95 {res['dispatch_p95_ms']:>8.1f}ms  ({res['dispatched']}/{res['tasks']})", flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {"backend": args.backend, "poll": args.poll, "time": time.time()}, "results": results},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main()
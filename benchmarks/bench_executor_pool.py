@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+ActionExecutorAgent throughput against worker count, with synthetic handlers that
+sleep --sleep seconds (an external API call, say).
+
+For each --workers value: enqueue --tasks "sleep" tasks for a fresh role, run an
+Executor (agents/ActionExecutorAgent/main.py) until every task is done, and report
+tasks/s. --slow adds that many "slow" tasks (10x the sleep) capped at --slow-limit
+running at once, to show a slow task type not starving the rest:
+
+    python benchmarks/bench_executor_pool.py                                   # embedded SQLite
+    python benchmarks/bench_executor_pool.py --workers 1 4 16 --tasks 400 --slow 40
+    REDIS_URL=redis://localhost:6379 python benchmarks/bench_executor_pool.py --backend redis --out pool.json
+"""
+import os, sys, json, time, uuid, argparse, threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import memory_backend
+from agents._lib import memory as m
+from agents.ActionExecutorAgent import main as executor
+
+def _sleeper(seconds: float):
+    def handle(task):
+        time.sleep(seconds)
+        return {"slept": seconds}
+    return handle
+
+def _done(keys: list) -> dict:
+    out = {}
+    for i in range(0, len(keys), 500):
+        for k, rec in zip(keys[i:i + 500], m.mem_read_many(keys[i:i + 500])):
+            if rec and rec["data"]["status"] == "done":
+                out[k] = rec["data"]["done_ts"]
+    return out
+
+def run(workers: int, args) -> dict:
+    role = f"bench-pool-{uuid.uuid4().hex[:6]}"
+    t0 = time.time()
+    fast = [m.enqueue_task("sleep", {}, assigned_to=role, created_by="bench") for _ in range(args.tasks)]
+    slow = [m.enqueue_task("slow", {}, assigned_to=role, created_by="bench") for _ in range(args.slow)]
+    ex = executor.Executor(role=role, worker=f"bench-{workers}", workers=workers, inflight=2 * workers,
+                           handlers={"sleep": _sleeper(args.sleep), "slow": _sleeper(10 * args.sleep)},
+                           limits={"slow": args.slow_limit}, batch=args.batch, claim_wait=0.2)
+    stop = threading.Event()
+    t = threading.Thread(target=ex.run, args=(stop,), daemon=True)
+    start = time.time()
+    t.start()
+    deadline = start + args.timeout
+    done = {}
+    while time.time() < deadline:
+        done = _done(fast + slow)
+        if len(done) == len(fast) + len(slow):
+            break
+        time.sleep(0.1)
+    stop.set()
+    t.join()
+    fast_done = [done[k] for k in fast if k in done]
+    seconds = (max(done.values()) if done else time.time()) - start
+    return {"workers": workers, "tasks": len(fast), "slow": len(slow), "completed": len(done),
+            "seconds": round(seconds, 2), "tasks_per_s": round(len(done) / seconds, 1) if seconds > 0 else 0.0,
+            "fast_done_s": round(max(fast_done) - start, 2) if fast_done else None,
+            "ideal_s": round(max(args.tasks * args.sleep / workers,
+                                 args.slow * 10 * args.sleep / min(workers, args.slow_limit or 1)), 2),
+            "enqueue_s": round(start - t0, 2)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", choices=["embedded", "redis", "http"], default="embedded")
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--tasks", type=int, default=200)
+    ap.add_argument("--sleep", type=float, default=0.05, help="seconds per synthetic task")
+    ap.add_argument("--slow", type=int, default=0, help="extra tasks of a slow type (10x --sleep)")
+    ap.add_argument("--slow-limit", type=int, default=2, help="max slow tasks running at once")
+    ap.add_argument("--batch", type=int, default=20)
+    ap.add_argument("--timeout", type=float, default=300)
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+
+    if args.backend == "embedded":
+        memory_backend.use(memory_backend.EmbeddedBackend(args.sqlite))
+    elif args.backend == "redis":
+        memory_backend.use(memory_backend.RedisBackend())
+    else:
+        memory_backend.use(memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL")))
+
+    results = []
+    for w in args.workers:
+        res = run(w, args)
+        results.append(res)
+        print(f"workers {w:>3}  {res['completed']:>5}/{res['tasks'] + res['slow']} in {res['seconds']:>6.2f}s "
+              f"(ideal {res['ideal_s']:>6.2f}s)  {res['tasks_per_s']:>7.1f} tasks/s"
+              + (f"  fast tasks done at {res['fast_done_s']}s" if args.slow else ""), flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {"backend": args.backend, "sleep": args.sleep, "time": time.time()}, "results": results},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+The primary node's share of every write, and the write rate at which it becomes the
+ceiling of a sharded memory server.
+
+A record's own commands go to the node that owns it, but every write also adds its
+change-feed entry to the primary (with the cache invalidation PUBLISH, and the queue
+updates for tasks), so as shards are added the primary saturates before the record
+nodes do. Writes --records records (--tasks of them pending tasks) through server.py
+in-process, in requests of --batch, against REDIS_URLS, then reads each node's Redis
+CPU time (INFO cpu) and commands (INFO commandstats) per write:
+
+  feed        the primary's CPU per write beyond its share of the records
+              (primary minus the mean of the other nodes; needs 2+ nodes)
+  ceiling(N)  writes/s at which the primary is saturated with N nodes:
+              1e6 / (feed + record work / N); it tends to 1e6 / feed
+
+Needs real redis-server nodes (the numbers are theirs) and a namespace of its own:
+
+    REDIS_URLS=redis://127.0.0.1:6379/0,redis://127.0.0.1:6380/0 python benchmarks/bench_feed.py
+    REDIS_URLS=... python benchmarks/bench_feed.py --records 20000 --batch 100 --out feed.json
+"""
+import os, sys, json, time, uuid, argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "mcp", "memory_server"))
+os.environ.setdefault("MCP_NAMESPACE", f"bench-feed-{uuid.uuid4().hex[:8]}")
+os.environ.setdefault("MCP_TASK_SWEEP_INTERVAL", "0")
+
+def _record(i: int, tasks: float) -> dict:
+    if i % 100 < tasks * 100:
+        return {"data": {"type": "task", "status": "pending", "task_type": "noop", "assigned_to": f"Bench{i % 8}",
+                         "created_by": "bench"}}
+    return {"data": {"agent": f"Agent{i % 50}", "type": "event", "topic": "heartbeat", "payload": {"i": i}}}
+
+def _cpu(c) -> float:
+    info = c.info("cpu")
+    return info["used_cpu_user"] + info["used_cpu_sys"]
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=10000)
+    ap.add_argument("--batch", type=int, default=1, help="records per request (1 = memory.write)")
+    ap.add_argument("--tasks", type=float, default=0.2, help="fraction of records that are pending tasks")
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+    if not os.getenv("REDIS_URLS") or "," not in os.getenv("REDIS_URLS"):
+        sys.exit("set REDIS_URLS to two or more redis-server nodes")
+
+    import server
+    for c in server.nodes:
+        c.config_resetstat()
+    before = [_cpu(c) for c in server.nodes]
+    t0 = time.perf_counter()
+    for start in range(0, args.records, args.batch):
+        recs = [_record(i, args.tasks) for i in range(start, min(args.records, start + args.batch))]
+        if args.batch == 1:
+            server.memory_write(server.WriteReq(**recs[0]))
+        else:
+            server.memory_write_batch(server.WriteBatchReq(records=recs))
+    elapsed = time.perf_counter() - t0
+
+    n = args.records
+    nodes = []
+    for i, c in enumerate(server.nodes):
+        stats = c.info("commandstats")
+        calls = {k[len("cmdstat_"):]: v["calls"] for k, v in stats.items()}
+        nodes.append({"node": i, "cpu_us_per_write": round((_cpu(c) - before[i]) * 1e6 / n, 2),
+                      "commands_per_write": round(sum(calls.values()) / n, 2),
+                      "feed_commands_per_write": round((calls.get("xadd", 0) + calls.get("publish", 0)) / n, 2)})
+    total = sum(x["cpu_us_per_write"] for x in nodes)
+    others = sum(x["cpu_us_per_write"] for x in nodes[1:]) / (len(nodes) - 1)
+    feed = max(0.0, nodes[0]["cpu_us_per_write"] - others)
+    records = total - feed
+    ceilings = {k: round(1e6 / (feed + records / k)) for k in (2, 4, 8, 16, len(nodes))}
+    for x in nodes:
+        print(f"node {x['node']}{' (primary)' if x['node'] == 0 else '          '}  {x['cpu_us_per_write']:7.1f} us/write  "
+              f"{x['commands_per_write']:5.1f} commands/write  (feed xadd+publish {x['feed_commands_per_write']:.1f})")
+    print(f"records={n} batch={args.batch} tasks={args.tasks} nodes={len(nodes)} client {n / elapsed:.0f} writes/s")
+    print(f"feed on the primary {feed:.1f} us/write, record work {records:.1f} us/write in all")
+    print("primary ceiling (writes/s): " + "  ".join(f"{k} nodes {v}" for k, v in sorted(ceilings.items()))
+          + (f"  -> {1e6 / feed:.0f} at most" if feed else ""))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {**vars(args), "nodes": len(nodes), "time": time.time()},
+                       "nodes": nodes, "feed_us": round(feed, 2), "ceilings": ceilings}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+memory.fts (inverted index) vs memory.search scan mode at several record counts.
+
+Records are loaded straight through the server's write pipeline (no HTTP) and
+queries go through FastAPI's TestClient. Uses REDIS_URL if set, otherwise an
+in-memory fakeredis.
+
+    python benchmarks/bench_fts.py --sizes 10000 100000 1000000
+"""
+import os, sys, time, random, argparse, statistics
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "mcp", "memory_server"))
+os.environ["MCP_FTS"] = "1"
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+WORDS = [f"w{i}" for i in range(5000)]
+
+def _load(n: int, chunk: int = 2000) -> None:
+    rnd = random.Random(n)
+    for start in range(0, n, chunk):
+        pipe = server.r.pipeline(transaction=False)
+        for i in range(start, min(n, start + chunk)):
+            text = " ".join(rnd.choices(WORDS, k=20))
+            if i % 1000 == 0:
+                text += " needle"
+            data = {"agent": "Bench", "type": "artifact", "payload": {"text": text, "common": "alpha"}}
+            server._queue_write(pipe, f"{server.NAMESPACE}:{i}", data, time.time())
+        pipe.execute()
+
+def _time(client, path: str, body: dict, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        client.post(path, json=body).raise_for_status()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--runs", type=int, default=5)
+    args = ap.parse_args()
+
+    import fakeredis
+    for n in args.sizes:
+        if os.getenv("REDIS_URL"):
+            server.r.flushdb()
+        else:
+            fake = fakeredis.FakeServer()
+            server.bind(fakeredis.FakeRedis(server=fake, decode_responses=True), fakeredis.FakeRedis(server=fake))
+        server.SCAN_BUDGET = n
+        _load(n)
+        client = TestClient(server.app)
+        for term in ("needle", "alpha"):
+            scan = _time(client, "/tools/memory.search", {"q": term, "limit": 20, "scan": True, "budget": n}, args.runs)
+            idx = _time(client, "/tools/memory.fts", {"q": term, "limit": 20}, args.runs)
+            print(f"records={n:>8} term={term:<7} scan={scan:10.1f} ms  fts={idx:8.1f} ms  x{scan / idx:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of the agents' memory POSTs, with urllib and a fresh connection per
+call (how telemetry and the entrypoints posted before) against the pooled keep-alive
+session in agents/_lib/transport.py.
+
+Runs --calls sequential POSTs of a heartbeat-sized record per client, against a
+local stand-in that answers memory.write (HTTP/1.1 keep-alive, TLS with --tls) or
+against a real server with --url. Reports p50/p95 per call and the connections
+transport opened. --flaky makes the local server answer that fraction of requests
+with 503, to show idempotent calls recovering through the jittered retries:
+
+    python benchmarks/bench_transport.py                          # local, plain HTTP
+    python benchmarks/bench_transport.py --tls --calls 500        # local HTTPS, self-signed (needs openssl)
+    python benchmarks/bench_transport.py --flaky 0.1
+    python benchmarks/bench_transport.py --url https://novaosmem.onrender.com --calls 50 --out transport.json
+"""
+import os, sys, ssl, json, time, random, argparse, tempfile, threading, subprocess, urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import transport
+from _common import pct
+
+def _serve(tls: bool, flaky: float) -> str:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body go out in separate writes
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            status, body = (503, b"{}") if random.random() < flaky else (200, b'{"ok": true, "key": "nova:mem:bench"}')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    if tls:
+        d = tempfile.mkdtemp()
+        subprocess.run(["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+                        "-addext", "subjectAltName=DNS:localhost",
+                        "-keyout", f"{d}/key.pem", "-out", f"{d}/cert.pem"], check=True, capture_output=True)
+        ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        ctx.load_cert_chain(f"{d}/cert.pem", f"{d}/key.pem")
+        srv.socket = ctx.wrap_socket(srv.socket, server_side=True)
+        os.environ["REQUESTS_CA_BUNDLE"] = os.environ["SSL_CERT_FILE"] = f"{d}/cert.pem"
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return f"{'https' if tls else 'http'}://localhost:{srv.server_address[1]}"
+
+def _urllib_post(url: str, body: dict, ctx) -> dict:
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(req, timeout=10, context=ctx) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+def run(mode: str, url: str, args) -> dict:
+    ctx = ssl.create_default_context(cafile=os.environ.get("SSL_CERT_FILE")) if url.startswith("https") else None
+    body = {"data": {"agent": "bench", "type": "event", "topic": "heartbeat", "payload": {"alive": True},
+                     "ts": time.time()}}
+    transport.reset_stats()
+    lat, failed = [], 0
+    for _ in range(args.calls):
+        t0 = time.perf_counter()
+        try:
+            if mode == "urllib":
+                _urllib_post(f"{url}/tools/memory.write", body, ctx)
+            else:
+                # idempotent here so --flaky shows the retries; memory.write itself is not retried
+                transport.post_json(f"{url}/tools/memory.write", body, idempotent=args.flaky > 0)
+        except Exception:
+            failed += 1
+        lat.append(time.perf_counter() - t0)
+    st = transport.stats() if mode == "transport" else {}
+    return {"client": mode, "calls": args.calls, "failed": failed,
+            "p50_ms": round(pct(lat, 50) * 1000, 2), "p95_ms": round(pct(lat, 95) * 1000, 2),
+            "connections": st.get("connections", args.calls), "reuse_ratio": st.get("reuse_ratio", 0.0),
+            "retries": st.get("retries", 0)}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", help="memory server to call instead of the local stand-in")
+    ap.add_argument("--tls", action="store_true", help="local stand-in over HTTPS (self-signed)")
+    ap.add_argument("--calls", type=int, default=300)
+    ap.add_argument("--flaky", type=float, default=0.0, help="fraction of local replies that are 503")
+    ap.add_argument("--out", help="write results JSON here")
+    args = ap.parse_args()
+    url = (args.url or _serve(args.tls, args.flaky)).rstrip("/")
+
+    results = []
+    for mode in ("urllib", "transport"):
+        res = run(mode, url, args)
+        results.append(res)
+        print(f"{mode:<9} {res['calls']} calls ({res['failed']} failed): p50 {res['p50_ms']:>7.2f}ms  "
+              f"p95 {res['p95_ms']:>7.2f}ms  connections {res['connections']:>4}  retries {res['retries']}", flush=True)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump({"meta": {**vars(args), "url": url, "time": time.time()}, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
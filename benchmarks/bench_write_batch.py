@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Throughput of memory.write (one record per request) vs memory.write_batch.
+
+Drives mcp/memory_server/server.py in-process through FastAPI's TestClient.
+Uses REDIS_URL if set, otherwise an in-memory fakeredis.
+
+    python benchmarks/bench_write_batch.py --records 5000 --batch 100
+"""
+import os, sys, time, argparse
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "mcp", "memory_server"))
+
+import server  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+def _record(i: int) -> dict:
+    return {"data": {"agent": "Bench", "type": "event", "topic": "heartbeat", "payload": {"alive": True, "i": i}}}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, default=5000)
+    ap.add_argument("--batch", type=int, default=100)
+    ap.add_argument("--atomic", action="store_true")
+    args = ap.parse_args()
+
+    if not os.getenv("REDIS_URL"):
+        import fakeredis
+        fake = fakeredis.FakeServer()
+        server.bind(fakeredis.FakeRedis(server=fake, decode_responses=True), fakeredis.FakeRedis(server=fake))
+    client = TestClient(server.app)
+    n = args.records
+
+    t0 = time.perf_counter()
+    for i in range(n):
+        client.post("/tools/memory.write", json=_record(i)).raise_for_status()
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for start in range(0, n, args.batch):
+        recs = [_record(i) for i in range(start, min(n, start + args.batch))]
+        client.post("/tools/memory.write_batch", json={"records": recs, "atomic": args.atomic}).raise_for_status()
+    batched = time.perf_counter() - t0
+
+    print(f"records={n} batch={args.batch} atomic={args.atomic} redis={'REDIS_URL' if os.getenv('REDIS_URL') else 'fakeredis'}")
+    print(f"memory.write       {n / single:10.0f} rec/s  ({single:.2f}s)")
+    print(f"memory.write_batch {n / batched:10.0f} rec/s  ({batched:.2f}s)  x{single / batched:.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Memory server benchmark suite: write, read, search, query and task-claim throughput
+and p50/p95/p99 latency across record counts and payload sizes.
+
+Drives mcp/memory_server/server.py through FastAPI's TestClient (default) or a
+local uvicorn (--transport uvicorn, needs REDIS_URL). Uses REDIS_URL if set (the
+database is flushed before each run; point it at a scratch Redis), otherwise an
+in-memory fakeredis. Results are JSON so runs can be diffed between commits:
+
+    python benchmarks/suite.py --records 1000 10000 --payloads 128 4096 --out before.json
+    python benchmarks/suite.py --records 1000 10000 --payloads 128 4096 --out after.json --compare before.json
+
+--compare prints the change per scenario and exits 1 when any p95 or throughput
+moved the wrong way by more than --threshold percent.
+"""
+import os, sys, json, time, random, argparse, platform, subprocess
+
+from _common import pct
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVER_DIR = os.path.join(ROOT, "mcp", "memory_server")
+sys.path.insert(0, SERVER_DIR)
+
+AGENTS = [f"Agent{i}" for i in range(20)]
+TYPES = ["event", "artifact", "task"]
+
+def _record(rnd, i: int, payload: int) -> dict:
+    return {"agent": AGENTS[i % len(AGENTS)], "type": TYPES[i % len(TYPES)], "topic": "bench",
+            "payload": {"i": i, "text": "".join(rnd.choices("abcdefghij klmnop", k=payload))}}
+
+# -- transports ---------------------------------------------------------------
+
+class _TestClientTransport:
+    name = "testclient"
+
+    def __init__(self):
+        import server
+        from fastapi.testclient import TestClient
+        self.server = server
+        self.client = TestClient(server.app)
+
+    def reset(self):
+        if os.getenv("REDIS_URL"):
+            for c in self.server.nodes:
+                c.flushdb()
+        else:
+            import fakeredis
+            fake = fakeredis.FakeServer()
+            self.server.bind(fakeredis.FakeRedis(server=fake, decode_responses=True), fakeredis.FakeRedis(server=fake))
+        self.server.taskq.forget_groups()
+        self.server.cache.clear()
+
+    def post(self, tool: str, body: dict) -> dict:
+        res = self.client.post(f"/tools/{tool}", json=body)
+        res.raise_for_status()
+        return res.json()
+
+    def close(self):
+        pass
+
+class _UvicornTransport:
+    name = "uvicorn"
+
+    def __init__(self, port: int = 8790):
+        import httpx, redis
+        if not os.getenv("REDIS_URL"):
+            sys.exit("--transport uvicorn needs REDIS_URL (the server runs in another process)")
+        self.redis = redis.from_url(os.environ["REDIS_URL"])
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+            cwd=SERVER_DIR, env={**os.environ, "MCP_COMPACT_INTERVAL": "0"})
+        self.client = httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=60)
+        for _ in range(100):
+            try:
+                self.client.get("/health").raise_for_status()
+                return
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        self.close()
+        raise RuntimeError("uvicorn did not start")
+
+    def reset(self):
+        self.redis.flushdb()
+        # the server process still thinks its groups exist; its first read gets NOGROUP and recreates them
+
+    def post(self, tool: str, body: dict) -> dict:
+        res = self.client.post(f"/tools/{tool}", json=body)
+        res.raise_for_status()
+        return res.json()
+
+    def close(self):
+        self.proc.terminate()
+        self.proc.wait()
+
+# -- scenarios ----------------------------------------------------------------
+
+def _load(t, n: int, payload: int) -> list[str]:
+    rnd = random.Random(n * 31 + payload)
+    keys = []
+    for start in range(0, n, 500):
+        recs = [{"data": _record(rnd, i, payload)} for i in range(start, min(n, start + 500))]
+        keys += t.post("memory.write_batch", {"records": recs})["keys"]
+    return keys
+
+def _measure(ops: int, fn) -> dict:
+    for i in range(min(20, ops)):  # warm-up
+        fn(i)
+    lat = []
+    t0 = time.perf_counter()
+    for i in range(ops):
+        s = time.perf_counter()
+        fn(i)
+        lat.append(time.perf_counter() - s)
+    elapsed = time.perf_counter() - t0
+    return {"ops": ops, "ops_per_s": round(ops / elapsed, 1), "p50_ms": round(pct(lat, 50) * 1000, 3),
+            "p95_ms": round(pct(lat, 95) * 1000, 3), "p99_ms": round(pct(lat, 99) * 1000, 3),
+            "mean_ms": round(elapsed / ops * 1000, 3)}
+
+def _scenarios(t, keys: list[str], payload: int, ops: int) -> dict:
+    rnd = random.Random(7)
+    out = {}
+    out["write"] = _measure(ops, lambda i: t.post("memory.write", {"data": _record(rnd, i, payload)}))
+    out["write_batch_100"] = _measure(max(5, ops // 20), lambda i: t.post(
+        "memory.write_batch", {"records": [{"data": _record(rnd, j, payload)} for j in range(100)]}))
+    out["read"] = _measure(ops, lambda i: t.post("memory.read", {"key": rnd.choice(keys)}))
+    out["read_many_50"] = _measure(max(1, ops // 10), lambda i: t.post(
+        "memory.read_many", {"keys": rnd.sample(keys, min(50, len(keys)))}))
+    out["search_newest"] = _measure(ops, lambda i: t.post("memory.search", {"q": AGENTS[i % 20].lower(), "limit": 20}))
+    out["search_scan"] = _measure(max(1, ops // 10), lambda i: t.post(
+        "memory.search", {"q": f'"i": {rnd.randrange(len(keys))},', "limit": 1, "scan": True}))
+    out["query_2field"] = _measure(ops, lambda i: t.post(
+        "memory.query", {"where": {"agent": AGENTS[i % 20], "type": TYPES[i % 3]}, "limit": 20}))
+
+    # task claim as agents do it: one memory.claim for the role's oldest pending task
+    t.post("memory.write_batch", {"records": [
+        {"key": f"nova:task:bench{i}", "data": {"type": "task", "status": "pending", "assigned_to": "Bench",
+                                                 "task_type": "noop", "payload": {"i": i}}}
+        for i in range(ops + 20)]})
+    claim = lambda i: t.post("memory.claim", {"role": "Bench", "claimer": "bench"})
+    out["task_claim"] = _measure(ops, claim)
+
+    # a deep backlog worked in batches: claim 20, complete 20 (ops are batches)
+    batches = max(5, ops // 20)
+    t.post("memory.write_batch", {"records": [
+        {"key": f"nova:task:benchb{i}", "data": {"type": "task", "status": "pending", "assigned_to": "BenchB",
+                                                  "task_type": "noop", "payload": {"i": i}}}
+        for i in range((batches + 20) * 20)]})
+
+    def claim_batch(i):
+        got = t.post("memory.claim_batch", {"role": "BenchB", "claimer": "bench", "n": 20})["results"]
+        t.post("memory.complete_batch", {"items": [{"key": x["key"], "result": {"ok": True}} for x in got]})
+    out["task_batch_20"] = _measure(batches, claim_batch)
+    return out
+
+# -- runner -------------------------------------------------------------------
+
+def _git_rev() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def _compare(results: list, old_path: str, threshold: float) -> int:
+    with open(old_path) as f:
+        old = {(x["scenario"], x["records"], x["payload"]): x for x in json.load(f)["results"]}
+    regressions = 0
+    print(f"\n{'scenario':<16}{'records':>9}{'payload':>9}{'ops/s':>12}{'Δ':>8}{'p95 ms':>10}{'Δ':>8}")
+    for x in results:
+        o = old.get((x["scenario"], x["records"], x["payload"]))
+        if not o:
+            continue
+        d_tput = (x["ops_per_s"] / o["ops_per_s"] - 1) * 100 if o["ops_per_s"] else 0.0
+        d_p95 = (x["p95_ms"] / o["p95_ms"] - 1) * 100 if o["p95_ms"] else 0.0
+        bad = d_tput < -threshold or d_p95 > threshold
+        regressions += bad
+        print(f"{x['scenario']:<16}{x['records']:>9}{x['payload']:>9}{x['ops_per_s']:>12.1f}{d_tput:>+7.1f}%"
+              f"{x['p95_ms']:>10.3f}{d_p95:>+7.1f}%{'  REGRESSION' if bad else ''}")
+    print(f"{regressions} regression(s) beyond {threshold}%")
+    return regressions
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--records", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--payloads", type=int, nargs="+", default=[128, 4096], help="payload text bytes")
+    ap.add_argument("--ops", type=int, default=500, help="operations per scenario")
+    ap.add_argument("--transport", choices=["testclient", "uvicorn"], default="testclient")
+    ap.add_argument("--out", help="write results JSON here")
+    ap.add_argument("--compare", help="previous results JSON to diff against")
+    ap.add_argument("--threshold", type=float, default=10.0, help="regression threshold, percent")
+    args = ap.parse_args()
+    os.environ.setdefault("MCP_COMPACT_INTERVAL", "0")
+
+    t = _UvicornTransport() if args.transport == "uvicorn" else _TestClientTransport()
+    results = []
+    try:
+        for n in args.records:
+            for payload in args.payloads:
+                t.reset()
+                t0 = time.perf_counter()
+                keys = _load(t, n, payload)
+                print(f"records={n} payload={payload}B  (loaded in {time.perf_counter() - t0:.1f}s)", flush=True)
+                for name, res in _scenarios(t, keys, payload, args.ops).items():
+                    print(f"  {name:<16} {res['ops_per_s']:>10.1f} ops/s  p50={res['p50_ms']:8.3f}ms "
+                          f"p95={res['p95_ms']:8.3f}ms  p99={res['p99_ms']:8.3f}ms", flush=True)
+                    results.append({"scenario": name, "records": n, "payload": payload, **res})
+    finally:
+        t.close()
+
+    report = {
+        "meta": {"git": _git_rev(), "python": platform.python_version(), "transport": t.name,
+                 "redis": "REDIS_URL" if os.getenv("REDIS_URL") else "fakeredis",
+                 "cache_size": os.getenv("MCP_CACHE_SIZE", "10000"), "ops": args.ops, "time": time.time()},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        sys.exit(1 if _compare(results, args.compare, args.threshold) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+# mcp/memory_server/cache.py
+"""
+Bounded in-process LRU with TTL for decoded memory records.
+
+Writes invalidate locally and publish the keys on a Redis channel so other
+server replicas drop them too. A short tombstone list stops a read that raced
+a write from putting the pre-write value back into the cache.
+"""
+import json, threading, time, uuid
+from collections import OrderedDict
+
+class LRUCache:
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()   # key -> (expires_at, value)
+        self._tombs = OrderedDict()  # key -> seq of last invalidation
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def seq(self) -> int:
+        """Snapshot to pass to put() after a Redis read."""
+        return self._seq
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value, seq: int) -> None:
+        """Cache `value` unless `key` was invalidated after `seq` was taken."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._tombs.get(key, -1) > seq:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, keys) -> None:
+        with self._lock:
+            self._seq += 1
+            for k in keys:
+                if self._data.pop(k, None) is not None:
+                    self.invalidations += 1
+                self._tombs[k] = self._seq
+                self._tombs.move_to_end(k)
+            while len(self._tombs) > max(self.maxsize, 1):
+                self._tombs.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._seq += 1
+            for k in self._data:
+                self._tombs[k] = self._seq
+            self.invalidations += len(self._data)
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+                "hits": self.hits, "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions, "invalidations": self.invalidations,
+            }
+
+class Invalidator:
+    """Publishes written keys and applies invalidations published by other replicas."""
+
+    def __init__(self, cache: LRUCache, channel: str):
+        self.cache = cache
+        self.channel = channel
+        self.instance = uuid.uuid4().hex
+
+    def message(self, keys) -> str:
+        return json.dumps({"src": self.instance, "keys": list(keys)})
+
+    def listen(self, client) -> None:
+        """Blocking subscriber loop; run in a daemon thread. Reconnects on errors."""
+        while True:
+            try:
+                ps = client.pubsub(ignore_subscribe_messages=True)
+                ps.subscribe(self.channel)
+                for msg in ps.listen():
+                    body = json.loads(msg["data"])
+                    if body.get("src") != self.instance:
+                        self.cache.invalidate(body.get("keys", []))
+            except Exception as e:
+                print(f"[cache] invalidation listener error: {e}", flush=True)
+                # anything cached while we were disconnected may be stale
+                self.cache.clear()
+                time.sleep(1)
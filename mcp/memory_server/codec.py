@@ -0,0 +1,92 @@
+# mcp/memory_server/codec.py
+"""
+Payload codecs for stored memory records.
+
+A codec spec is "<format>[+<compression>]", e.g. "json", "orjson",
+"msgpack+zlib", "orjson+zstd". Compression is only applied to encoded payloads
+of at least COMPRESS_MIN bytes, so the tag stored with each record ("enc" hash
+field) names what was actually applied. Records without a tag are plain JSON,
+which is what every record written before codecs existed looks like.
+
+orjson, msgpack and zstandard are optional; a spec that needs a missing one is
+rejected when the server starts.
+"""
+import json, zlib, threading
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN = 1024
+
+def _formats() -> dict:
+    out = {"json": (lambda o: json.dumps(o).encode("utf-8"), json.loads)}
+    if orjson:
+        out["orjson"] = (orjson.dumps, orjson.loads)
+    if msgpack:
+        out["msgpack"] = (lambda o: msgpack.packb(o, use_bin_type=True), lambda b: msgpack.unpackb(b, raw=False))
+    return out
+
+def _compressors() -> dict:
+    out = {"zlib": (lambda b: zlib.compress(b, 6), zlib.decompress)}
+    if zstandard:
+        out["zstd"] = (lambda b: _zstd().compressor.compress(b), lambda b: _zstd().decompressor.decompress(b))
+    return out
+
+_local = threading.local()
+
+def _zstd():
+    # zstandard contexts are not thread-safe: one pair per threadpool thread
+    if not hasattr(_local, "compressor"):
+        _local.compressor, _local.decompressor = zstandard.ZstdCompressor(level=3), zstandard.ZstdDecompressor()
+    return _local
+
+FORMATS = _formats()
+COMPRESSORS = _compressors()
+
+def check(spec: str) -> str:
+    fmt, _, comp = spec.partition("+")
+    if fmt not in FORMATS:
+        raise ValueError(f"codec format {fmt!r} unavailable (have {sorted(FORMATS)})")
+    if comp and comp not in COMPRESSORS:
+        raise ValueError(f"codec compression {comp!r} unavailable (have {sorted(COMPRESSORS)})")
+    return spec
+
+def encode(data, spec: str = "json") -> tuple[bytes, str]:
+    """Encode a payload. Returns (bytes, tag) where tag is what decode() needs."""
+    fmt, _, comp = spec.partition("+")
+    raw = FORMATS[fmt][0](data)
+    if comp and len(raw) >= COMPRESS_MIN:
+        return COMPRESSORS[comp][0](raw), f"{fmt}+{comp}"
+    return raw, fmt
+
+def decode(raw, tag=None):
+    if isinstance(tag, bytes):
+        tag = tag.decode()
+    fmt, _, comp = (tag or "json").partition("+")
+    if comp:
+        raw = COMPRESSORS[comp][1](raw)
+    return FORMATS[fmt][1](raw)
+
+class CodecMap:
+    """Default codec per key prefix; the longest matching prefix wins."""
+
+    def __init__(self, default: str = "json", prefixes: dict | None = None):
+        self.default = check(default)
+        self.prefixes = sorted(((p, check(s)) for p, s in (prefixes or {}).items()),
+                               key=lambda x: len(x[0]), reverse=True)
+
+    def spec_for(self, key: str) -> str:
+        for prefix, spec in self.prefixes:
+            if key.startswith(prefix):
+                return spec
+        return self.default
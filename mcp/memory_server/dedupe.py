@@ -0,0 +1,30 @@
+# mcp/memory_server/dedupe.py
+"""
+Idempotent writes. A write carrying a dedupe key first reserves
+
+    <namespace>:dedupe:<dedupe key>  ->  key of the record written under it
+
+on the primary with SET NX PX, so it expires after the write's TTL and the keyspace
+holds at most one small string per dedupe key written within the TTL. A write whose
+reservation fails is a duplicate: it is skipped and answered with the key already
+holding the reservation. Reservations are exact, so there are no false positives.
+
+Like indexes.py, callers queue commands on a pipeline and read the replies back.
+"""
+
+def dedupe_key(namespace: str, dk: str) -> str:
+    return f"{namespace}:dedupe:{dk}"
+
+def queue_reserve(pipe, namespace: str, reqs: list[tuple[str, str, float]]) -> None:
+    """Queue SET NX PX + GET for each (record key, dedupe key, ttl seconds)."""
+    for key, dk, ttl in reqs:
+        pipe.set(dedupe_key(namespace, dk), key, nx=True, px=max(1, int(ttl * 1000)))
+        pipe.get(dedupe_key(namespace, dk))
+
+def holders(replies: list, reqs: list[tuple[str, str, float]]) -> dict:
+    """{record key: key already holding its dedupe key} for the duplicates among `reqs`."""
+    out = {}
+    for (key, _, _), won, holder in zip(reqs, replies[0::2], replies[1::2]):
+        if not won:
+            out[key] = holder.decode() if isinstance(holder, bytes) else holder
+    return out
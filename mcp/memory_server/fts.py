@@ -0,0 +1,59 @@
+# mcp/memory_server/fts.py
+"""
+Optional inverted full-text index over record payloads (MCP_FTS=1).
+
+Each term has a posting zset  <namespace>:fts:<term>  whose members are record
+keys scored by write ts. Per-record term frequencies live in the record hash
+(field "terms") so overwrites can drop stale postings and queries can rank
+without re-tokenizing payloads.
+"""
+import json, math, re, time
+from collections import Counter
+
+TOKEN_RE = re.compile(r"\w{2,40}")
+MAX_TERMS = 256          # distinct terms indexed per record
+HALF_LIFE = 86400.0      # recency weight halves every day
+
+def posting_key(namespace: str, term: str) -> str:
+    return f"{namespace}:fts:{term}"
+
+def _strings(value):
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, dict):
+        for v in value.values():
+            yield from _strings(v)
+    elif isinstance(value, list):
+        for v in value:
+            yield from _strings(v)
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def term_counts(data: dict) -> dict:
+    """{term: tf} for every string value in the payload, capped at MAX_TERMS terms."""
+    tf = Counter()
+    for s in _strings(data):
+        tf.update(tokenize(s))
+    return dict(tf.most_common(MAX_TERMS))
+
+def parse_terms(raw) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {}
+
+def queue_postings(pipe, namespace: str, key: str, old: dict, new: dict, ts: float) -> None:
+    for t in old:
+        if t not in new:
+            pipe.zrem(posting_key(namespace, t), key)
+    for t in new:
+        pipe.zadd(posting_key(namespace, t), {key: ts})
+
+def score(terms: dict, query_terms: list[str], ts: float, now: float | None = None) -> float:
+    """Sum of log-scaled term frequencies, decayed by record age."""
+    tf = sum(1.0 + math.log(terms[t]) for t in query_terms if terms.get(t))
+    age = max(0.0, (now or time.time()) - ts)
+    return tf * 0.5 ** (age / HALF_LIFE)
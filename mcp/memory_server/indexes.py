@@ -0,0 +1,61 @@
+# mcp/memory_server/indexes.py
+"""
+Secondary indexes on well-known payload fields.
+
+Every record whose payload has a scalar value for one of INDEX_FIELDS is a
+member of the zset  <namespace>:idx:<field>:<value>  scored by its write ts.
+The set  <namespace>:idxvals:<field>  lists the values seen for each field.
+The values a record was indexed under are kept in its hash (field "idx") so an
+overwrite can drop the stale memberships without re-reading the old payload.
+
+Helpers only queue commands on a pipeline; the caller decides when to execute.
+"""
+import json
+
+INDEX_FIELDS = ("type", "status", "assigned_to", "agent", "topic", "task_type", "dag")
+MAX_VALUE_LEN = 128
+
+def index_key(namespace: str, field: str, value) -> str:
+    return f"{namespace}:idx:{field}:{_norm(value)}"
+
+def values_key(namespace: str, field: str) -> str:
+    return f"{namespace}:idxvals:{field}"
+
+def _norm(value) -> str:
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+def index_values(data: dict) -> dict:
+    """The {field: normalized value} pairs a payload is indexed under."""
+    out = {}
+    for f in INDEX_FIELDS:
+        v = data.get(f)
+        if isinstance(v, (str, int, float, bool)) and len(_norm(v)) <= MAX_VALUE_LEN:
+            out[f] = _norm(v)
+    return out
+
+def parse_idx(raw) -> dict:
+    if not raw:
+        return {}
+    try:
+        return json.loads(raw)
+    except ValueError:
+        return {}
+
+def queue_index_update(pipe, namespace: str, key: str, old: dict, new: dict, ts: float) -> None:
+    """Move `key` from the zsets in `old` to the zsets in `new`."""
+    for f, v in old.items():
+        if new.get(f) != v:
+            pipe.zrem(index_key(namespace, f, v), key)
+    for f, v in new.items():
+        pipe.zadd(index_key(namespace, f, v), {key: ts})
+        pipe.sadd(values_key(namespace, f), v)
+
+def queue_index_delete(pipe, namespace: str, key: str, old: dict) -> None:
+    for f, v in old.items():
+        pipe.zrem(index_key(namespace, f, v), key)
+
+def matches(data: dict, where: dict) -> bool:
+    """Re-check a fetched payload against a query (guards against stale index entries)."""
+    return all(_norm(data.get(f)) == _norm(v) for f, v in where.items())
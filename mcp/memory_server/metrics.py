@@ -0,0 +1,204 @@
+# mcp/memory_server/metrics.py
+"""
+Prometheus text-format metrics for the memory server (GET /metrics).
+
+Counters and histograms are sharded per thread: each thread updates its own
+dict without taking a lock, and a scrape sums the shards. The only lock is
+taken once per thread, to register its shard.
+
+Per-request state (Redis round trips) lives in a context variable set by
+MetricsMiddleware. Redis clients passed through count_round_trips() add one
+round trip per command or pipeline they send.
+"""
+import bisect, contextvars, inspect, threading, time
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._shards = []
+        self._meta = {}        # name -> (kind, help, buckets)
+        self._collectors = []  # callables returning [(name, kind, help, [(labels, value)])] at scrape time
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def counter(self, name: str, help: str, labels: tuple = ()) -> "Counter":
+        self._meta[name] = ("counter", help, None, labels)
+        return Counter(self, name)
+
+    def histogram(self, name: str, help: str, buckets: tuple, labels: tuple = ()) -> "Histogram":
+        self._meta[name] = ("histogram", help, buckets, labels)
+        return Histogram(self, name, buckets)
+
+    def collector(self, fn) -> None:
+        self._collectors.append(fn)
+
+    def render(self) -> str:
+        with self._lock:
+            shards = [s.copy() for s in self._shards]
+        merged = {}
+        for shard in shards:
+            for key, v in shard.items():
+                if isinstance(v, list):
+                    acc = merged.setdefault(key, [0] * len(v))
+                    for i, x in enumerate(list(v)):
+                        acc[i] += x
+                else:
+                    merged[key] = merged.get(key, 0) + v
+        out = []
+        for name, (kind, help, buckets, label_names) in self._meta.items():
+            out += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+            for (n, labels), v in sorted(merged.items()):
+                if n != name:
+                    continue
+                lbl = dict(zip(label_names, labels))
+                if kind == "counter":
+                    out.append(f"{name}{_labels(lbl)} {v}")
+                    continue
+                cum = 0
+                for le, c in zip(buckets, v):
+                    cum += c
+                    out.append(f"{name}_bucket{_labels({**lbl, 'le': _num(le)})} {cum}")
+                out.append(f"{name}_bucket{_labels({**lbl, 'le': '+Inf'})} {v[-2]}")
+                out.append(f"{name}_sum{_labels(lbl)} {_num(v[-1])}")
+                out.append(f"{name}_count{_labels(lbl)} {v[-2]}")
+        for fn in self._collectors:
+            try:
+                families = fn()
+            except Exception as e:
+                out.append(f"# collector {getattr(fn, '__name__', fn)} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                out += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                out += [f"{name}{_labels(lbl)} {_num(v)}" for lbl, v in samples]
+        return "\n".join(out) + "\n"
+
+class Counter:
+    def __init__(self, reg: Registry, name: str):
+        self.reg, self.name = reg, name
+
+    def inc(self, labels: tuple = (), n: float = 1) -> None:
+        shard = self.reg._shard()
+        key = (self.name, labels)
+        shard[key] = shard.get(key, 0) + n
+
+class Histogram:
+    """Shard value: [bucket counts..., total count, sum]; a value above the last bucket only counts in +Inf."""
+
+    def __init__(self, reg: Registry, name: str, buckets: tuple):
+        self.reg, self.name, self.buckets = reg, name, buckets
+
+    def observe(self, labels: tuple, value: float) -> None:
+        shard = self.reg._shard()
+        key = (self.name, labels)
+        v = shard.get(key)
+        if v is None:
+            v = shard[key] = [0] * (len(self.buckets) + 2)
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            v[i] += 1
+        v[-2] += 1
+        v[-1] += value
+
+def _num(v) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+def _labels(lbl: dict) -> str:
+    if not lbl:
+        return ""
+    esc = lambda s: str(s).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+    return "{" + ",".join(f'{k}="{esc(v)}"' for k, v in lbl.items()) + "}"
+
+# -- memory server metrics -----------------------------------------------------
+
+registry = Registry()
+requests_total = registry.counter("mcp_requests_total", "HTTP requests by tool and status code.", ("tool", "code"))
+request_seconds = registry.histogram("mcp_request_seconds", "Request latency by tool.", LATENCY_BUCKETS, ("tool",))
+redis_round_trips = registry.histogram("mcp_redis_round_trips", "Redis round trips (commands or pipelines) per request.",
+                                       COUNT_BUCKETS, ("tool",))
+search_scanned = registry.histogram("mcp_search_scanned", "Records examined per search/query call.", COUNT_BUCKETS, ("mode",))
+search_matched = registry.histogram("mcp_search_matched", "Records returned per search/query call.", COUNT_BUCKETS, ("mode",))
+payload_bytes = registry.histogram("mcp_payload_bytes", "Stored (encoded) payload sizes written and read from Redis.",
+                                   BYTES_BUCKETS, ("op",))
+task_queue_wait = registry.histogram("mcp_task_queue_wait_seconds", "Seconds from enqueue to claim, by priority class.",
+                                     WAIT_BUCKETS, ("priority",))
+tasks_dead = registry.counter("mcp_tasks_dead_lettered_total", "Tasks moved to a dead-letter queue, by reason.", ("reason",))
+dedupe = registry.counter("mcp_dedupe_total", "Writes carrying a dedupe key, by result (new or duplicate).", ("result",))
+tasks_requeued = registry.counter("mcp_tasks_requeued_total", "Claimed tasks put back to pending after their lease expired.")
+
+class _Req:
+    __slots__ = ("round_trips",)
+
+    def __init__(self):
+        self.round_trips = 0
+
+current = contextvars.ContextVar("mcp_metrics_request", default=None)
+
+def searched(mode: str, scanned: int, matched: int) -> None:
+    search_scanned.observe((mode,), scanned)
+    search_matched.observe((mode,), matched)
+
+def _counting(cls):
+    if getattr(cls, "_counts_round_trips", False):
+        return cls
+    if inspect.iscoroutinefunction(cls.send_packed_command):
+        async def send_packed_command(self, *args, **kwargs):
+            req = current.get()
+            if req is not None:
+                req.round_trips += 1
+            return await cls.send_packed_command(self, *args, **kwargs)
+    else:
+        def send_packed_command(self, *args, **kwargs):
+            req = current.get()
+            if req is not None:
+                req.round_trips += 1
+            return cls.send_packed_command(self, *args, **kwargs)
+    return type(cls.__name__, (cls,), {"send_packed_command": send_packed_command, "_counts_round_trips": True})
+
+def count_round_trips(client):
+    """Make `client`'s new connections count round trips against the current request."""
+    pool = client.connection_pool
+    pool.connection_class = _counting(pool.connection_class)
+    return client
+
+class MetricsMiddleware:
+    """Plain ASGI middleware (no response buffering): times each request and counts its round trips."""
+
+    def __init__(self, app, tools: set | None = None):
+        self.app = app
+        self.tools = tools  # known paths; anything else is labelled "other" to bound cardinality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        path = scope["path"]
+        tool = path.rsplit("/", 1)[-1] if self.tools is None or path in self.tools else "other"
+        req = _Req()
+        token = current.set(req)
+        code = 500
+
+        async def send_status(msg):
+            nonlocal code
+            if msg["type"] == "http.response.start":
+                code = msg["status"]
+            await send(msg)
+
+        t0 = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            request_seconds.observe((tool,), time.perf_counter() - t0)
+            requests_total.inc((tool, str(code)))
+            redis_round_trips.observe((tool,), req.round_trips)
+            current.reset(token)
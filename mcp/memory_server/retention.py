@@ -0,0 +1,166 @@
+# mcp/memory_server/retention.py
+"""
+Retention rules and the background compactor for the memory namespace.
+
+A rule selects records through the field indexes ("match") and either keeps the
+newest `keep_last` per value of `group_by`, or drops everything older than
+`max_age` seconds. Retention is opt-in: with neither MCP_RETENTION (a JSON list of
+rules) nor MCP_COMPACT_INTERVAL set, nothing is ever deleted. MCP_COMPACT_INTERVAL
+alone applies DEFAULT_RULES; MCP_RETENTION alone runs every DEFAULT_INTERVAL s:
+
+    [{"name": "heartbeats", "match": {"topic": "heartbeat"}, "group_by": "agent", "keep_last": 50},
+     {"name": "events", "match": {"type": "event"}, "max_age": 604800}]
+
+Deleting a record removes its hash (UNLINK), its recency-index entry, its
+field-index memberships and its postings, in batches of `batch` keys.
+"""
+import json, time, uuid
+
+from indexes import index_key, values_key, parse_idx, queue_index_delete
+import fts
+
+DEFAULT_RULES = [
+    {"name": "heartbeats", "match": {"topic": "heartbeat"}, "group_by": "agent", "keep_last": 50},
+    {"name": "events", "match": {"type": "event"}, "max_age": 7 * 86400},
+    {"name": "done_tasks", "match": {"type": "task", "status": "done"}, "max_age": 3 * 86400},
+]
+
+DEFAULT_INTERVAL = 300
+
+def settings(raw_rules: str | None, raw_interval: str | None) -> tuple[list, int]:
+    """(rules, background interval in s) from MCP_RETENTION and MCP_COMPACT_INTERVAL."""
+    interval = int(raw_interval) if raw_interval else None
+    if not raw_rules and not interval:
+        return [], 0
+    return load_rules(raw_rules), DEFAULT_INTERVAL if interval is None else interval
+
+def load_rules(raw: str | None) -> list:
+    if not raw:
+        return DEFAULT_RULES
+    rules = json.loads(raw)
+    for rule in rules:
+        if not rule.get("match") or not ("keep_last" in rule or "max_age" in rule):
+            raise ValueError(f"retention rule needs match and keep_last or max_age: {rule}")
+        if "keep_last" in rule and not rule.get("group_by"):
+            raise ValueError(f"keep_last rule needs group_by: {rule}")
+    return rules
+
+class Compactor:
+    def __init__(self, r, namespace: str, rules: list, on_delete=None,
+                 batch: int = 500, max_per_rule: int = 50000):
+        self.r = r
+        self.namespace = namespace
+        self.rules = rules
+        self.on_delete = on_delete  # callback(keys) after each deleted batch
+        self.batch = batch
+        self.max_per_rule = max_per_rule
+        self.last_report = None
+        self._memory_usage = None  # MEMORY USAGE support, probed on first delete
+
+    # -- selection ---------------------------------------------------------
+
+    def _inter(self, zkeys: list[str], query):
+        """Run query(client, zkey) on the intersection of `zkeys` (a temp zset if more than one)."""
+        if len(zkeys) == 1:
+            return query(self.r, zkeys[0])
+        tmp = f"{self.namespace}:tmp:{uuid.uuid4().hex}"
+        pipe = self.r.pipeline(transaction=True)
+        pipe.zinterstore(tmp, zkeys, aggregate="MAX")
+        query(pipe, tmp)
+        pipe.delete(tmp)
+        return pipe.execute()[1]
+
+    def _count_expired(self, rule: dict, now: float) -> int:
+        zkeys = [index_key(self.namespace, f, v) for f, v in rule["match"].items()]
+        cutoff = now - float(rule["max_age"])
+        return self._inter(zkeys, lambda c, z: c.zcount(z, "-inf", cutoff))
+
+    def _expired(self, rule: dict, now: float):
+        """Batches of keys older than max_age, oldest first."""
+        zkeys = [index_key(self.namespace, f, v) for f, v in rule["match"].items()]
+        cutoff = now - float(rule["max_age"])
+        while True:
+            keys = self._inter(zkeys, lambda c, z: c.zrangebyscore(z, "-inf", cutoff, start=0, num=self.batch))
+            if not keys:
+                return
+            yield keys
+            if len(keys) < self.batch:
+                return
+
+    def _overflow(self, rule: dict, dry_run: bool):
+        """Batches of keys beyond the newest keep_last per group_by value."""
+        group = rule["group_by"]
+        keep = int(rule["keep_last"])
+        base = [index_key(self.namespace, f, v) for f, v in rule["match"].items()]
+        for value in self.r.smembers(values_key(self.namespace, group)):
+            gkey = index_key(self.namespace, group, value)
+            if not self.r.exists(gkey):
+                if not dry_run:
+                    self.r.srem(values_key(self.namespace, group), value)
+                continue
+            # ascending by ts, so ranks 0 .. -(keep+1) are everything but the newest `keep`
+            keys = self._inter(base + [gkey], lambda c, z: c.zrange(z, 0, -(keep + 1)))
+            for i in range(0, len(keys), self.batch):
+                yield keys[i:i + self.batch]
+
+    # -- deletion ----------------------------------------------------------
+
+    def _sizes(self, keys: list[str], field_bytes: list[int]) -> int:
+        if self._memory_usage is not False:
+            pipe = self.r.pipeline(transaction=False)
+            for k in keys:
+                pipe.memory_usage(k)
+            res = pipe.execute(raise_on_error=False)
+            if not any(isinstance(x, Exception) for x in res):
+                self._memory_usage = True
+                return sum(x or 0 for x in res)
+            self._memory_usage = False
+        # no MEMORY USAGE (older servers, fakes): count the stored field bytes
+        return sum(field_bytes)
+
+    def delete(self, keys: list[str]) -> int:
+        """Remove records and every index entry that points at them. Returns bytes reclaimed."""
+        pipe = self.r.pipeline(transaction=False)
+        for k in keys:
+            pipe.hmget(k, "idx", "terms")
+            pipe.hstrlen(k, "payload")
+        res = pipe.execute()
+        rows = res[0::2]
+        reclaimed = self._sizes(keys, [n + sum(len(v or "") for v in row) for row, n in zip(rows, res[1::2])])
+        pipe = self.r.pipeline(transaction=False)
+        for k, (raw_idx, raw_terms) in zip(keys, rows):
+            pipe.unlink(k)
+            pipe.zrem(f"{self.namespace}:index", k)
+            queue_index_delete(pipe, self.namespace, k, parse_idx(raw_idx))
+            fts.queue_postings(pipe, self.namespace, k, fts.parse_terms(raw_terms), {}, 0)
+        pipe.execute()
+        if self.on_delete:
+            self.on_delete(keys)
+        return reclaimed
+
+    # -- driver ------------------------------------------------------------
+
+    def run(self, dry_run: bool = False) -> dict:
+        t0 = time.time()
+        report = {"started": t0, "dry_run": dry_run, "rules": {}}
+        for rule in self.rules:
+            deleted = reclaimed = 0
+            if "keep_last" in rule:
+                batches = self._overflow(rule, dry_run)
+            elif dry_run:
+                deleted, batches = min(self._count_expired(rule, t0), self.max_per_rule), []
+            else:
+                batches = self._expired(rule, t0)
+            for keys in batches:
+                keys = keys[:self.max_per_rule - deleted]
+                if not dry_run:
+                    reclaimed += self.delete(keys)
+                deleted += len(keys)
+                if deleted >= self.max_per_rule:
+                    break
+            report["rules"][rule.get("name", json.dumps(rule["match"]))] = {"deleted": deleted, "bytes": reclaimed}
+        report["deleted"] = sum(x["deleted"] for x in report["rules"].values())
+        report["bytes_reclaimed"] = sum(x["bytes"] for x in report["rules"].values())
+        report["seconds"] = round(time.time() - t0, 3)
+        self.last_report = report
+        return report
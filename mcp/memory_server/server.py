@@ -1,52 +1,1182 @@
-import os, json, uuid, time
+import os, json, uuid, time, functools, threading, contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import anyio
+from starlette.concurrency import run_in_threadpool
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import redis
+from indexes import INDEX_FIELDS, index_key, values_key, index_values, parse_idx, queue_index_update, matches
+import fts
+from cache import LRUCache, Invalidator
+from retention import Compactor, settings as retention_settings
+import codec
+import shards
+import metrics
+import taskq
+import dedupe
+from shards import HashRing
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# comma-separated shard nodes; the first is the primary (feed, pub/sub, locks). Defaults to REDIS_URL.
+REDIS_URLS = shards.parse_urls(os.getenv("REDIS_URLS"), REDIS_URL)
+SHARD_FALLBACK = os.getenv("MCP_SHARD_FALLBACK", "0") == "1"  # while rebalancing: look for misses on every node
 NAMESPACE = os.getenv("MCP_NAMESPACE", "nova:mem")
+WRITE_BATCH_MAX = int(os.getenv("MCP_WRITE_BATCH_MAX", "1000"))
+READ_MANY_MAX = int(os.getenv("MCP_READ_MANY_MAX", "500"))
+SCAN_PAGE = int(os.getenv("MCP_SCAN_PAGE", "200"))
+SCAN_BUDGET = int(os.getenv("MCP_SCAN_BUDGET", "5000"))
+FTS_ENABLED = os.getenv("MCP_FTS", "0") == "1"
+FTS_CANDIDATES = int(os.getenv("MCP_FTS_CANDIDATES", "500"))
+CACHE_SIZE = int(os.getenv("MCP_CACHE_SIZE", "10000"))  # 0 disables the read cache
+CACHE_TTL = float(os.getenv("MCP_CACHE_TTL", "30"))
+FEED_MAXLEN = int(os.getenv("MCP_FEED_MAXLEN", "100000"))  # approximate cap on the change feed stream
+WATCH_MAX_WAIT = float(os.getenv("MCP_WATCH_MAX_WAIT", "30"))
+# long waits block in slices of this many seconds, each under the Redis client's socket timeout
+BLOCK_SLICE = float(os.getenv("MCP_BLOCK_SLICE", "2"))
+# requests blocked in a long-poll at once; they wait on threads of their own, not the request pool
+MAX_WAITERS = int(os.getenv("MCP_MAX_WAITERS", "256"))
+CLAIM_CANDIDATES = int(os.getenv("MCP_CLAIM_CANDIDATES", "20"))  # oldest pending tasks tried per claim-by-role
+TASK_STREAM_MAXLEN = int(os.getenv("MCP_TASK_STREAM_MAXLEN", "100000"))  # approximate cap per role stream
+TASK_LEASE = float(os.getenv("MCP_TASK_LEASE", "300"))  # seconds a claim holds a task unless renewed
+TASK_MAX_ATTEMPTS = int(os.getenv("MCP_TASK_MAX_ATTEMPTS", "5"))  # expired leases before a task is dead-lettered
+# task priority lanes, most urgent first, and the lane for tasks without a "priority"
+TASK_PRIORITIES = tuple(p.strip() for p in os.getenv("MCP_TASK_PRIORITIES", "urgent,high,normal,low").split(",") if p.strip())
+TASK_DEFAULT_PRIORITY = os.getenv("MCP_TASK_DEFAULT_PRIORITY", "normal")
+TASK_SWEEP_INTERVAL = float(os.getenv("MCP_TASK_SWEEP_INTERVAL", "5"))  # seconds; 0 disables the deadline/lease sweeper
+DEDUPE_TTL = float(os.getenv("MCP_DEDUPE_TTL", "604800"))  # seconds a dedupe key suppresses repeats (7 days)
+# queue depth watermarks: a role is saturated once it has QUEUE_HIGH pending tasks, until
+# it drains to QUEUE_LOW; MCP_QUEUE_WATERMARKS='{"Executor": [5000, 1000]}' sets them per role
+QUEUE_HIGH = int(os.getenv("MCP_QUEUE_HIGH", "1000"))
+QUEUE_LOW = int(os.getenv("MCP_QUEUE_LOW", "500"))
+QUEUE_WATERMARKS = json.loads(os.getenv("MCP_QUEUE_WATERMARKS", "{}"))
+QUEUE_DRAIN_WINDOW = int(os.getenv("MCP_QUEUE_DRAIN_WINDOW", "5"))  # minutes averaged for the drain rate
+TASK_DEPTH_RECOUNT = float(os.getenv("MCP_TASK_DEPTH_RECOUNT", "300"))  # seconds between sweeper recounts; 0 = never
+METRICS_MAX_VALUES = int(os.getenv("MCP_METRICS_MAX_VALUES", "50"))  # per-value index gauges per field
+# retention is opt-in (retention.py): no rules and no background compactor unless
+# MCP_RETENTION or MCP_COMPACT_INTERVAL (seconds; 0 = no background passes) is set
+RETENTION_RULES, COMPACT_INTERVAL = retention_settings(os.getenv("MCP_RETENTION"), os.getenv("MCP_COMPACT_INTERVAL"))
+# payload codec: MCP_CODEC is the default spec, MCP_CODECS maps key prefixes to specs,
+# e.g. MCP_CODEC=msgpack+zlib MCP_CODECS='{"nova:task:": "json"}'
+CODECS = codec.CodecMap(os.getenv("MCP_CODEC", "json"), json.loads(os.getenv("MCP_CODECS", "{}")))
 
-r = redis.from_url(REDIS_URL, decode_responses=True)
-app = FastAPI(title="NovaOS MCP Memory Server")
+ring = HashRing(REDIS_URLS)
+# redis-py's default pool (100 connections) plus one per waiter, which holds its own while it blocks
+_pool_size = 100 + MAX_WAITERS
+nodes = [redis.from_url(u, decode_responses=True, max_connections=_pool_size) for u in REDIS_URLS]
+raw_nodes = [redis.from_url(u, max_connections=_pool_size) for u in REDIS_URLS]  # raw bytes clients for record hashes (payloads may be binary)
+for _c in nodes + raw_nodes:
+    metrics.count_round_trips(_c)
+r, rb = nodes[0], raw_nodes[0]  # primary
+taskq.configure(TASK_PRIORITIES, TASK_DEFAULT_PRIORITY)
+_fanout = ThreadPoolExecutor(max_workers=32, thread_name_prefix="shard")
+cache = LRUCache(CACHE_SIZE, CACHE_TTL)
+invalidator = Invalidator(cache, f"{NAMESPACE}:cache:invalidate")
+
+def _invalidate(keys: list[str]) -> None:
+    cache.invalidate(keys)
+    if cache.enabled:
+        r.publish(invalidator.channel, invalidator.message(keys))
+
+compactors = [Compactor(c, NAMESPACE, RETENTION_RULES, on_delete=_invalidate) for c in nodes]
+last_compact = None
+
+def bind(text_client, raw_client, names: list[str] | None = None) -> None:
+    """Point the server at other Redis clients (benchmarks, in-process use). Each text/raw
+    pair must share one keyspace; pass lists to bind several shards (first = primary)."""
+    global r, rb, nodes, raw_nodes, ring, compactors
+    nodes = text_client if isinstance(text_client, list) else [text_client]
+    raw_nodes = raw_client if isinstance(raw_client, list) else [raw_client]
+    ring = HashRing(names or [f"shard{i}" for i in range(len(nodes))])
+    for c in nodes + raw_nodes:
+        metrics.count_round_trips(c)
+    r, rb = nodes[0], raw_nodes[0]
+    compactors = [Compactor(c, NAMESPACE, RETENTION_RULES, on_delete=_invalidate) for c in nodes]
+    taskq.forget_groups()
+
+def _each_node(fn) -> list:
+    """[fn(node index)] for every node, in parallel when sharded."""
+    return _each_node_of(range(len(nodes)), fn)
+
+def _each_node_of(idx, fn) -> list:
+    return _map(fn, idx)
+
+def _map(fn, items) -> list:
+    """[fn(item)], on the fan-out pool when there are several; each call runs in a copy
+    of the caller's context so per-request metrics follow it."""
+    items = list(items)
+    if len(items) <= 1:
+        return [fn(x) for x in items]
+    return list(_fanout.map(lambda a: a[0].run(fn, a[1]), [(contextvars.copy_context(), x) for x in items]))
+
+def _by_node(keys: list[str], fn) -> dict:
+    """Merged {key: value} from fn(node index, keys on that node) over the nodes owning `keys`."""
+    parts = _map(lambda g: fn(*g), ring.group(keys).items())
+    out = {}
+    for part in parts:
+        out.update(part)
+    return out
+
+def _compact(dry_run: bool = False) -> dict:
+    """Run the compactor on every node; one combined report."""
+    global last_compact
+    reports = _each_node(lambda n: compactors[n].run(dry_run=dry_run))
+    if len(reports) == 1:
+        last_compact = reports[0]
+        return last_compact
+    rules = {}
+    for rep in reports:
+        for name, x in rep["rules"].items():
+            agg = rules.setdefault(name, {"deleted": 0, "bytes": 0})
+            agg["deleted"] += x["deleted"]
+            agg["bytes"] += x["bytes"]
+    last_compact = {
+        "started": min(x["started"] for x in reports), "dry_run": dry_run, "rules": rules,
+        "deleted": sum(x["deleted"] for x in reports),
+        "bytes_reclaimed": sum(x["bytes_reclaimed"] for x in reports),
+        "seconds": max(x["seconds"] for x in reports), "shards": len(reports),
+    }
+    return last_compact
+
+def _compact_loop():
+    """Run the compactor every COMPACT_INTERVAL s; a Redis lock keeps replicas from overlapping."""
+    while True:
+        time.sleep(COMPACT_INTERVAL)
+        try:
+            if r.set(f"{NAMESPACE}:compact:lock", invalidator.instance, nx=True, ex=COMPACT_INTERVAL):
+                report = _compact()
+                print(f"[compact] deleted={report['deleted']} bytes={report['bytes_reclaimed']} "
+                      f"in {report['seconds']}s", flush=True)
+        except Exception as e:
+            print(f"[compact] error: {e}", flush=True)
+
+def _sweep(batch: int = 500) -> dict:
+    """Dead-letter pending tasks past their deadline_ts, and reap claims whose lease ran
+    out: back to pending with attempts + 1, or dead-lettered after TASK_MAX_ATTEMPTS."""
+    now = time.time()
+    zkey, lkey = taskq.deadlines_key(NAMESPACE), taskq.leases_key(NAMESPACE)
+    keys = r.zrangebyscore(zkey, "-inf", now, start=0, num=batch)
+
+    def update(key, data):
+        if data.get("status") != "pending" or not taskq.expired(data, time.time()):
+            return "not_pending"
+        return {**data, "status": "dead", "dead_reason": "deadline_expired", "dead_ts": time.time()}
+
+    res = _cas_many(keys, update, also=_dead_letter)
+    expired = [k for k in keys if res[k][0]]
+    done = expired + [k for k in keys if res[k][1] in ("not_pending", "not_found")]  # contended ones are retried
+    if done:
+        r.zrem(zkey, *done)
+
+    leased = r.zrangebyscore(lkey, "-inf", now, start=0, num=batch)
+    res = _cas_many(leased, _reaper, also=_reaped)
+    gone = [k for k in leased if res[k][1] in ("not_claimed", "not_found")]  # renewed ones keep their new score
+    if gone:
+        r.zrem(lkey, *gone)
+    reaped = [res[k][0]["data"] for k in leased if res[k][0]]
+    requeued = sum(1 for d in reaped if d["status"] == "pending")
+    return {"checked": len(keys) + len(leased), "requeued": requeued,
+            "dead_lettered": len(expired) + len(reaped) - requeued}
+
+def _reaper(key, data):
+    """update() for an expired lease: pending again for another worker, or dead."""
+    now = time.time()
+    if data.get("status") != "claimed":
+        return "not_claimed"
+    if float(data.get("lease_until") or 0) > now:
+        return "renewed"
+    attempts = int(data.get("attempts", 0)) + 1
+    if attempts >= TASK_MAX_ATTEMPTS:
+        return {**data, "attempts": attempts, "status": "dead", "dead_reason": "max_attempts", "dead_ts": now}
+    if taskq.expired(data, now):
+        return {**data, "attempts": attempts, "status": "dead", "dead_reason": "deadline_expired", "dead_ts": now}
+    new = {k: v for k, v in data.items() if k not in ("claimed_by", "claimed_ts", "lease_until", "queue_entry")}
+    return {**new, "attempts": attempts, "status": "pending"}  # _queue_write queues a fresh entry
+
+def _reaped(pipe, key, old, new):
+    """also() hook for the reaper: ack the dead claim's entry and drop its lease."""
+    if old.get("queue_entry") and old.get("assigned_to") is not None:
+        taskq.queue_ack(pipe, NAMESPACE, old, old["queue_entry"])
+    pipe.zrem(taskq.leases_key(NAMESPACE), key)
+    _dead_letter(pipe, key, old, new)
+
+def _sweep_loop():
+    """Run the task sweeper every TASK_SWEEP_INTERVAL s on one replica at a time, and
+    rebuild the queue depth counters every TASK_DEPTH_RECOUNT s."""
+    recounted = time.time()
+    while True:
+        time.sleep(TASK_SWEEP_INTERVAL)
+        try:
+            if r.set(f"{NAMESPACE}:sweep:lock", invalidator.instance, nx=True, px=int(TASK_SWEEP_INTERVAL * 1000)):
+                report = _sweep()
+                if report["requeued"] or report["dead_lettered"]:
+                    print(f"[sweep] requeued={report['requeued']} dead_lettered={report['dead_lettered']}", flush=True)
+                if TASK_DEPTH_RECOUNT > 0 and time.time() - recounted >= TASK_DEPTH_RECOUNT:
+                    _recount_depth()
+                    recounted = time.time()
+        except Exception as e:
+            print(f"[sweep] error: {e}", flush=True)
+
+def _recount_depth() -> None:
+    """Rebuild the per-role depth counters from the field indexes: they drift when tasks
+    are deleted (retention) or were written before the counters existed."""
+    roles = sorted(set().union(*_each_node(lambda n: nodes[n].smembers(values_key(NAMESPACE, "assigned_to")))))
+    pairs = [(role, st) for role in roles for st in taskq.DEPTH_STATUSES]
+
+    def node_counts(n):
+        pipe = nodes[n].pipeline(transaction=False)
+        tmp = f"{NAMESPACE}:tmp:{uuid.uuid4().hex}"
+        for role, st in pairs:
+            pipe.zinterstore(tmp, [index_key(NAMESPACE, "type", "task"), index_key(NAMESPACE, "status", st),
+                                   index_key(NAMESPACE, "assigned_to", role)])
+            pipe.delete(tmp)
+        return pipe.execute()[0::2]
+
+    totals = [sum(c) for c in zip(*_each_node(node_counts))] if pairs else []
+    counts = {taskq.depth_field(role, st): n for (role, st), n in zip(pairs, totals) if n}
+    pipe = r.pipeline(transaction=True)
+    pipe.delete(taskq.depth_key(NAMESPACE))
+    if counts:
+        pipe.hset(taskq.depth_key(NAMESPACE), mapping=counts)
+    pipe.execute()
+
+def _queue_stats(roles: list[str] | None = None) -> dict:
+    """{role: depth per status, drain rate, watermarks, saturated}. Saturation has
+    hysteresis: set at the high watermark, cleared at the low one."""
+    depth = r.hgetall(taskq.depth_key(NAMESPACE))
+    if roles is None:
+        roles = sorted({f.rsplit("|", 1)[0] for f in depth})
+    now = time.time()
+    minute = int(now // 60)
+    pipe = r.pipeline(transaction=False)
+    for role in roles:
+        pipe.hmget(taskq.drain_key(NAMESPACE, role), [str(minute - i) for i in range(QUEUE_DRAIN_WINDOW + 1)])
+    drains = pipe.execute()
+    out, pos, pipe, sat_key = {}, [], r.pipeline(transaction=False), f"{NAMESPACE}:queue_saturated"
+    for role, drain in zip(roles, drains):
+        st = {s: max(0, int(depth.get(taskq.depth_field(role, s)) or 0)) for s in taskq.DEPTH_STATUSES}
+        done = [int(x or 0) for x in drain]
+        rate = sum(done) / (QUEUE_DRAIN_WINDOW + (now % 60) / 60)  # per minute, current minute included
+        high, low = QUEUE_WATERMARKS.get(role, (QUEUE_HIGH, QUEUE_LOW))
+        out[role] = {**st, "done_last_min": done[1], "drain_per_min": round(rate, 2),
+                     "eta_s": round(st["pending"] / rate * 60, 1) if rate else None, "high": high, "low": low}
+        if st["pending"] >= high:
+            pipe.sadd(sat_key, role)
+        elif st["pending"] <= low:
+            pipe.srem(sat_key, role)
+        pipe.sismember(sat_key, role)
+        pos.append(len(pipe) - 1)
+    res = pipe.execute() if roles else []
+    for role, i in zip(roles, pos):
+        out[role]["saturated"] = bool(res[i])
+    return out
+
+@asynccontextmanager
+async def lifespan(app):
+    if cache.enabled:
+        threading.Thread(target=invalidator.listen, args=(r,), daemon=True).start()
+    if COMPACT_INTERVAL > 0:
+        threading.Thread(target=_compact_loop, daemon=True).start()
+    if TASK_SWEEP_INTERVAL > 0:
+        threading.Thread(target=_sweep_loop, daemon=True).start()
+    yield
+
+app = FastAPI(title="NovaOS MCP Memory Server", lifespan=lifespan)
+_tool_paths = set()  # filled once all routes exist; bounds the metrics "tool" label
+app.add_middleware(metrics.MetricsMiddleware, tools=_tool_paths)
+_waiters = anyio.CapacityLimiter(MAX_WAITERS)
+
+def long_poll(path: str):
+    """app.post(path) for a sync route that blocks up to req.wait seconds. A request that
+    may wait runs on a thread limited by MAX_WAITERS instead of the shared request pool,
+    so waiters cannot hold every thread and stall plain reads and writes; time spent
+    queued for a waiter thread comes off its wait. The function itself stays sync (the
+    route's endpoint has it as __wrapped__)."""
+    def register(fn):
+        @functools.wraps(fn)
+        async def endpoint(req):
+            if req.wait <= 0:
+                return await run_in_threadpool(fn, req)
+            queued = time.monotonic()
+
+            def run():
+                req.wait = max(0.0, req.wait - (time.monotonic() - queued))
+                return fn(req)
+            return await anyio.to_thread.run_sync(run, limiter=_waiters)
+        app.post(path)(endpoint)
+        return fn
+    return register
 
 class WriteReq(BaseModel):
     key: str | None = None
     data: dict
+    dedupe_key: str | None = None    # skip the write if this key was written within dedupe_ttl
+    dedupe_ttl: float | None = None  # seconds (default MCP_DEDUPE_TTL)
+
+class WriteBatchReq(BaseModel):
+    records: list[WriteReq]
+    atomic: bool = False  # MULTI/EXEC instead of a plain pipeline
 
 class ReadReq(BaseModel):
     key: str
 
+class ReadManyReq(BaseModel):
+    keys: list[str]
+
 class SearchReq(BaseModel):
     q: str
     limit: int = 20
+    scan: bool = False          # walk the whole index instead of the newest `limit` keys
+    cursor: str | None = None   # resume point returned by a previous scan
+    budget: int | None = None   # max records examined per call (scan mode)
+
+class QueryReq(BaseModel):
+    where: dict[str, str | int | float | bool]
+    limit: int = 20
+    order: str = "desc"  # "asc" = oldest first
+    wait: float = 0      # seconds to block for a match when there is none yet
+
+class FtsReq(BaseModel):
+    q: str
+    op: str = "and"  # "and" | "or"
+    limit: int = 20
+
+class CompactReq(BaseModel):
+    dry_run: bool = False
+
+class QueueStatsReq(BaseModel):
+    roles: list[str] | None = None  # default: every role with a depth counter
+    recount: bool = False           # rebuild the counters from the indexes first
+
+class SweepReq(BaseModel):
+    batch: int = 500  # deadlines and leases examined, each
+
+class WatchReq(BaseModel):
+    where: dict[str, str | int | float | bool] = {}
+    after: str = "$"     # feed offset to resume from; "$" = only writes after this call
+    wait: float = 25     # seconds to block when nothing matches yet
+    limit: int = 100
+
+class ClaimReq(BaseModel):
+    claimer: str
+    key: str | None = None     # claim this task, or
+    role: str | None = None    # the next task queued for this role
+    wait: float = 0            # with role: seconds to block for one to be queued
+    lease: float | None = None  # seconds until the claim expires unless renewed (default MCP_TASK_LEASE)
+
+class ClaimBatchReq(BaseModel):
+    claimer: str
+    role: str
+    n: int = 20
+    wait: float = 0  # seconds to block when none are queued; returns as soon as any are
+    lease: float | None = None
+
+class RenewReq(BaseModel):
+    claimer: str
+    keys: list[str]
+    lease: float | None = None
+
+class CompleteReq(BaseModel):
+    key: str
+    result: dict = {}
+    claimer: str | None = None  # set: refused with "not_owner" unless it still holds the claim
+
+class CompleteBatchReq(BaseModel):
+    items: list[CompleteReq]
+
+class ReindexReq(BaseModel):
+    cursor: int = 0
+    count: int = 1000
+    shard: int = 0  # node being walked; the reply names the next one
+
+def _old_indexes(keys: list[str]) -> dict:
+    """Field-index and full-text memberships of records about to be overwritten (one round trip per node)."""
+    def node_old(n, ks):
+        pipe = nodes[n].pipeline(transaction=False)
+        for k in ks:
+            pipe.hmget(k, "idx", "terms")
+        return {k: {"idx": parse_idx(i), "terms": fts.parse_terms(t)} for k, (i, t) in zip(ks, pipe.execute())}
+    return _by_node(keys, node_old)
+
+def _queue_write(pipe, key: str, data: dict, ts: float, old: dict | None = None, feed=None) -> None:
+    """Queue the HSET, recency ZADD, field-index and posting updates for one record on `pipe`
+    (the record's node) and its change-feed entry on `feed` (the primary; defaults to `pipe`)."""
+    old = old or {}
+    new_idx = index_values(data)
+    payload, enc = codec.encode(data, CODECS.spec_for(key))
+    metrics.payload_bytes.observe(("write",), len(payload))
+    fields = {"payload": payload, "enc": enc, "ts": str(ts), "idx": json.dumps(new_idx)}
+    if FTS_ENABLED:
+        new_terms = fts.term_counts(data)
+        fields["terms"] = json.dumps(new_terms)
+        fts.queue_postings(pipe, NAMESPACE, key, old.get("terms", {}), new_terms, ts)
+    if "lease_until" in data:
+        fields["lease_until"] = str(data["lease_until"])
+    elif old.get("idx", {}).get("status") == "claimed":
+        pipe.hdel(key, "lease_until")
+    pipe.hset(key, mapping=fields)
+    pipe.zadd(f"{NAMESPACE}:index", {key: ts})
+    queue_index_update(pipe, NAMESPACE, key, old.get("idx", {}), new_idx, ts)
+    (feed or pipe).xadd(f"{NAMESPACE}:feed", {"key": key, "ts": str(ts), "idx": fields["idx"]},
+              maxlen=FEED_MAXLEN, approximate=True)
+    taskq.queue_depth_update(feed or pipe, NAMESPACE, old.get("idx", {}), new_idx, ts)
+    if taskq.queued_role(data, old.get("idx", {})) is not None:
+        taskq.queue_enqueue(feed or pipe, NAMESPACE, key, data, TASK_STREAM_MAXLEN)
+    elif taskq.blocked(data):
+        taskq.queue_block(feed or pipe, NAMESPACE, key, data)
+
+def _write(items: list[tuple[str, dict]], existing: list[str], atomic: bool = False) -> None:
+    """Write [(key, data)], one pipeline per node (MULTI/EXEC per node when atomic) plus the
+    feed entries on the primary. `existing` are caller-chosen keys that may be overwrites."""
+    old = _old_indexes(existing)
+    pipes = {0: r.pipeline(transaction=atomic)}
+    for k, data in items:
+        n = ring.node(k)
+        if n not in pipes:
+            pipes[n] = nodes[n].pipeline(transaction=atomic)
+        _queue_write(pipes[n], k, data, time.time(), old.get(k), feed=pipes[0])
+    _commit(pipes, [k for k, _ in items])
+
+def _commit(pipes: dict, keys: list[str]) -> None:
+    """Execute the per-node write pipelines and invalidate the written keys here and on other replicas.
+    The primary's goes last: its feed entries and invalidation must not be seen before the
+    records land, or a watcher could fetch, and another replica re-cache, the old record."""
+    if cache.enabled:
+        pipes[0].publish(invalidator.channel, invalidator.message(keys))
+    _map(lambda p: p.execute(), [p for n, p in pipes.items() if n])
+    pipes[0].execute()
+    cache.invalidate(keys)
+
+def _data(payload: bytes, enc, lease) -> dict:
+    """A record's data: its payload, with the lease memory.renew keeps in a field beside it."""
+    data = codec.decode(payload, enc)
+    if lease:
+        data["lease_until"] = float(lease)
+    return data
+
+def _decode(key: str, h: dict) -> dict:
+    """Record from a raw (bytes) HGETALL reply."""
+    payload = h.get(b"payload", b"{}")
+    metrics.payload_bytes.observe(("read",), len(payload))
+    return {"key": key, "data": _data(payload, h.get(b"enc"), h.get(b"lease_until")), "ts": float(h.get(b"ts", b"0"))}
+
+def _fetch(keys: list[str]) -> list[dict]:
+    """Decoded records for `keys`, in order, dropping keys that do not exist."""
+    found = _fetch_map(keys)
+    return [found[k] for k in keys if k in found]
+
+def _fetch_map(keys: list[str]) -> dict:
+    """{key: record} from the cache or one HGETALL pipeline per node for the misses."""
+    found = {}
+    misses = []
+    for k in keys:
+        rec = cache.get(k) if cache.enabled else None
+        if rec is None:
+            misses.append(k)
+        else:
+            found[k] = rec
+    if misses:
+        seq = cache.seq()
+        found.update(_by_node(misses, lambda n, ks: _hgetall(n, ks, seq)))
+        if SHARD_FALLBACK and len(nodes) > 1:
+            for k in misses:
+                for n in range(len(nodes)):
+                    if k in found:
+                        break
+                    if n != ring.node(k):
+                        found.update(_hgetall(n, [k], seq))
+    return found
+
+def _fetch_fresh(keys: list[str]) -> dict:
+    """_fetch_map that skips the cache, for decisions another replica's write may have changed."""
+    seq = cache.seq()
+    return _by_node(list(dict.fromkeys(keys)), lambda n, ks: _hgetall(n, ks, seq))
+
+def _hgetall(n: int, keys: list[str], seq: int) -> dict:
+    pipe = raw_nodes[n].pipeline(transaction=False)
+    for k in keys:
+        pipe.hgetall(k)
+    out = {}
+    for k, h in zip(keys, pipe.execute()):
+        if h:
+            out[k] = rec = _decode(k, h)
+            cache.put(k, rec, seq)
+    return out
 
 @app.get("/health")
 def health():
     return {"ok": True}
 
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+def _index_metrics() -> list:
+    """Scrape-time gauges: recency-index size per node, distinct values and members per indexed field."""
+    def node_stats(n):
+        c = nodes[n]
+        pipe = c.pipeline(transaction=False)
+        pipe.zcard(f"{NAMESPACE}:index")
+        for f in INDEX_FIELDS:
+            pipe.smembers(values_key(NAMESPACE, f))
+        size, *values = pipe.execute()
+        pairs = [(f, v) for f, vals in zip(INDEX_FIELDS, values) for v in sorted(vals)[:METRICS_MAX_VALUES]]
+        pipe = c.pipeline(transaction=False)
+        for f, v in pairs:
+            pipe.zcard(index_key(NAMESPACE, f, v))
+        return size, values, dict(zip(pairs, pipe.execute()))
+    stats = _each_node(node_stats)
+    distinct = {f: set() for f in INDEX_FIELDS}
+    members = {}
+    for _, values, counts in stats:
+        for f, vals in zip(INDEX_FIELDS, values):
+            distinct[f] |= vals
+        for pair, n in counts.items():
+            members[pair] = members.get(pair, 0) + n
+    return [
+        ("mcp_index_records", "gauge", "Records in the recency index, per shard node.",
+         [({"shard": str(n)}, size) for n, (size, _, _) in enumerate(stats)]),
+        ("mcp_index_values", "gauge", "Distinct values seen per indexed field.",
+         [({"field": f}, len(v)) for f, v in distinct.items()]),
+        ("mcp_index_members", "gauge", f"Records per indexed field value (first {METRICS_MAX_VALUES} values per field).",
+         [({"field": f, "value": v}, n) for (f, v), n in sorted(members.items()) if n]),
+        ("mcp_feed_length", "gauge", "Entries in the change feed stream.", [({}, r.xlen(f"{NAMESPACE}:feed"))]),
+    ]
+
+def _cache_metrics() -> list:
+    st = cache.stats()
+    return [
+        ("mcp_cache_entries", "gauge", "Records in the read cache.", [({}, st["size"])]),
+        ("mcp_cache_hits_total", "counter", "Read cache hits.", [({}, st["hits"])]),
+        ("mcp_cache_misses_total", "counter", "Read cache misses.", [({}, st["misses"])]),
+        ("mcp_cache_evictions_total", "counter", "Read cache LRU evictions.", [({}, st["evictions"])]),
+    ]
+
+metrics.registry.collector(_index_metrics)
+metrics.registry.collector(_cache_metrics)
+
+def _queue_metrics() -> list:
+    depth = r.hgetall(taskq.depth_key(NAMESPACE))
+    return [("mcp_task_queue_depth", "gauge", "Tasks per role and status (pending, claimed, blocked).",
+             [({"role": f.rsplit("|", 1)[0], "status": f.rsplit("|", 1)[1]}, max(0, int(n)))
+              for f, n in sorted(depth.items())])]
+
+metrics.registry.collector(_queue_metrics)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return {"ok": True, "cache": cache.stats()}
+
+def _dedupe_reqs(keys: list[str], recs: list[WriteReq]) -> list[tuple[str, str, float]]:
+    return [(k, rec.dedupe_key, rec.dedupe_ttl or DEDUPE_TTL) for k, rec in zip(keys, recs) if rec.dedupe_key]
+
+def _count_dedupe(reqs: list, dup: dict) -> None:
+    if reqs:
+        metrics.dedupe.inc(("new",), len(reqs) - len(dup))
+        metrics.dedupe.inc(("duplicate",), len(dup))
+
+def _reserve(reqs: list[tuple[str, str, float]]) -> dict:
+    """Reserve dedupe keys (one round trip on the primary). {key: holder} for duplicates."""
+    if not reqs:
+        return {}
+    pipe = r.pipeline(transaction=False)
+    dedupe.queue_reserve(pipe, NAMESPACE, reqs)
+    dup = dedupe.holders(pipe.execute(), reqs)
+    _count_dedupe(reqs, dup)
+    return dup
+
+def _invalid(records: list[WriteReq]) -> dict | None:
+    """The error reply for the first record a write must refuse, or None."""
+    for i, rec in enumerate(records):
+        err = taskq.bad_task(rec.data)
+        if err:
+            out = {"ok": False, "error": err, "index": i}
+            if err == "bad_priority":
+                out["priorities"] = list(TASK_PRIORITIES)
+            return out
+    return None
+
 @app.post("/tools/memory.write")
 def memory_write(req: WriteReq):
+    """Write a record. With `dedupe_key`, a repeat within `dedupe_ttl` is skipped and
+    answered with the first write's key and "duplicate": true."""
+    bad = _invalid([req])
+    if bad:
+        return bad
     k = req.key or f"{NAMESPACE}:{uuid.uuid4().hex}"
-    r.hset(k, mapping={"payload": json.dumps(req.data), "ts": str(time.time())})
-    r.zadd(f"{NAMESPACE}:index", {k: time.time()})
+    reqs = _dedupe_reqs([k], [req])
+    dup = _reserve(reqs)
+    if dup:
+        return {"ok": True, "key": dup[k], "duplicate": True}
+    try:
+        _write([(k, req.data)], [k] if req.key else [])
+    except Exception:
+        if reqs:  # let a retry through
+            r.delete(dedupe.dedupe_key(NAMESPACE, req.dedupe_key))
+        raise
+    if taskq.blocked(req.data):
+        _unblock([k])  # parents that settled before it was written
     return {"ok": True, "key": k}
 
+@app.post("/tools/memory.write_batch")
+def memory_write_batch(req: WriteBatchReq):
+    """Write many records in one pipeline per node. `duplicates` lists the positions
+    skipped for their dedupe key; their `keys` entry is the earlier record's key."""
+    if len(req.records) > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    bad = _invalid(req.records)
+    if bad:
+        return bad
+    keys = [rec.key or f"{NAMESPACE}:{uuid.uuid4().hex}" for rec in req.records]
+    reqs = _dedupe_reqs(keys, req.records)
+    dup = _reserve(reqs)
+    try:
+        _write([(k, rec.data) for k, rec in zip(keys, req.records) if k not in dup],
+               [rec.key for rec in req.records if rec.key and rec.key not in dup], atomic=req.atomic)
+    except Exception:
+        won = [dedupe.dedupe_key(NAMESPACE, dk) for k, dk, _ in reqs if k not in dup]
+        if won:
+            r.delete(*won)
+        raise
+    _unblock([k for k, rec in zip(keys, req.records) if k not in dup and taskq.blocked(rec.data)])
+    return {"ok": True, "keys": [dup.get(k, k) for k in keys], "duplicates": [i for i, k in enumerate(keys) if k in dup]}
+
 @app.post("/tools/memory.read")
 def memory_read(req: ReadReq):
-    data = r.hgetall(req.key)
-    if not data:
+    recs = _fetch([req.key])
+    if not recs:
         return {"ok": False, "error": "not_found"}
-    return {"ok": True, "data": json.loads(data["payload"]), "ts": float(data["ts"])}
+    return {"ok": True, "data": recs[0]["data"], "ts": recs[0]["ts"]}
+
+@app.post("/tools/memory.read_many")
+def memory_read_many(req: ReadManyReq):
+    """Read up to READ_MANY_MAX keys in one round trip; missing keys come back as null."""
+    if len(req.keys) > READ_MANY_MAX:
+        return {"ok": False, "error": "too_many_keys", "max": READ_MANY_MAX}
+    found = _fetch_map(req.keys)
+    return {"ok": True, "results": [found.get(k) for k in req.keys]}
+
+def _hit(rec: dict, q: str) -> bool:
+    return q in json.dumps(rec["data"]).lower()
+
+def _newest(n: int, limit: int) -> list:
+    return nodes[n].zrevrange(f"{NAMESPACE}:index", 0, limit-1, withscores=True)
 
 @app.post("/tools/memory.search")
 def memory_search(req: SearchReq):
-    keys = r.zrevrange(f"{NAMESPACE}:index", 0, req.limit-1)
-    out = []
+    q = req.q.lower()
+    if not req.scan:
+        entries = shards.merge(_each_node(lambda n: _newest(n, req.limit)), req.limit)
+        results = [rec for rec in _fetch([k for k, _ in entries]) if _hit(rec, q)]
+        metrics.searched("newest", len(entries), len(results))
+        return {"ok": True, "results": results}
+
+    # Scan mode: newest to oldest (merged across nodes) in pages until `limit` hits or the budget is spent.
+    budget = min(req.budget or SCAN_BUDGET, SCAN_BUDGET)
+    positions = shards.parse_cursor(req.cursor, len(nodes))
+    if positions is None:
+        return {"ok": False, "error": "stale_cursor"}
+    out, scanned = [], 0
+    while len(out) < req.limit and scanned < budget and any(positions):
+        n = min(SCAN_PAGE, budget - scanned)
+        live = [i for i, pos in enumerate(positions) if pos]
+        pages = dict(zip(live, _each_node_of(live, lambda i: nodes[i].zrevrangebyscore(
+            f"{NAMESPACE}:index", positions[i][0], "-inf", start=positions[i][1], num=n, withscores=True))))
+        entries = shards.scan_order(pages, n)
+        recs = _fetch_map([k for _, k, _ in entries])
+        taken = dict.fromkeys(live, 0)
+        for i, k, score in entries:
+            shards.advance(positions[i], score)
+            taken[i] += 1
+            scanned += 1
+            rec = recs.get(k)
+            if rec and _hit(rec, q):
+                out.append(rec)
+            if len(out) >= req.limit or scanned >= budget:
+                break
+        for i in live:
+            if len(pages[i]) < n and taken[i] == len(pages[i]):
+                positions[i] = None  # short page fully consumed: node exhausted
+    metrics.searched("scan", scanned, len(out))
+    return {"ok": True, "results": out, "cursor": shards.format_cursor(positions), "scanned": scanned}
+
+@long_poll("/tools/memory.query")
+def memory_query(req: QueryReq):
+    """
+    Exact-match lookup on indexed fields; cost is O(matches), not O(records). With
+    `wait`, an empty result blocks on the change feed until a matching write lands
+    (or `wait` seconds pass) and the query is rerun.
+    """
+    bad = [f for f in req.where if f not in INDEX_FIELDS]
+    if bad or not req.where:
+        return {"ok": False, "error": "unindexed_field", "fields": bad, "indexed": list(INDEX_FIELDS)}
+    zkeys = [index_key(NAMESPACE, f, v) for f, v in req.where.items()]
+    desc = req.order != "asc"
+    after = _feed_offset() if req.wait > 0 else None  # taken first, so a write during the query still wakes us
+    deadline = time.monotonic() + min(req.wait, WATCH_MAX_WAIT)
+    while True:
+        entries = shards.merge(_each_node(lambda n: _query_node(n, zkeys, desc, req.limit)), req.limit, desc)
+        results = [rec for rec in _fetch([k for k, _ in entries]) if matches(rec["data"], req.where)]
+        metrics.searched("query", len(entries), len(results))
+        if results or after is None:
+            break
+        hits, after = _wait_feed(req.where, after, deadline)
+        if not hits:
+            break
+    return {"ok": True, "results": results}
+
+def _query_node(n: int, zkeys: list[str], desc: bool, limit: int) -> list:
+    """[(key, ts)] in the intersection of `zkeys` on one node (a temp zset if more than one)."""
+    c = nodes[n]
+    if len(zkeys) == 1:
+        return (c.zrevrange if desc else c.zrange)(zkeys[0], 0, limit-1, withscores=True)
+    tmp = f"{NAMESPACE}:tmp:{uuid.uuid4().hex}"
+    pipe = c.pipeline(transaction=True)
+    pipe.zinterstore(tmp, zkeys, aggregate="MAX")
+    (pipe.zrevrange if desc else pipe.zrange)(tmp, 0, limit-1, withscores=True)
+    pipe.delete(tmp)
+    return pipe.execute()[1]
+
+@app.post("/tools/memory.fts")
+def memory_fts(req: FtsReq):
+    """Term search over the inverted index, ranked by term frequency and recency."""
+    if not FTS_ENABLED:
+        return {"ok": False, "error": "fts_disabled"}
+    terms = list(dict.fromkeys(fts.tokenize(req.q)))
+    if not terms:
+        return {"ok": True, "results": []}
+    now = time.time()
+    scored = [x for part in _each_node(lambda n: _fts_node(n, terms, req.op, req.limit, now)) for x in part]
+    scored.sort(key=lambda x: x["score"], reverse=True)
+    metrics.searched("fts", len(scored), min(len(scored), req.limit))
+    return {"ok": True, "results": scored[:req.limit]}
+
+def _fts_node(n: int, terms: list[str], op: str, limit: int, now: float) -> list:
+    """Scored matches among one node's newest candidates."""
+    zkeys = [fts.posting_key(NAMESPACE, t) for t in terms]
+    # Newest FTS_CANDIDATES matches are ranked; older ones only surface if they outscore them.
+    n_cand = max(limit, FTS_CANDIDATES)
+    c = nodes[n]
+    if len(zkeys) == 1:
+        keys = c.zrevrange(zkeys[0], 0, n_cand-1)
+    else:
+        tmp = f"{NAMESPACE}:tmp:{uuid.uuid4().hex}"
+        pipe = c.pipeline(transaction=True)
+        if op == "or":
+            pipe.zunionstore(tmp, zkeys, aggregate="MAX")
+        else:
+            pipe.zinterstore(tmp, zkeys, aggregate="MAX")
+        pipe.zrevrange(tmp, 0, n_cand-1)
+        pipe.delete(tmp)
+        keys = pipe.execute()[1]
+    pipe = raw_nodes[n].pipeline(transaction=False)
     for k in keys:
-        h = r.hgetall(k)
-        if not h:
+        pipe.hmget(k, "payload", "enc", "ts", "terms", "lease_until")
+    scored = []
+    for k, (payload, enc, ts, raw_terms, lease) in zip(keys, pipe.execute()):
+        if payload is None:
+            continue
+        s = fts.score(fts.parse_terms(raw_terms), terms, float(ts), now)
+        scored.append({"key": k, "data": _data(payload, enc, lease), "ts": float(ts), "score": s})
+    return scored
+
+@app.post("/tools/memory.compact")
+def memory_compact(req: CompactReq):
+    """Apply the retention rules now. dry_run counts what would be deleted."""
+    return {"ok": True, "report": _compact(dry_run=req.dry_run)}
+
+@app.post("/tools/memory.queue_stats")
+def memory_queue_stats(req: QueueStatsReq):
+    """Per-role task queue depth (pending, claimed, blocked), completions over the last
+    minute, drain rate (tasks/min over MCP_QUEUE_DRAIN_WINDOW minutes), time to drain,
+    and the watermarks with the role's saturated flag, for producers to back off on."""
+    if req.recount:
+        _recount_depth()
+    return {"ok": True, "roles": _queue_stats(req.roles)}
+
+@app.post("/tools/memory.sweep")
+def memory_sweep(req: SweepReq):
+    """Run the task sweeper now instead of waiting for MCP_TASK_SWEEP_INTERVAL."""
+    return {"ok": True, "report": _sweep(req.batch)}
+
+@app.get("/compact/stats")
+def compact_stats():
+    return {"ok": True, "rules": RETENTION_RULES, "last": last_compact}
+
+def _feed_offset() -> str:
+    last = r.xrevrange(f"{NAMESPACE}:feed", count=1)
+    return last[0][0] if last else "0-0"
+
+def _wait_feed(where: dict, after: str, deadline: float, limit: int = 100) -> tuple[list, str]:
+    """([(entry id, key)], new offset): change-feed entries after `after` whose indexed
+    values match `where`, blocking until the first arrive or `deadline` (monotonic)."""
+    feed = f"{NAMESPACE}:feed"
+    hits = []
+    while not hits:
+        block = int(min(deadline - time.monotonic(), BLOCK_SLICE) * 1000)
+        if block <= 0:
+            break
+        resp = r.xread({feed: after}, count=limit, block=block)
+        if not resp:
             continue
-        payload = json.loads(h.get("payload","{}"))
-        if req.q.lower() in json.dumps(payload).lower():
-            out.append({"key": k, "data": payload, "ts": float(h.get("ts","0"))})
-    return {"ok": True, "results": out}
+        for entry_id, fields in resp[0][1]:
+            after = entry_id
+            if matches(parse_idx(fields.get("idx")), where):
+                hits.append((entry_id, fields["key"]))
+    return hits, after
+
+@long_poll("/tools/memory.watch")
+def memory_watch(req: WatchReq):
+    """
+    Long-poll the change feed. Returns as soon as writes matching `where` (indexed
+    fields only) arrive after offset `after`, or empty after `wait` seconds. Pass the
+    returned `offset` back as `after` to resume without gaps.
+    """
+    bad = [f for f in req.where if f not in INDEX_FIELDS]
+    if bad:
+        return {"ok": False, "error": "unindexed_field", "fields": bad, "indexed": list(INDEX_FIELDS)}
+    after = _feed_offset() if req.after == "$" else req.after
+    hits, after = _wait_feed(req.where, after, time.monotonic() + min(req.wait, WATCH_MAX_WAIT), req.limit)
+    found = _fetch_map([k for _, k in hits])
+    results = [{**found[k], "offset": eid} for eid, k in hits if k in found]
+    return {"ok": True, "results": results, "offset": after}
+
+def _cas(key: str, update, also=None) -> tuple:
+    """
+    Atomically rewrite one record: WATCH it, decode, call update(key, data), and write
+    the result in MULTI/EXEC, retrying if another writer got in between. update returns
+    the new payload, or an error string to leave the record alone. also(pipe, key, old, new)
+    may queue more commands on the primary (inside the transaction when the record
+    lives there). Returns (record, None) or (None, error).
+    """
+    return _cas_node(ring.node(key), [key], update, also)[key]
+
+def _cas_many(keys: list[str], update, also=None) -> dict:
+    """_cas over many records in one WATCH/MULTI transaction per node (nodes in parallel).
+    Returns {key: (record, None) or (None, error)}."""
+    return _by_node(list(dict.fromkeys(keys)), lambda n, ks: _cas_node(n, ks, update, also))
+
+def _cas_node(n: int, keys: list[str], update, also=None, retries: int = 20) -> dict:
+    for _ in range(retries):
+        out, writes = {}, []
+        with raw_nodes[n].pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(*keys)
+                # read on another connection in one round trip; a write after WATCH still aborts EXEC
+                read = raw_nodes[n].pipeline(transaction=False)
+                for k in keys:
+                    read.hgetall(k)
+                for k, h in zip(keys, read.execute()):
+                    if not h:
+                        out[k] = (None, "not_found")
+                        continue
+                    data = _data(h[b"payload"], h.get(b"enc"), h.get(b"lease_until"))
+                    new = update(k, data)
+                    if isinstance(new, str):
+                        out[k] = (None, new)
+                    else:
+                        writes.append((k, h, data, new))
+                if not writes:
+                    return out
+                ts = time.time()
+                feed = pipe if n == 0 else r.pipeline(transaction=False)
+                pipe.multi()
+                for k, h, data, new in writes:
+                    old = {"idx": parse_idx(h.get(b"idx")), "terms": fts.parse_terms(h.get(b"terms"))}
+                    _queue_write(pipe, k, new, ts, old, feed=feed)
+                    if also:
+                        also(feed, k, data, new)
+                pipe.execute()
+            except redis.WatchError:
+                continue
+        if feed is not pipe:
+            feed.execute()
+        _invalidate([k for k, *_ in writes])
+        for _, _, data, new in writes:
+            _count_task(data, new)
+        out.update({k: ({"key": k, "data": new, "ts": ts}, None) for k, _, _, new in writes})
+        _release_children([k for k, _, data, new in writes if taskq.settled(data, new)])
+        return out
+    return {k: (None, "contended") for k in keys}
+
+def _claimer(claimer: str, entries: dict | None = None, lease: float | None = None):
+    """update() for claiming: pending -> claimed under a lease, or -> dead once past its
+    deadline_ts. entries maps key -> the stream entry it was delivered as."""
+    def update(key, data):
+        if data.get("status") != "pending":
+            return "not_pending"
+        now = time.time()
+        if taskq.expired(data, now):
+            return {**data, "status": "dead", "dead_reason": "deadline_expired", "dead_ts": now}
+        new = {**data, "status": "claimed", "claimed_by": claimer, "claimed_ts": now,
+               "lease_until": now + (lease or TASK_LEASE)}
+        entry = (entries or {}).get(key)
+        if entry is not None:
+            new["queue_entry"] = entry
+        else:
+            new.pop("queue_entry", None)
+        return new
+    return update
+
+def _on_claim(pipe, key, old, new):
+    """also() hook for claims: track the lease, or dead-letter an expired task."""
+    if new.get("status") == "claimed":
+        pipe.zadd(taskq.leases_key(NAMESPACE), {key: new["lease_until"]})
+    _dead_letter(pipe, key, old, new)
+
+def _dead_letter(pipe, key, old, new):
+    """also() hook: file a task that just went dead in its role's dead-letter zset."""
+    if new.get("status") == "dead" and old.get("status") != "dead":
+        taskq.queue_dead(pipe, NAMESPACE, key, new, new["dead_ts"])
+        pipe.zrem(taskq.deadlines_key(NAMESPACE), key)
+
+def _count_task(old, new):
+    """Task metrics for an applied write (not from the also() hooks: a WATCH retry re-runs them)."""
+    if new.get("status") == "dead" and old.get("status") != "dead":
+        metrics.tasks_dead.inc((new["dead_reason"],))
+    elif new.get("status") == "pending" and old.get("status") == "claimed":
+        metrics.tasks_requeued.inc()
+
+def _unblock(keys: list[str]) -> None:
+    """Release the blocked tasks in `keys` whose parents have settled: drop the done ones
+    from waiting_on, and make the task pending (queued) once none are left. A task with a
+    dead parent goes dead too, which settles its own children in turn."""
+    if not keys:
+        return
+    waiting = {p for rec in _fetch_fresh(keys).values() for p in rec["data"].get("waiting_on") or []}
+    status = {k: rec["data"].get("status") for k, rec in _fetch_fresh(list(waiting)).items()}
+
+    def update(key, data):
+        if not taskq.blocked(data):
+            return "not_blocked"
+        now = time.time()
+        if any(status.get(p) == "dead" for p in data["waiting_on"]):
+            return {**data, "status": "dead", "dead_reason": "parent_dead", "dead_ts": now}
+        left = [p for p in data["waiting_on"] if status.get(p) != "done"]
+        if len(left) == len(data["waiting_on"]):
+            return "still_blocked"
+        return {**data, "waiting_on": left, **({} if left else {"status": "pending", "ready_ts": now})}
+
+    _cas_many(keys, update, also=_dead_letter)
+
+def _release_children(keys: list[str]) -> None:
+    """Completion hook: release the children of tasks that just settled."""
+    if not keys:
+        return
+    pipe = r.pipeline(transaction=False)
+    for k in keys:
+        pipe.smembers(taskq.children_key(NAMESPACE, k))
+    children = [c for members in pipe.execute() for c in members]
+    _unblock(children)
+    r.delete(*[taskq.children_key(NAMESPACE, k) for k in keys])
+
+def _claimed(res: dict, keys: list, queued_at: dict) -> list:
+    """The records _cas_many actually claimed, in `keys` order, recording their queue wait."""
+    won = [res[k][0] for k in keys if res[k][0] and res[k][0]["data"]["status"] == "claimed"]
+    for rec in won:
+        d = rec["data"]
+        since = queued_at.get(rec["key"]) or d.get("ts")
+        if isinstance(since, (int, float)):
+            metrics.task_queue_wait.observe((taskq.priority_of(d),), max(0.0, d["claimed_ts"] - since))
+    return won
+
+def _claim_entries(role: str, claimer: str, entries: list[tuple[str, str, str]], lease: float | None) -> list:
+    """Claim the tasks behind delivered stream entries in one batch; ack the stale ones."""
+    if not entries:
+        return []
+    by_key = {}
+    for eid, key, _ in entries:
+        by_key.setdefault(key, eid)
+    res = _cas_many(list(by_key), _claimer(claimer, by_key, lease), also=_on_claim)
+    won = _claimed(res, list(by_key), {k: taskq.entry_ts(eid) for k, eid in by_key.items()})
+    won_keys = {rec["key"] for rec in won}
+    stale = {}
+    for eid, key, prio in entries:
+        if key not in won_keys or by_key[key] != eid:
+            stale.setdefault(prio, []).append(eid)
+    for prio, ids in stale.items():
+        r.xack(taskq.stream_key(NAMESPACE, role, prio), taskq.GROUP, *ids)
+    return won
+
+def _pending_for(role: str, limit: int) -> list[str]:
+    """Oldest pending task keys assigned to `role`, across nodes."""
+    zkeys = [index_key(NAMESPACE, "type", "task"), index_key(NAMESPACE, "status", "pending"),
+             index_key(NAMESPACE, "assigned_to", role)]
+    return [k for k, _ in shards.merge(_each_node(lambda n: _query_node(n, zkeys, False, limit)), limit, desc=False)]
+
+def _claim_pass(role: str, claimer: str, n: int, lease: float | None) -> list:
+    """One non-blocking pass of _claim_next: never claims more than `n`."""
+    got = []
+    for prio in TASK_PRIORITIES:
+        while len(got) < n:
+            entries = taskq.read(r, NAMESPACE, role, prio, claimer, count=n - len(got))
+            if not entries:
+                break
+            got += _claim_entries(role, claimer, entries, lease)
+    if len(got) < n:
+        # tasks with no stream entry: queued before streams, trimmed off a long backlog, or
+        # whose entry was read by a server that died before claiming it
+        have = {rec["key"] for rec in got}
+        keys = [k for k in _pending_for(role, max(n, CLAIM_CANDIDATES)) if k not in have][:n - len(got)]
+        got += _claimed(_cas_many(keys, _claimer(claimer, lease=lease), also=_on_claim), keys, {})
+    return got
+
+def _claim_next(role: str, claimer: str, n: int, wait: float, lease: float | None = None) -> list:
+    """Up to `n` claimed task records for `role`: most urgent lane first, oldest queued
+    first within a lane. Tasks found past their deadline are dead-lettered instead.
+    Waiting blocks on the lanes only to wake up, then claims with another pass."""
+    deadline = time.monotonic() + min(wait, WATCH_MAX_WAIT)
+    # marks first: an entry added during the pass still wakes the wait below
+    marks = taskq.marks(r, NAMESPACE, role, TASK_PRIORITIES) if wait > 0 else None
+    got = _claim_pass(role, claimer, n, lease)
+    while not got:
+        block = int(min(deadline - time.monotonic(), BLOCK_SLICE) * 1000)
+        if block <= 0:
+            break
+        if taskq.wait(r, marks, block):  # a quiet slice leaves nothing new to claim
+            marks = taskq.marks(r, NAMESPACE, role, TASK_PRIORITIES)
+            got = _claim_pass(role, claimer, n, lease)
+    return got
+
+@long_poll("/tools/memory.claim")
+def memory_claim(req: ClaimReq):
+    """
+    Compare-and-set a task from pending to claimed and return it. With `role`, takes the
+    next entry from the role's task stream through its consumer group, blocking up to
+    `wait` seconds for one; each entry goes to one claimer. The claim is a lease of
+    `lease` seconds: keep it with memory.renew, end it with memory.complete. The sweeper
+    puts a task whose lease ran out back to pending.
+    """
+    if req.key:
+        rec, err = _cas(req.key, _claimer(req.claimer, lease=req.lease), also=_on_claim)
+        if rec and rec["data"]["status"] == "dead":
+            return {"ok": False, "error": "deadline_expired"}
+        return {"ok": True, **rec} if rec else {"ok": False, "error": err}
+    if not req.role:
+        return {"ok": False, "error": "key_or_role_required"}
+    got = _claim_next(req.role, req.claimer, 1, req.wait, req.lease)
+    return {"ok": True, **got[0]} if got else {"ok": False, "error": "no_pending"}
+
+@long_poll("/tools/memory.claim_batch")
+def memory_claim_batch(req: ClaimBatchReq):
+    """memory.claim for up to `n` tasks of `role` at once: one read of the stream and one
+    compare-and-set transaction per node. Empty results after `wait` means none queued."""
+    if req.n < 1:
+        return {"ok": False, "error": "bad_n"}
+    if req.n > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    return {"ok": True, "results": _claim_next(req.role, req.claimer, req.n, req.wait, req.lease)}
+
+@app.post("/tools/memory.renew")
+def memory_renew(req: RenewReq):
+    """Extend the leases `claimer` holds on `keys` to `lease` seconds from now. Per-key
+    results in input order; "not_owner" or "not_claimed" means the lease was lost (the
+    task was reaped and maybe claimed again) and the work should be abandoned. Only
+    the lease is written: no payload rewrite, index update or feed entry."""
+    if len(req.keys) > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    until = time.time() + (req.lease or TASK_LEASE)
+    res = _by_node(list(dict.fromkeys(req.keys)), lambda n, ks: _renew_node(n, ks, req.claimer, until))
+    held = [k for k in res if res[k] is None]
+    if held:
+        r.zadd(taskq.leases_key(NAMESPACE), {k: until for k in held})
+        _invalidate(held)
+    return {"ok": True, "results": [{"ok": True, "key": k, "lease_until": until} if res[k] is None
+                                    else {"ok": False, "key": k, "error": res[k]} for k in req.keys]}
+
+def _renew_node(n: int, keys: list[str], claimer: str, until: float, retries: int = 20) -> dict:
+    """Set the lease field of the records `claimer` holds on node n; the payload, indexes
+    and feed are left alone. WATCHed so a reap or completion in between is seen.
+    Returns {key: None or error}."""
+    for _ in range(retries):
+        out = {}
+        with raw_nodes[n].pipeline(transaction=True) as pipe:
+            try:
+                pipe.watch(*keys)
+                read = raw_nodes[n].pipeline(transaction=False)
+                for k in keys:
+                    read.hmget(k, "payload", "enc")
+                for k, (payload, enc) in zip(keys, read.execute()):
+                    data = codec.decode(payload, enc) if payload is not None else None
+                    out[k] = ("not_found" if data is None else "not_claimed" if data.get("status") != "claimed"
+                              else "not_owner" if data.get("claimed_by") != claimer else None)
+                held = [k for k in keys if out[k] is None]
+                if not held:
+                    return out
+                pipe.multi()
+                for k in held:
+                    pipe.hset(k, "lease_until", str(until))
+                pipe.execute()
+            except redis.WatchError:
+                continue
+        return out
+    return {k: "contended" for k in keys}
+
+def _completer(results: dict, claimers: dict | None = None):
+    def update(key, data):
+        claimer = (claimers or {}).get(key)
+        if claimer is not None and (data.get("status") != "claimed" or data.get("claimed_by") != claimer):
+            return "not_owner"
+        return {**data, "status": "done", "result": results[key], "done_ts": time.time()}
+    return update
+
+def _ack(pipe, key, old, new):
+    if old.get("queue_entry") and old.get("assigned_to") is not None:
+        taskq.queue_ack(pipe, NAMESPACE, old, old["queue_entry"])
+    if old.get("deadline_ts") is not None:
+        pipe.zrem(taskq.deadlines_key(NAMESPACE), key)
+    if old.get("lease_until") is not None:
+        pipe.zrem(taskq.leases_key(NAMESPACE), key)
+
+@app.post("/tools/memory.complete")
+def memory_complete(req: CompleteReq):
+    """Mark a task done with `result` and ack its stream entry, in one transaction when
+    the task lives on the primary. With `claimer`, only while that worker holds the claim."""
+    rec, err = _cas(req.key, _completer({req.key: req.result}, {req.key: req.claimer}), also=_ack)
+    return {"ok": True, "key": req.key, "ts": rec["ts"]} if rec else {"ok": False, "error": err}
+
+@app.post("/tools/memory.complete_batch")
+def memory_complete_batch(req: CompleteBatchReq):
+    """memory.complete for many tasks: one transaction per node. Per-item results in
+    input order; a missing task is {"ok": false, "error": "not_found"}."""
+    if len(req.items) > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    res = _cas_many([it.key for it in req.items], _completer({it.key: it.result for it in req.items},
+                                                             {it.key: it.claimer for it in req.items}), also=_ack)
+    return {"ok": True, "results": [{"ok": True, "key": it.key, "ts": res[it.key][0]["ts"]} if res[it.key][0]
+                                    else {"ok": False, "key": it.key, "error": res[it.key][1]} for it in req.items]}
+
+@app.post("/tools/memory.reindex")
+def memory_reindex(req: ReindexReq):
+    """Backfill field indexes (and postings, with MCP_FTS=1) for older records. Page with
+    `cursor` and `shard` as returned; cursor null means every node is done."""
+    if not 0 <= req.shard < len(nodes):
+        return {"ok": False, "error": "bad_shard", "shards": len(nodes)}
+    c, cb = nodes[req.shard], raw_nodes[req.shard]
+    keys = c.zrange(f"{NAMESPACE}:index", req.cursor, req.cursor + req.count - 1, withscores=True)
+    pipe = cb.pipeline(transaction=False)
+    for k, _ in keys:
+        pipe.hmget(k, "payload", "enc", "idx", "terms")
+    rows = pipe.execute()
+    pipe = c.pipeline(transaction=False)
+    for (k, ts), (payload, enc, raw_idx, raw_terms) in zip(keys, rows):
+        if payload is None:
+            continue
+        data = codec.decode(payload, enc)
+        new_idx = index_values(data)
+        pipe.hset(k, "idx", json.dumps(new_idx))
+        queue_index_update(pipe, NAMESPACE, k, parse_idx(raw_idx), new_idx, ts)
+        if FTS_ENABLED:
+            new_terms = fts.term_counts(data)
+            pipe.hset(k, "terms", json.dumps(new_terms))
+            fts.queue_postings(pipe, NAMESPACE, k, fts.parse_terms(raw_terms), new_terms, ts)
+    pipe.execute()
+    shard, nxt = req.shard, req.cursor + len(keys)
+    if len(keys) < req.count:
+        shard, nxt = shard + 1, 0
+        if shard == len(nodes):
+            shard, nxt = req.shard, None
+    return {"ok": True, "processed": len(keys), "cursor": nxt, "shard": shard}
+
+_tool_paths.update(route.path for route in app.routes)
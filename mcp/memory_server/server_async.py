@@ -0,0 +1,356 @@
+# mcp/memory_server/server_async.py
+"""
+Async variant of the MCP memory server (run: uvicorn server_async:app).
+
+The hot-path tools (write, write_batch, read, read_many, search) are async handlers on
+redis.asyncio clients backed by bounded, blocking connection pools (one pair per
+shard node), so a request waiting on Redis no longer pins a threadpool worker. So are
+the long-polls (query with wait, watch, claim and claim_batch): a waiter blocks on its
+own connection from a pool of MCP_MAX_WAITERS on the primary, and only the claim's
+compare-and-set pass runs on a thread. Every other tool is served by the sync
+implementation in server.py. Both share the same
+key layout, shard ring, index maintenance and read cache, so the two can run side by
+side on the same Redis nodes.
+"""
+import os, time, uuid, asyncio, threading
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+import redis.asyncio as aioredis
+
+import server
+import shards
+import metrics
+import dedupe
+from server import (
+    NAMESPACE, WRITE_BATCH_MAX, READ_MANY_MAX, SCAN_PAGE, SCAN_BUDGET, INDEX_FIELDS, WATCH_MAX_WAIT, BLOCK_SLICE,
+    WriteReq, WriteBatchReq, ReadReq, ReadManyReq, SearchReq, QueryReq, WatchReq, ClaimReq, ClaimBatchReq,
+    cache, invalidator, fts, taskq, parse_idx, index_key, matches, _queue_write, _decode, _hit, _dedupe_reqs,
+    _count_dedupe, _invalid,
+)
+
+POOL_SIZE = int(os.getenv("MCP_REDIS_POOL", "64"))  # per node
+POOL_TIMEOUT = float(os.getenv("MCP_REDIS_POOL_TIMEOUT", "5"))
+
+def _pool(url: str, size: int = POOL_SIZE, **kw):
+    return aioredis.BlockingConnectionPool.from_url(url, max_connections=size, timeout=POOL_TIMEOUT, **kw)
+
+pools = [_pool(u, decode_responses=True) for u in server.REDIS_URLS]
+raw_pools = [_pool(u) for u in server.REDIS_URLS]
+# blocking reads (XREAD BLOCK) of the long-polls, one connection per waiter under server._waiters
+wait_pool = _pool(server.REDIS_URLS[0], server.MAX_WAITERS, decode_responses=True)
+ars = [aioredis.Redis(connection_pool=p) for p in pools]
+waits = aioredis.Redis(connection_pool=wait_pool)
+arbs = [aioredis.Redis(connection_pool=p) for p in raw_pools]  # record hashes, payloads may be binary
+for _c in ars + arbs:
+    metrics.count_round_trips(_c)
+ring = server.ring
+
+@asynccontextmanager
+async def lifespan(app):
+    if cache.enabled:
+        threading.Thread(target=invalidator.listen, args=(server.r,), daemon=True).start()
+    if server.COMPACT_INTERVAL > 0:
+        threading.Thread(target=server._compact_loop, daemon=True).start()
+    if server.TASK_SWEEP_INTERVAL > 0:
+        threading.Thread(target=server._sweep_loop, daemon=True).start()
+    yield
+    for p in pools + raw_pools + [wait_pool]:
+        await p.disconnect()
+
+app = FastAPI(title="NovaOS MCP Memory Server (async)", lifespan=lifespan)
+_tool_paths = set()
+app.add_middleware(metrics.MetricsMiddleware, tools=_tool_paths)
+
+async def _by_node(keys: list[str], fn) -> dict:
+    parts = await asyncio.gather(*(fn(n, ks) for n, ks in ring.group(keys).items()))
+    out = {}
+    for part in parts:
+        out.update(part)
+    return out
+
+async def _old_indexes(keys: list[str]) -> dict:
+    async def node_old(n, ks):
+        pipe = ars[n].pipeline(transaction=False)
+        for k in ks:
+            pipe.hmget(k, "idx", "terms")
+        return {k: {"idx": parse_idx(i), "terms": fts.parse_terms(t)} for k, (i, t) in zip(ks, await pipe.execute())}
+    return await _by_node(keys, node_old)
+
+async def _write(items: list[tuple[str, dict]], existing: list[str], atomic: bool = False) -> None:
+    old = await _old_indexes(existing)
+    pipes = {0: ars[0].pipeline(transaction=atomic)}
+    for k, data in items:
+        n = ring.node(k)
+        if n not in pipes:
+            pipes[n] = ars[n].pipeline(transaction=atomic)
+        _queue_write(pipes[n], k, data, time.time(), old.get(k), feed=pipes[0])
+    await _commit(pipes, [k for k, _ in items])
+
+async def _commit(pipes: dict, keys: list[str]) -> None:
+    if cache.enabled:
+        pipes[0].publish(invalidator.channel, invalidator.message(keys))
+    await asyncio.gather(*(p.execute() for n, p in pipes.items() if n))  # records first, then feed and publish
+    await pipes[0].execute()
+    cache.invalidate(keys)
+
+async def _fetch(keys: list[str]) -> list[dict]:
+    found = await _fetch_map(keys)
+    return [found[k] for k in keys if k in found]
+
+async def _fetch_map(keys: list[str]) -> dict:
+    found, misses = {}, []
+    for k in keys:
+        rec = cache.get(k) if cache.enabled else None
+        if rec is None:
+            misses.append(k)
+        else:
+            found[k] = rec
+    if misses:
+        seq = cache.seq()
+        found.update(await _by_node(misses, lambda n, ks: _hgetall(n, ks, seq)))
+        if server.SHARD_FALLBACK and len(arbs) > 1:
+            for k in misses:
+                for n in range(len(arbs)):
+                    if k in found:
+                        break
+                    if n != ring.node(k):
+                        found.update(await _hgetall(n, [k], seq))
+    return found
+
+async def _hgetall(n: int, keys: list[str], seq: int) -> dict:
+    pipe = arbs[n].pipeline(transaction=False)
+    for k in keys:
+        pipe.hgetall(k)
+    out = {}
+    for k, h in zip(keys, await pipe.execute()):
+        if h:
+            out[k] = rec = _decode(k, h)
+            cache.put(k, rec, seq)
+    return out
+
+async def _reserve(reqs: list[tuple[str, str, float]]) -> dict:
+    if not reqs:
+        return {}
+    pipe = ars[0].pipeline(transaction=False)
+    dedupe.queue_reserve(pipe, NAMESPACE, reqs)
+    dup = dedupe.holders(await pipe.execute(), reqs)
+    _count_dedupe(reqs, dup)
+    return dup
+
+@app.post("/tools/memory.write")
+async def memory_write(req: WriteReq):
+    bad = _invalid([req])
+    if bad:
+        return bad
+    k = req.key or f"{NAMESPACE}:{uuid.uuid4().hex}"
+    reqs = _dedupe_reqs([k], [req])
+    dup = await _reserve(reqs)
+    if dup:
+        return {"ok": True, "key": dup[k], "duplicate": True}
+    try:
+        await _write([(k, req.data)], [k] if req.key else [])
+    except Exception:
+        if reqs:
+            await ars[0].delete(dedupe.dedupe_key(NAMESPACE, req.dedupe_key))
+        raise
+    if server.taskq.blocked(req.data):
+        await asyncio.to_thread(server._unblock, [k])
+    return {"ok": True, "key": k}
+
+@app.post("/tools/memory.write_batch")
+async def memory_write_batch(req: WriteBatchReq):
+    if len(req.records) > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    bad = _invalid(req.records)
+    if bad:
+        return bad
+    keys = [rec.key or f"{NAMESPACE}:{uuid.uuid4().hex}" for rec in req.records]
+    reqs = _dedupe_reqs(keys, req.records)
+    dup = await _reserve(reqs)
+    try:
+        await _write([(k, rec.data) for k, rec in zip(keys, req.records) if k not in dup],
+                     [rec.key for rec in req.records if rec.key and rec.key not in dup], atomic=req.atomic)
+    except Exception:
+        won = [dedupe.dedupe_key(NAMESPACE, dk) for k, dk, _ in reqs if k not in dup]
+        if won:
+            await ars[0].delete(*won)
+        raise
+    blocked = [k for k, rec in zip(keys, req.records) if k not in dup and server.taskq.blocked(rec.data)]
+    if blocked:
+        await asyncio.to_thread(server._unblock, blocked)
+    return {"ok": True, "keys": [dup.get(k, k) for k in keys], "duplicates": [i for i, k in enumerate(keys) if k in dup]}
+
+@app.post("/tools/memory.read")
+async def memory_read(req: ReadReq):
+    recs = await _fetch([req.key])
+    if not recs:
+        return {"ok": False, "error": "not_found"}
+    return {"ok": True, "data": recs[0]["data"], "ts": recs[0]["ts"]}
+
+@app.post("/tools/memory.read_many")
+async def memory_read_many(req: ReadManyReq):
+    if len(req.keys) > READ_MANY_MAX:
+        return {"ok": False, "error": "too_many_keys", "max": READ_MANY_MAX}
+    found = await _fetch_map(req.keys)
+    return {"ok": True, "results": [found.get(k) for k in req.keys]}
+
+@app.post("/tools/memory.search")
+async def memory_search(req: SearchReq):
+    q = req.q.lower()
+    if not req.scan:
+        parts = await asyncio.gather(*(c.zrevrange(f"{NAMESPACE}:index", 0, req.limit-1, withscores=True) for c in ars))
+        entries = shards.merge(parts, req.limit)
+        results = [rec for rec in await _fetch([k for k, _ in entries]) if _hit(rec, q)]
+        metrics.searched("newest", len(entries), len(results))
+        return {"ok": True, "results": results}
+
+    budget = min(req.budget or SCAN_BUDGET, SCAN_BUDGET)
+    positions = shards.parse_cursor(req.cursor, len(ars))
+    if positions is None:
+        return {"ok": False, "error": "stale_cursor"}
+    out, scanned = [], 0
+    while len(out) < req.limit and scanned < budget and any(positions):
+        n = min(SCAN_PAGE, budget - scanned)
+        live = [i for i, pos in enumerate(positions) if pos]
+        pages = dict(zip(live, await asyncio.gather(*(ars[i].zrevrangebyscore(
+            f"{NAMESPACE}:index", positions[i][0], "-inf", start=positions[i][1], num=n, withscores=True) for i in live))))
+        entries = shards.scan_order(pages, n)
+        recs = await _fetch_map([k for _, k, _ in entries])
+        taken = dict.fromkeys(live, 0)
+        for i, k, score in entries:
+            shards.advance(positions[i], score)
+            taken[i] += 1
+            scanned += 1
+            rec = recs.get(k)
+            if rec and _hit(rec, q):
+                out.append(rec)
+            if len(out) >= req.limit or scanned >= budget:
+                break
+        for i in live:
+            if len(pages[i]) < n and taken[i] == len(pages[i]):
+                positions[i] = None
+    metrics.searched("scan", scanned, len(out))
+    return {"ok": True, "results": out, "cursor": shards.format_cursor(positions), "scanned": scanned}
+
+@asynccontextmanager
+async def _waiter(req):
+    """server.long_poll for async routes: a request that may wait holds one of the
+    MCP_MAX_WAITERS slots (so one wait_pool connection); time queued comes off its wait."""
+    if req.wait <= 0:
+        yield
+        return
+    queued = time.monotonic()
+    async with server._waiters:
+        req.wait = max(0.0, req.wait - (time.monotonic() - queued))
+        yield
+
+async def _feed_offset() -> str:
+    last = await ars[0].xrevrange(f"{NAMESPACE}:feed", count=1)
+    return last[0][0] if last else "0-0"
+
+async def _wait_feed(where: dict, after: str, deadline: float, limit: int = 100) -> tuple[list, str]:
+    feed = f"{NAMESPACE}:feed"
+    hits = []
+    while not hits:
+        block = int(min(deadline - time.monotonic(), BLOCK_SLICE) * 1000)
+        if block <= 0:
+            break
+        resp = await waits.xread({feed: after}, count=limit, block=block)
+        if not resp:
+            continue
+        for entry_id, fields in resp[0][1]:
+            after = entry_id
+            if matches(parse_idx(fields.get("idx")), where):
+                hits.append((entry_id, fields["key"]))
+    return hits, after
+
+async def _query_node(n: int, zkeys: list[str], desc: bool, limit: int) -> list:
+    c = ars[n]
+    if len(zkeys) == 1:
+        return await (c.zrevrange if desc else c.zrange)(zkeys[0], 0, limit-1, withscores=True)
+    tmp = f"{NAMESPACE}:tmp:{uuid.uuid4().hex}"
+    pipe = c.pipeline(transaction=True)
+    pipe.zinterstore(tmp, zkeys, aggregate="MAX")
+    (pipe.zrevrange if desc else pipe.zrange)(tmp, 0, limit-1, withscores=True)
+    pipe.delete(tmp)
+    return (await pipe.execute())[1]
+
+@app.post("/tools/memory.query")
+async def memory_query(req: QueryReq):
+    bad = [f for f in req.where if f not in INDEX_FIELDS]
+    if bad or not req.where:
+        return {"ok": False, "error": "unindexed_field", "fields": bad, "indexed": list(INDEX_FIELDS)}
+    zkeys = [index_key(NAMESPACE, f, v) for f, v in req.where.items()]
+    desc = req.order != "asc"
+    async with _waiter(req):
+        after = await _feed_offset() if req.wait > 0 else None
+        deadline = time.monotonic() + min(req.wait, WATCH_MAX_WAIT)
+        while True:
+            parts = await asyncio.gather(*(_query_node(n, zkeys, desc, req.limit) for n in range(len(ars))))
+            entries = shards.merge(parts, req.limit, desc)
+            results = [rec for rec in await _fetch([k for k, _ in entries]) if matches(rec["data"], req.where)]
+            metrics.searched("query", len(entries), len(results))
+            if results or after is None:
+                break
+            hits, after = await _wait_feed(req.where, after, deadline)
+            if not hits:
+                break
+    return {"ok": True, "results": results}
+
+@app.post("/tools/memory.watch")
+async def memory_watch(req: WatchReq):
+    bad = [f for f in req.where if f not in INDEX_FIELDS]
+    if bad:
+        return {"ok": False, "error": "unindexed_field", "fields": bad, "indexed": list(INDEX_FIELDS)}
+    async with _waiter(req):
+        after = await _feed_offset() if req.after == "$" else req.after
+        hits, after = await _wait_feed(req.where, after, time.monotonic() + min(req.wait, WATCH_MAX_WAIT), req.limit)
+    found = await _fetch_map([k for _, k in hits])
+    results = [{**found[k], "offset": eid} for eid, k in hits if k in found]
+    return {"ok": True, "results": results, "offset": after}
+
+async def _marks(role: str) -> dict:
+    streams = [taskq.stream_key(NAMESPACE, role, p) for p in server.TASK_PRIORITIES]
+    pipe = ars[0].pipeline(transaction=False)
+    for st in streams:
+        pipe.xrevrange(st, count=1)
+    return {st: last[0][0] if last else "0-0" for st, last in zip(streams, await pipe.execute())}
+
+async def _claim_next(role: str, claimer: str, n: int, wait: float, lease: float | None) -> list:
+    """server._claim_next with the wait on the event loop; each claim pass (stream reads
+    and the compare-and-set transactions) runs on a thread."""
+    deadline = time.monotonic() + min(wait, WATCH_MAX_WAIT)
+    marks = await _marks(role) if wait > 0 else None
+    got = await asyncio.to_thread(server._claim_pass, role, claimer, n, lease)
+    while not got:
+        block = int(min(deadline - time.monotonic(), BLOCK_SLICE) * 1000)
+        if block <= 0:
+            break
+        if await waits.xread(marks, count=1, block=block):
+            marks = await _marks(role)
+            got = await asyncio.to_thread(server._claim_pass, role, claimer, n, lease)
+    return got
+
+@app.post("/tools/memory.claim")
+async def memory_claim(req: ClaimReq):
+    if req.key or not req.role:
+        return await asyncio.to_thread(server.memory_claim, req)
+    async with _waiter(req):
+        got = await _claim_next(req.role, req.claimer, 1, req.wait, req.lease)
+    return {"ok": True, **got[0]} if got else {"ok": False, "error": "no_pending"}
+
+@app.post("/tools/memory.claim_batch")
+async def memory_claim_batch(req: ClaimBatchReq):
+    if req.n < 1:
+        return {"ok": False, "error": "bad_n"}
+    if req.n > WRITE_BATCH_MAX:
+        return {"ok": False, "error": "batch_too_large", "max": WRITE_BATCH_MAX}
+    async with _waiter(req):
+        got = await _claim_next(req.role, req.claimer, req.n, req.wait, req.lease)
+    return {"ok": True, "results": got}
+
+# Everything not overridden above (health, fts, reindex, renew, complete, stats, ...)
+# is served by the sync routes.
+_overridden = {route.path for route in app.routes}
+app.router.routes.extend(route for route in server.app.routes if route.path not in _overridden)
+_tool_paths.update(route.path for route in app.routes)
@@ -0,0 +1,125 @@
+# mcp/memory_server/shards.py
+"""
+Consistent-hash placement of memory records across several Redis nodes.
+
+REDIS_URLS lists the nodes (comma separated). Each record key lives on the node
+the ring maps it to, and that node also holds the record's recency-index entry,
+field-index memberships and postings, so every write pipeline and every index
+intersection stays on one node. Reads of many keys are grouped per node;
+searches and queries run on every node and are merged by score (write ts).
+
+The first node is the primary: it also carries the change feed, the cache
+invalidation channel, the task queues and the compactor lock. Adding a node
+re-homes roughly 1/N of the keys; scripts/memory_rebalance.py moves them.
+
+Every write therefore costs the primary its feed entry (and invalidation, and
+queue updates for tasks) on top of the records it owns: one feed stream is what
+lets watchers wait on a single XREAD, but it makes the primary the write ceiling
+as shards are added. benchmarks/bench_feed.py measures that share per write and
+the rate at which the primary saturates for a given number of nodes. The record
+pipelines run before the primary's, so the feed never announces a write that has
+not landed.
+"""
+import bisect, hashlib
+
+VNODES = 160
+
+def _hash(s: str) -> int:
+    return int.from_bytes(hashlib.md5(s.encode("utf-8")).digest()[:8], "big")
+
+class HashRing:
+    """Maps keys to an index into `nodes`; node ids are usually the Redis URLs."""
+
+    def __init__(self, nodes: list[str], vnodes: int = VNODES):
+        if not nodes:
+            raise ValueError("hash ring needs at least one node")
+        if len(set(nodes)) != len(nodes):
+            raise ValueError(f"duplicate shard nodes: {nodes}")
+        self.nodes = list(nodes)
+        points = sorted((_hash(f"{node}#{i}"), n) for n, node in enumerate(self.nodes) for i in range(vnodes))
+        self._points = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def node(self, key: str) -> int:
+        if len(self.nodes) == 1:
+            return 0
+        i = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[i]
+
+    def group(self, keys) -> dict:
+        """{node index: [keys]} preserving the order of `keys` within each node."""
+        out = {}
+        for k in keys:
+            out.setdefault(self.node(k), []).append(k)
+        return out
+
+def parse_urls(raw: str | None, default: str) -> list[str]:
+    urls = [u.strip() for u in (raw or "").split(",") if u.strip()]
+    return urls or [default]
+
+def merge(parts, limit: int, desc: bool = True) -> list:
+    """Merge per-node [(key, score)] lists into the global top `limit`, dropping duplicate
+    keys (a key can briefly sit on two nodes while a rebalance moves it)."""
+    seen, out = set(), []
+    for k, score in sorted((e for part in parts for e in part), key=lambda e: e[1], reverse=desc):
+        if k not in seen:
+            seen.add(k)
+            out.append((k, score))
+            if len(out) >= limit:
+                break
+    return out
+
+# -- scan cursors -------------------------------------------------------------
+# A scan cursor holds one "<score>:<skip>" position per node joined by "|", with
+# "-" for a node that is exhausted. With one node it is the plain "<score>:<skip>".
+
+def parse_cursor(cursor: str | None, n: int) -> list | None:
+    """Per-node [score, skip] positions (None = exhausted), or None if the cursor does not
+    fit `n` nodes or is not one of ours."""
+    if not cursor:
+        return [["+inf", 0] for _ in range(n)]
+    parts = cursor.split("|")
+    if len(parts) != n:
+        return None
+    out = []
+    for part in parts:
+        if part == "-":
+            out.append(None)
+            continue
+        try:
+            score, skip = part.rsplit(":", 1)
+            score, skip = float(score), int(skip)
+        except ValueError:  # also a part without ":"
+            return None
+        if score != score or skip < 0:  # NaN, or a negative offset
+            return None
+        out.append([score, skip])
+    return out
+
+def format_cursor(positions: list) -> str | None:
+    if all(p is None for p in positions):
+        return None
+    return "|".join("-" if p is None else f"{p[0]!r}:{p[1]}" for p in positions)
+
+def scan_order(pages: dict, n: int) -> list:
+    """
+    Merge one newest-first page per node into global newest-first (node, key, score)
+    entries. A node whose page came back full may hold more entries just below its last
+    score, so nothing older than the highest such last score is released yet; those
+    entries are fetched again on the next page.
+    """
+    full = [page[-1][1] for page in pages.values() if len(page) >= n]
+    floor = max(full) if full else float("-inf")
+    out = [(node, k, score) for node, page in pages.items() for k, score in page if score >= floor]
+    out.sort(key=lambda e: e[2], reverse=True)
+    return out
+
+def advance(pos: list, score: float) -> None:
+    """Move a node's [score, skip] position past one consumed entry."""
+    if score == pos[0]:
+        pos[1] += 1
+    else:
+        pos[0], pos[1] = score, 1
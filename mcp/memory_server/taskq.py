@@ -0,0 +1,227 @@
+# mcp/memory_server/taskq.py
+"""
+Per-role task queues on Redis Streams, one stream per priority lane.
+
+A write that makes a task record pending (type "task", status "pending") adds an
+entry {key} to its lane's stream on the primary node:
+
+    <namespace>:tasks:<assigned_to>              the default lane ("normal")
+    <namespace>:tasks:<assigned_to>:<priority>   every other lane
+
+The lane is the task's "priority" field when it names one of the configured
+priorities, otherwise the default. Executors read a role's lanes most urgent
+first through the consumer group GROUP with XREADGROUP, so each entry is
+delivered to one consumer, and it stays in the group's pending entries list
+until the task is completed and the entry acked (XACK).
+
+The task record stays the source of truth. An entry whose task is no longer
+pending (claimed by key, completed, dead-lettered, deleted) is acked and skipped
+by the reader.
+
+A claim is a lease: the record gets "lease_until" and the zset
+<namespace>:task_leases holds key -> lease_until. The holder renews it while it
+works. A task whose lease runs out is put back to pending with "attempts" + 1,
+which queues a fresh entry and acks the old one, or dead-lettered once it has
+used up its attempts: delivery is at-least-once.
+
+A task with parents is written "blocked" with "waiting_on" = the parents' keys, and
+added to the set <namespace>:task_children:<parent> of each. When a task settles
+(done or dead), the server releases its children: each drops the parents now done
+from "waiting_on" and becomes pending (so it is queued) once none are left, or goes
+dead ("parent_dead") if a parent died.
+
+Queue depth per role is kept as counters in the hash <namespace>:task_depth, field
+"<assigned_to>|<status>" for the DEPTH_STATUSES, moved by every write from the old
+index values to the new; completions are counted per minute in the hash
+<namespace>:task_drain:<assigned_to> (field: epoch minute), for the drain rate.
+
+Tasks with a "deadline_ts" are also in the zset <namespace>:task_deadlines; one
+still pending at its deadline is dead-lettered (status "dead", reason in
+"dead_reason") into <namespace>:dlq:<assigned_to>, a zset scored by when.
+
+Like indexes.py, writers only queue commands on a pipeline.
+"""
+import math, threading
+import redis
+from indexes import _norm
+
+GROUP = "executors"
+DEPTH_STATUSES = ("pending", "claimed", "blocked")
+DRAIN_TTL = 7200  # seconds of per-minute completion counts kept
+PRIORITIES = ("urgent", "high", "normal", "low")  # most urgent first
+DEFAULT_PRIORITY = "normal"
+
+_groups = set()      # streams this process has already created the group for
+_groups_lock = threading.Lock()
+
+def forget_groups() -> None:
+    """Drop the created-group cache: the streams may be gone (flushed, or another server bound)."""
+    with _groups_lock:
+        _groups.clear()
+
+def configure(priorities: tuple, default: str) -> None:
+    global PRIORITIES, DEFAULT_PRIORITY
+    PRIORITIES, DEFAULT_PRIORITY = tuple(priorities), default if default in priorities else priorities[0]
+
+def priority_of(data: dict) -> str:
+    p = data.get("priority")
+    return p if p in PRIORITIES else DEFAULT_PRIORITY
+
+def stream_key(namespace: str, role, priority: str = DEFAULT_PRIORITY) -> str:
+    if priority == DEFAULT_PRIORITY:
+        return f"{namespace}:tasks:{_norm(role)}"
+    return f"{namespace}:tasks:{_norm(role)}:{priority}"
+
+def deadlines_key(namespace: str) -> str:
+    return f"{namespace}:task_deadlines"
+
+def leases_key(namespace: str) -> str:
+    return f"{namespace}:task_leases"
+
+def children_key(namespace: str, parent: str) -> str:
+    return f"{namespace}:task_children:{parent}"
+
+def depth_key(namespace: str) -> str:
+    return f"{namespace}:task_depth"
+
+def depth_field(role, status: str) -> str:
+    return f"{_norm(role)}|{status}"
+
+def drain_key(namespace: str, role) -> str:
+    return f"{namespace}:task_drain:{_norm(role)}"
+
+def dlq_key(namespace: str, role) -> str:
+    return f"{namespace}:dlq:{_norm(role)}"
+
+def queued_role(data: dict, old_idx: dict):
+    """The role whose stream gets an entry for this write, or None. Only a write that
+    makes the task pending (new task, requeue, reassignment) enqueues it."""
+    if data.get("type") != "task" or data.get("status") != "pending" or data.get("assigned_to") is None:
+        return None
+    if old_idx.get("status") == "pending" and old_idx.get("assigned_to") == _norm(data["assigned_to"]):
+        return None  # already queued; this is an update of a waiting task
+    return data["assigned_to"]
+
+def bad_task(data: dict):
+    """The error for a task whose queue fields would not parse (so could not be queued or
+    swept), or None."""
+    if data.get("type") != "task":
+        return None
+    deadline = data.get("deadline_ts")
+    if deadline is not None:
+        try:
+            if isinstance(deadline, bool) or not math.isfinite(float(deadline)):
+                return "bad_deadline_ts"
+        except (TypeError, ValueError):
+            return "bad_deadline_ts"
+    if data.get("priority") is not None and data["priority"] not in PRIORITIES:
+        return "bad_priority"
+    if not _parents_ok(data):
+        return "bad_waiting_on"
+    return None
+
+def _parents_ok(data: dict) -> bool:
+    # a list of task keys, and not empty while blocked: a string would be walked as parents
+    # "a", "b", "c", and a blocked task with none would never be released
+    waiting = data.get("waiting_on")
+    if waiting is None:
+        return data.get("status") != "blocked"
+    return isinstance(waiting, list) and all(isinstance(p, str) and p for p in waiting) \
+        and (bool(waiting) or data.get("status") != "blocked")
+
+def blocked(data: dict) -> bool:
+    return data.get("type") == "task" and data.get("status") == "blocked" and bool(data.get("waiting_on"))
+
+def settled(old: dict, new: dict) -> bool:
+    """Whether this write just finished a task, so its children may be released."""
+    return new.get("type") == "task" and new.get("status") in ("done", "dead") and old.get("status") != new["status"]
+
+def queue_block(pipe, namespace: str, key: str, data: dict) -> None:
+    for parent in data["waiting_on"]:
+        pipe.sadd(children_key(namespace, parent), key)
+
+def _depth_of(idx: dict):
+    if idx.get("type") == "task" and idx.get("status") in DEPTH_STATUSES and idx.get("assigned_to") is not None:
+        return depth_field(idx["assigned_to"], idx["status"])
+    return None
+
+def queue_depth_update(pipe, namespace: str, old_idx: dict, new_idx: dict, ts: float) -> None:
+    """Move the write's task from its old depth counter to its new one; count a completion."""
+    old, new = _depth_of(old_idx), _depth_of(new_idx)
+    if old != new:
+        if old:
+            pipe.hincrby(depth_key(namespace), old, -1)
+        if new:
+            pipe.hincrby(depth_key(namespace), new, 1)
+    if new_idx.get("type") == "task" and new_idx.get("status") == "done" and old_idx.get("status") != "done" \
+            and new_idx.get("assigned_to") is not None:
+        pipe.hincrby(drain_key(namespace, new_idx["assigned_to"]), int(ts // 60), 1)
+        pipe.expire(drain_key(namespace, new_idx["assigned_to"]), DRAIN_TTL)
+
+def queue_enqueue(pipe, namespace: str, key: str, data: dict, maxlen: int) -> None:
+    pipe.xadd(stream_key(namespace, data["assigned_to"], priority_of(data)), {"key": key},
+              maxlen=maxlen, approximate=True)
+    if data.get("deadline_ts") is not None:
+        pipe.zadd(deadlines_key(namespace), {key: float(data["deadline_ts"])})
+
+def queue_ack(pipe, namespace: str, data: dict, entry_id: str) -> None:
+    pipe.xack(stream_key(namespace, data["assigned_to"], priority_of(data)), GROUP, entry_id)
+
+def queue_dead(pipe, namespace: str, key: str, data: dict, ts: float) -> None:
+    pipe.zadd(dlq_key(namespace, data["assigned_to"]), {key: ts})
+
+def expired(data: dict, now: float) -> bool:
+    return data.get("deadline_ts") is not None and float(data["deadline_ts"]) <= now
+
+def _ensure_group(client, stream: str) -> None:
+    if stream in _groups:
+        return
+    with _groups_lock:  # one XGROUP CREATE per stream per process, not one per concurrent request
+        if stream in _groups:
+            return
+        try:
+            # from id 0 so tasks queued before the first executor connected are delivered too
+            client.xgroup_create(stream, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        _groups.add(stream)
+
+def _retry_nogroup(client, streams: list[str], fn):
+    for s in streams:
+        _ensure_group(client, s)
+    try:
+        return fn()
+    except redis.ResponseError as e:
+        # NOGROUP, or "requires the key to exist" from some servers when the stream is gone
+        if "NOGROUP" not in str(e) and "requires the key to exist" not in str(e):
+            raise
+        for s in streams:  # a stream was deleted since; recreate it
+            _groups.discard(s)
+            _ensure_group(client, s)
+        return fn()
+
+def read(client, namespace: str, role, priority: str, consumer: str, count: int = 1) -> list[tuple[str, str, str]]:
+    """[(entry id, task key, priority)] never delivered before from one lane, now owned by
+    `consumer`: at most `count`. One lane per call, since XREADGROUP over several
+    streams returns up to `count` from each."""
+    stream = stream_key(namespace, role, priority)
+    resp = _retry_nogroup(client, [stream], lambda: client.xreadgroup(GROUP, consumer, {stream: ">"}, count=count))
+    return [(eid, fields["key"], priority) for _, entries in (resp or []) for eid, fields in entries]
+
+def marks(client, namespace: str, role, priorities) -> dict:
+    """{stream: newest entry id} of a role's lanes ("0-0" when empty), for wait()."""
+    streams = [stream_key(namespace, role, p) for p in priorities]
+    pipe = client.pipeline(transaction=False)
+    for s in streams:
+        pipe.xrevrange(s, count=1)
+    return {s: last[0][0] if last else "0-0" for s, last in zip(streams, pipe.execute())}
+
+def wait(client, marks: dict, block_ms: int) -> bool:
+    """Block up to `block_ms` for an entry newer than `marks` in any lane. Reads with
+    XREAD, outside the group, so nothing is delivered: the caller claims afterwards."""
+    return bool(client.xread(marks, count=1, block=block_ms))
+
+def entry_ts(entry_id: str) -> float:
+    """When a stream entry was added (its id's millisecond part)."""
+    return int(entry_id.split("-", 1)[0]) / 1000
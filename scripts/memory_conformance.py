@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+"""
+Conformance checks for the agent memory backends (agents/_lib/memory_backend.py).
+
+Runs the same write/read/search/query/watch/claim checks through agents._lib.memory
+against each backend and reports PASS/FAIL per check:
+
+    python scripts/memory_conformance.py                      # embedded, plus redis/http if configured
+    REDIS_URL=redis://localhost:6379 python scripts/memory_conformance.py --backend redis
+    MCP_MEMORY_URL=http://localhost:8000 python scripts/memory_conformance.py --backend http
+
+Every check tags its records with a fresh id, so it can run against a live store.
+"""
+import os, sys, time, uuid, argparse, traceback
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from agents._lib import memory_backend
+from agents._lib import memory as m
+
+CHECKS = []
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+def _eq(got, want, what):
+    if got != want:
+        raise AssertionError(f"{what}: got {got!r}, want {want!r}")
+
+@check
+def write_read(tag):
+    key = m.mem_write({"type": "event", "agent": tag, "n": 1})
+    rec = m.mem_read(key)
+    _eq(rec["data"], {"type": "event", "agent": tag, "n": 1}, "read data")
+    _eq(isinstance(rec["ts"], float), True, "ts is a float")
+    _eq(m.mem_read(f"{tag}:missing"), None, "missing key")
+    _eq(m.mem_write({"v": 1}, key=f"{tag}:fixed"), f"{tag}:fixed", "explicit key")
+
+@check
+def overwrite_moves_indexes(tag):
+    key = f"{tag}:task"
+    m.mem_write({"type": "task", "status": "pending", "assigned_to": tag}, key=key)
+    m.mem_write({"type": "task", "status": "done", "assigned_to": tag}, key=key)
+    _eq([r["key"] for r in m.mem_query({"assigned_to": tag, "status": "pending"})], [], "stale status")
+    _eq([r["key"] for r in m.mem_query({"assigned_to": tag, "status": "done"})], [key], "new status")
+
+@check
+def batch_and_read_many(tag):
+    recs = [{"data": {"agent": tag, "i": i}} for i in range(5)] + [{"key": f"{tag}:b", "data": {"agent": tag, "i": 5}}]
+    keys = m.mem_write_batch(recs)
+    _eq(len(keys), 6, "key count")
+    _eq(keys[-1], f"{tag}:b", "explicit key kept")
+    got = m.mem_read_many([keys[2], f"{tag}:none", keys[0]], chunk=2)
+    _eq([g and g["data"]["i"] for g in got], [2, None, 0], "read_many order")
+
+@check
+def search_newest_first(tag):
+    for i in range(3):
+        m.mem_write({"agent": tag, "note": f"{tag} note {i}"})
+    got = m.mem_search(tag, limit=3)
+    _eq([r["data"]["note"][-1] for r in got], ["2", "1", "0"], "newest first")
+
+@check
+def scan_resumes(tag):
+    m.mem_write_batch([{"data": {"agent": tag, "i": i}} for i in range(25)])
+    seen, cursor = [], None
+    for _ in range(1000):
+        page, cursor = m.mem_scan(tag, limit=7, cursor=cursor, budget=50)
+        seen += page
+        if cursor is None or len(seen) >= 25:
+            break
+    _eq(sorted(r["data"]["i"] for r in seen), list(range(25)), "every record once")
+    ts = [r["ts"] for r in seen]
+    _eq(ts, sorted(ts, reverse=True), "scan order")
+    for bad in ("garbage", "1.5:x", "nan:0", "1.5:-3"):
+        res = memory_backend.get().call("memory.search", {"q": tag, "scan": True, "cursor": bad})
+        _eq(res.get("error"), "stale_cursor", f"cursor {bad!r} refused")
+
+@check
+def query_fields_and_order(tag):
+    for i in range(4):
+        m.mem_write({"type": "artifact" if i % 2 else "event", "agent": tag, "i": i})
+    desc = m.mem_query({"agent": tag, "type": "artifact"})
+    _eq([r["data"]["i"] for r in desc], [3, 1], "desc")
+    asc = m.mem_query({"agent": tag}, order="asc", limit=3)
+    _eq([r["data"]["i"] for r in asc], [0, 1, 2], "asc with limit")
+    try:
+        m.mem_query({"nope": 1})
+        raise AssertionError("unindexed field accepted")
+    except RuntimeError:
+        pass
+
+@check
+def watch_offsets(tag):
+    _, offset = next(m.mem_watch_batches({"agent": tag}, wait=0))
+    m.mem_write({"agent": tag, "i": 1})
+    m.mem_write({"agent": f"{tag}-other", "i": 2})
+    m.mem_write({"agent": tag, "i": 3})
+    got, offset = next(m.mem_watch_batches({"agent": tag}, after=offset, wait=2))
+    _eq([r["data"]["i"] for r in got], [1, 3], "matching writes in order")
+    got, _ = next(m.mem_watch_batches({"agent": tag}, after=offset, wait=0))
+    _eq(got, [], "nothing after the returned offset")
+
+@check
+def query_waits_for_match(tag):
+    import threading
+    _eq(m.find_pending_tasks(tag, wait=0.2), [], "empty after the wait")
+    threading.Timer(0.3, lambda: m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance")).start()
+    t0 = time.monotonic()
+    got = m.find_pending_tasks(tag, wait=5)
+    _eq(len(got), 1, "task enqueued during the wait")
+    _eq(time.monotonic() - t0 < 2, True, "woken by the enqueue, not the timeout")
+
+@check
+def claim_once(tag):
+    key = m.enqueue_task("noop", {"x": 1}, assigned_to=tag, created_by="conformance")
+    _eq([r["key"] for r in m.find_pending_tasks(tag)], [key], "pending")
+    claimed = m.claim_task(key, claimer="w1")
+    _eq((claimed or {}).get("claimed_by"), "w1", "first claim")
+    _eq(m.claim_task(key, claimer="w2"), None, "second claim")
+    m.complete_task(key, {"ok": True})
+    _eq(m.mem_read(key)["data"]["status"], "done", "completed")
+    _eq(m.find_pending_tasks(tag), [], "no longer pending")
+
+@check
+def claim_next_distinct(tag):
+    from concurrent.futures import ThreadPoolExecutor
+    keys = {m.enqueue_task("noop", {"i": i}, assigned_to=tag, created_by="conformance") for i in range(12)}
+    with ThreadPoolExecutor(6) as pool:
+        got = list(pool.map(lambda i: m.claim_next_task(tag, claimer=f"w{i}"), range(16)))
+    won = [g["key"] for g in got if g]
+    _eq(sorted(won), sorted(keys), "each task claimed exactly once")
+    _eq(sum(1 for g in got if g is None), 4, "extra claims get nothing")
+    _eq(all(g["data"]["status"] == "claimed" for g in got if g), True, "claimed status returned")
+
+@check
+def claim_waits_for_enqueue(tag):
+    import threading
+    threading.Timer(0.3, lambda: m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance")).start()
+    t0 = time.monotonic()
+    rec = m.claim_next_task(tag, claimer="w1", wait=5)
+    _eq(rec is not None and rec["data"]["assigned_to"], tag, "task enqueued during the wait")
+    _eq(time.monotonic() - t0 < 2, True, "woken by the enqueue, not the timeout")
+    m.complete_task(rec["key"], {"ok": True})
+    _eq(m.claim_next_task(tag, claimer="w2"), None, "completed task not redelivered")
+
+@check
+def batch_claim_complete(tag):
+    keys = [m.enqueue_task("noop", {"i": i}, assigned_to=tag, created_by="conformance") for i in range(25)]
+    got = [m.claim_tasks(tag, 10, claimer="w1") for _ in range(3)]
+    _eq([len(g) for g in got], [10, 10, 5], "batch sizes")
+    _eq([r["key"] for g in got for r in g], keys, "each once, oldest first")
+    _eq(all(r["data"]["claimed_by"] == "w1" for g in got for r in g), True, "claimed")
+    missing = m.complete_tasks([(k, {"i": i}) for i, k in enumerate(keys)] + [(f"{tag}:gone", {})])
+    _eq(missing, [f"{tag}:gone"], "missing keys reported")
+    _eq([r["data"]["status"] for r in m.mem_read_many(keys)], ["done"] * 25, "all done")
+    _eq(m.claim_tasks(tag, 10, claimer="w2"), [], "nothing left to claim")
+    claim = lambda n: memory_backend.get().call("memory.claim_batch", {"role": tag, "n": n, "claimer": "w1"}).get("error")
+    _eq((claim(0), claim(-1), claim(10 ** 9)), ("bad_n", "bad_n", "batch_too_large"), "n out of range")
+
+@check
+def priority_and_deadline(tag):
+    low = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", priority="low")
+    normal = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance")
+    late = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", priority="urgent",
+                          deadline_ts=time.time() - 1)
+    urgent = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", priority="urgent",
+                            deadline_ts=time.time() + 60)
+    _eq([r["key"] for r in m.claim_tasks(tag, 10, claimer="w1")], [urgent, normal, low], "urgent lane first")
+    dead = m.mem_read(late)["data"]
+    _eq((dead["status"], dead.get("dead_reason")), ("dead", "deadline_expired"), "expired task dead-lettered")
+    write = lambda data: memory_backend.get().call("memory.write", {"data": data})
+    task = {"type": "task", "status": "pending", "task_type": "noop", "assigned_to": tag}
+    _eq(write({**task, "deadline_ts": "soon"}).get("error"), "bad_deadline_ts", "unparseable deadline refused")
+    _eq(write({**task, "priority": "whenever"}).get("error"), "bad_priority", "unknown lane refused")
+    _eq(memory_backend.get().call("memory.write_batch", {"records": [{"data": task}, {"data": {**task, "deadline_ts": [1]}}]}),
+        {"ok": False, "error": "bad_deadline_ts", "index": 1}, "batch refused whole, naming the record")
+    _eq(m.claim_tasks(tag, 10, claimer="w1"), [], "nothing refused was queued")
+
+@check
+def lease_expiry_requeues(tag):
+    sweep = lambda: memory_backend.get().call("memory.sweep", {})
+    key = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance")
+    _eq(m.claim_next_task(tag, claimer="w1", lease=0.3)["key"], key, "claimed")
+    _eq(m.renew_lease(key, "w2"), False, "only the holder renews")
+    _eq(m.renew_lease(key, "w1", lease=0.3), True, "holder renews")
+    sweep()
+    _eq(m.claim_next_task(tag, claimer="w2"), None, "held while leased")
+    time.sleep(0.4)
+    sweep()
+    rec = m.claim_next_task(tag, claimer="w2", lease=0.2)
+    _eq((rec or {}).get("key"), key, "expired lease requeued")
+    _eq((rec["data"]["claimed_by"], rec["data"]["attempts"]), ("w2", 1), "new holder, attempt counted")
+    _eq(m.renew_lease(key, "w1"), False, "old holder lost it")
+    for _ in range(20):
+        time.sleep(0.3)
+        sweep()
+        if not m.claim_next_task(tag, claimer="w2", lease=0.2):
+            break
+    dead = m.mem_read(key)["data"]
+    _eq((dead["status"], dead.get("dead_reason")), ("dead", "max_attempts"), "dead-lettered after max attempts")
+
+@check
+def renew_and_complete_owner(tag):
+    key = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance")
+    until = m.claim_next_task(tag, claimer="w1", lease=0.3)["data"]["lease_until"]
+    _, offset = next(m.mem_watch_batches({"assigned_to": tag}, wait=0))
+    _eq(m.renew_lease(key, "w1", lease=60), True, "holder renews")
+    _eq(m.mem_read(key)["data"]["lease_until"] > until + 30, True, "renewed lease read back")
+    got, _ = next(m.mem_watch_batches({"assigned_to": tag}, after=offset, wait=0))
+    _eq(got, [], "no feed entry for a renewal")
+    time.sleep(0.4)
+    memory_backend.get().call("memory.sweep", {})
+    _eq(m.claim_next_task(tag, claimer="w2"), None, "renewed lease outlives the first")
+    _eq(m.complete_task(key, {}, claimer="w2"), False, "only the holder completes")
+    _eq(m.complete_tasks([(key, {})], claimer="w2"), [key], "batch: only the holder completes")
+    _eq(m.mem_read(key)["data"]["status"], "claimed", "still claimed")
+    _eq(m.complete_task(key, {"ok": True}, claimer="w1"), True, "holder completes")
+    _eq(m.mem_read(key)["data"]["status"], "done", "done")
+    _eq(m.claim_next_task(tag, claimer="w2"), None, "not redelivered")
+
+@check
+def dedupe_suppresses_repeats(tag):
+    first = m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", dedupe_key=f"{tag}:a")
+    _eq(m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", dedupe_key=f"{tag}:a"), None, "repeat")
+    _eq([r["key"] for r in m.find_pending_tasks(tag)], [first], "one task queued")
+    js = memory_backend.get().call("memory.write_batch", {"records": [
+        {"key": f"{tag}:1", "data": {"agent": tag}, "dedupe_key": f"{tag}:b"},
+        {"key": f"{tag}:2", "data": {"agent": tag}, "dedupe_key": f"{tag}:b"},
+        {"key": f"{tag}:3", "data": {"agent": tag}}]})
+    _eq((js["keys"], js["duplicates"]), ([f"{tag}:1", f"{tag}:1", f"{tag}:3"], [1]), "batch duplicates")
+    _eq(m.mem_read(f"{tag}:2"), None, "duplicate not written")
+    _eq(m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", dedupe_key=f"{tag}:c",
+                       dedupe_ttl=0.2) is not None, True, "new key")
+    time.sleep(0.3)
+    _eq(m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", dedupe_key=f"{tag}:c")
+        is not None, True, "queued again once the ttl ran out")
+
+@check
+def dag_release(tag):
+    enq = lambda **kw: m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", **kw)
+    a = enq(dag=tag)
+    b, c = enq(depends_on=[a]), enq(depends_on=[a])
+    d = enq(depends_on=[b, c])
+    _eq([r["key"] for r in m.find_pending_tasks(tag)], [a], "only the root is pending")
+    _eq(m.mem_read(d)["data"]["dag"], tag, "dag inherited")
+    m.complete_task(m.claim_next_task(tag, claimer="w1")["key"], {})
+    _eq(sorted(r["key"] for r in m.claim_tasks(tag, 10, claimer="w1")), sorted([b, c]), "fan-out released together")
+    m.complete_task(b, {})
+    _eq((m.mem_read(d)["data"]["status"], m.mem_read(d)["data"]["waiting_on"]), ("blocked", [c]), "join waits")
+    m.complete_task(c, {})
+    _eq([r["key"] for r in m.find_pending_tasks(tag)], [d], "join released")
+    m.complete_task(m.claim_next_task(tag, claimer="w1")["key"], {})
+    rep = m.dag_report(tag)
+    _eq((rep["tasks"], rep["status"], rep["critical_path"]), (4, {"done": 4}, [a, c, d]), "report")
+    task = {"type": "task", "status": "blocked", "task_type": "noop", "assigned_to": tag}
+    for bad in ("abc", [], [a, 3], None):
+        res = memory_backend.get().call("memory.write", {"data": {**task, "waiting_on": bad}})
+        _eq(res.get("error"), "bad_waiting_on", f"waiting_on {bad!r} refused")
+    _eq(m.mem_read(enq(depends_on=[a]))["data"]["status"], "pending", "parent already done")
+    e = enq(deadline_ts=time.time() - 1)
+    f = enq(depends_on=[e])
+    m.claim_tasks(tag, 10, claimer="w1")
+    _eq((m.mem_read(f)["data"]["status"], m.mem_read(f)["data"].get("dead_reason")), ("dead", "parent_dead"),
+        "dead parent")
+
+@check
+def queue_depth_backpressure(tag):
+    enq = lambda **kw: m.enqueue_task("noop", {}, assigned_to=tag, created_by="conformance", **kw)
+    a, b = enq(), enq()
+    enq(depends_on=[a])
+    m.complete_task(m.claim_next_task(tag, claimer="w1")["key"], {})
+    m.claim_next_task(tag, claimer="w1")
+    st = m.queue_stats([tag])[tag]
+    _eq((st["pending"], st["claimed"], st["blocked"], st["saturated"]), (1, 1, 0, False), "depth per status")
+    _eq(st["drain_per_min"] > 0, True, "completion counted")
+    high, low = st["high"], st["low"]
+    if high > 5000:
+        return  # watermarks set too high to fill here
+    task = {"type": "task", "status": "pending", "task_type": "noop", "assigned_to": tag, "created_by": "conformance"}
+    for i in range(0, high, 500):
+        m.mem_write_batch([{"data": {**task, "ts": time.time()}} for _ in range(min(500, high - i))])
+    _eq(m.queue_stats([tag])[tag]["saturated"], True, "saturated at the high watermark")
+    _eq(enq(on_full="shed"), None, "shed while saturated")
+    while m.queue_stats([tag])[tag]["pending"] > low + 1:
+        m.claim_tasks(tag, min(500, m.queue_stats([tag])[tag]["pending"] - low - 1), claimer="w1")
+    _eq(m.queue_stats([tag])[tag]["saturated"], True, "still saturated above the low watermark")
+    m.claim_next_task(tag, claimer="w1")
+    _eq(m.queue_stats([tag])[tag]["saturated"], False, "cleared at the low watermark")
+
+def _backend(name: str, args):
+    if name == "embedded":
+        return memory_backend.EmbeddedBackend(args.sqlite)
+    if name == "redis":
+        return memory_backend.RedisBackend()
+    return memory_backend.HttpBackend(os.getenv("MCP_MEMORY_URL"))
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--backend", action="append", choices=["embedded", "redis", "http"])
+    ap.add_argument("--sqlite", default=":memory:", help="embedded backend database")
+    args = ap.parse_args()
+    names = args.backend or (["embedded"] + (["redis"] if os.getenv("REDIS_URL") or os.getenv("REDIS_URLS") else [])
+                             + (["http"] if os.getenv("MCP_MEMORY_URL") else []))
+    failed = 0
+    for name in names:
+        memory_backend.use(_backend(name, args))
+        for fn in CHECKS:
+            tag = f"conf-{uuid.uuid4().hex[:8]}"
+            t0 = time.perf_counter()
+            try:
+                fn(tag)
+                status = "PASS"
+            except Exception as e:
+                failed += 1
+                status = f"FAIL {type(e).__name__}: {e}"
+                if not isinstance(e, AssertionError):
+                    traceback.print_exc()
+            print(f"{name:9} {fn.__name__:24} {(time.perf_counter() - t0) * 1000:7.1f}ms  {status}")
+    print(f"{failed} failed" if failed else "all passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Move memory records to the shard node the hash ring now assigns them to.
+
+After adding a node to REDIS_URLS, restart the memory servers with the new list
+and MCP_SHARD_FALLBACK=1 (so reads of records not moved yet still resolve), then:
+
+    REDIS_URLS=redis://a:6379,redis://b:6379,redis://c:6379 python scripts/memory_rebalance.py
+
+Every node's recency index is walked. Records owned by another node are copied
+there with their index entries and postings, then removed from the source. A
+record that already exists on its new node was rewritten after the switch, so
+only the stale source copy is dropped. Turn MCP_SHARD_FALLBACK off when done.
+
+    python scripts/memory_rebalance.py --selftest --nodes 3
+
+starts 4 local redis-server processes, writes records through the server on 3,
+adds the 4th, rebalances and checks that every record, query and scan survived.
+"""
+import os, sys, time, json, argparse, shutil, socket, subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, os.path.join(ROOT, "mcp", "memory_server"))
+
+def _copy(server, dst: int, keys: list[str], rows: list[dict]) -> tuple[int, int]:
+    """Copy raw record hashes to node `dst` unless it already has them. Returns (copied, newer)."""
+    import redis
+    from indexes import parse_idx, queue_index_update
+    import fts
+    ns = server.NAMESPACE
+    pipe = server.raw_nodes[dst].pipeline(transaction=True)
+    while True:
+        try:
+            pipe.watch(*keys)
+            exists = [pipe.exists(k) for k in keys]
+            pipe.multi()
+            copied = 0
+            for k, h, present in zip(keys, rows, exists):
+                if present or not h:
+                    continue
+                ts = float(h.get(b"ts", b"0"))
+                pipe.hset(k, mapping=h)
+                pipe.zadd(f"{ns}:index", {k: ts})
+                queue_index_update(pipe, ns, k, {}, parse_idx(h.get(b"idx")), ts)
+                fts.queue_postings(pipe, ns, k, {}, fts.parse_terms(h.get(b"terms")), ts)
+                copied += 1
+            pipe.execute()
+            return copied, sum(1 for x in exists if x)
+        except redis.WatchError:
+            continue  # a server wrote one of them meanwhile; re-check
+        finally:
+            pipe.reset()
+
+def rebalance(server, batch: int = 500, dry_run: bool = False) -> dict:
+    t0 = time.time()
+    report = {"scanned": 0, "moved": 0, "newer_on_target": 0, "dry_run": dry_run, "pairs": {}}
+    for src in range(len(server.nodes)):
+        c, cb = server.nodes[src], server.raw_nodes[src]
+        start = 0
+        while True:
+            page = c.zrange(f"{server.NAMESPACE}:index", start, start + batch - 1, withscores=True)
+            if not page:
+                break
+            report["scanned"] += len(page)
+            away = server.ring.group(k for k, _ in page if server.ring.node(k) != src)
+            moved = 0
+            for dst, keys in away.items():
+                pair = f"{src}->{dst}"
+                report["pairs"][pair] = report["pairs"].get(pair, 0) + len(keys)
+                moved += len(keys)
+                if dry_run:
+                    continue
+                pipe = cb.pipeline(transaction=False)
+                for k in keys:
+                    pipe.hgetall(k)
+                copied, newer = _copy(server, dst, keys, pipe.execute())
+                server.compactors[src].delete(keys)
+                report["moved"] += copied
+                report["newer_on_target"] += newer
+            # moved keys leave the source index, so the next page starts `moved` ranks earlier
+            start += len(page) - (0 if dry_run else moved)
+            if len(page) < batch:
+                break
+    report["seconds"] = round(time.time() - t0, 3)
+    return report
+
+# -- selftest -------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _spawn(binary: str, n: int) -> tuple[list, list[str]]:
+    procs, urls = [], []
+    for _ in range(n):
+        port = _free_port()
+        procs.append(subprocess.Popen([binary, "--port", str(port), "--save", "", "--appendonly", "no"],
+                                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        urls.append(f"redis://127.0.0.1:{port}/0")
+    import redis
+    for url in urls:
+        for _ in range(100):
+            try:
+                redis.from_url(url).ping()
+                break
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        else:
+            raise RuntimeError(f"{binary} did not come up at {url}")
+    return procs, urls
+
+def selftest(args) -> int:
+    binary = shutil.which(args.redis_server)
+    if not binary:
+        print(f"selftest needs {args.redis_server!r} on PATH", file=sys.stderr)
+        return 2
+    procs, urls = _spawn(binary, args.nodes + 1)
+    try:
+        os.environ.update(REDIS_URLS=",".join(urls[:-1]), MCP_CACHE_SIZE="0", MCP_COMPACT_INTERVAL="0")
+        import redis, server
+        from fastapi.testclient import TestClient
+        client = TestClient(server.app)
+        post = lambda path, body: client.post(f"/tools/{path}", json=body).json()
+
+        expected = {}
+        for start in range(0, args.records, 500):
+            recs = [{"data": {"type": ["event", "artifact", "task"][i % 3], "agent": f"A{i % 7}", "i": i}}
+                    for i in range(start, min(args.records, start + 500))]
+            for k, rec in zip(post("memory.write_batch", {"records": recs})["keys"], recs):
+                expected[k] = rec["data"]
+        wheres = [{"type": "artifact"}, {"type": "task", "agent": "A3"}, {"agent": "A5"}]
+        before = [sorted(x["key"] for x in post("memory.query", {"where": w, "limit": args.records})["results"])
+                  for w in wheres]
+
+        def bind(node_urls):
+            server.bind([redis.from_url(u, decode_responses=True) for u in node_urls],
+                        [redis.from_url(u) for u in node_urls], names=node_urls)
+
+        bind(urls)
+        server.SHARD_FALLBACK = True
+        readable = sum(1 for x in post("memory.read_many", {"keys": list(expected)[:500]})["results"] if x)
+        report = rebalance(server, batch=args.batch)
+        server.SHARD_FALLBACK = False
+
+        failures = []
+        if readable != min(500, len(expected)):
+            failures.append(f"only {readable} of the first 500 keys readable mid-rebalance with fallback")
+        keys = list(expected)
+        got = {}
+        for i in range(0, len(keys), 500):
+            for k, rec in zip(keys[i:i + 500], post("memory.read_many", {"keys": keys[i:i + 500]})["results"]):
+                if rec:
+                    got[k] = rec["data"]
+        if got != expected:
+            failures.append(f"{len(expected) - len(got)} records missing or changed after rebalance")
+        for k in keys:
+            owner = server.ring.node(k)
+            where = [n for n, c in enumerate(server.nodes) if c.exists(k)]
+            if where != [owner]:
+                failures.append(f"{k} on nodes {where}, owner {owner}")
+                break
+        sizes = [c.zcard(f"{server.NAMESPACE}:index") for c in server.nodes]
+        if sum(sizes) != len(expected):
+            failures.append(f"recency indexes hold {sum(sizes)} keys, expected {len(expected)}")
+        after = [sorted(x["key"] for x in post("memory.query", {"where": w, "limit": args.records})["results"])
+                 for w in wheres]
+        if after != before:
+            failures.append("query results changed across the rebalance")
+        seen, cursor = [], None
+        while True:
+            res = post("memory.search", {"q": "", "limit": 1000, "scan": True, "cursor": cursor})
+            seen += [x["key"] for x in res["results"]]
+            cursor = res["cursor"]
+            if not cursor:
+                break
+        if sorted(seen) != sorted(keys):
+            failures.append(f"scan returned {len(seen)} keys ({len(set(seen))} unique), expected {len(keys)}")
+
+        print(json.dumps({"nodes": f"{args.nodes} -> {args.nodes + 1}", "records": len(expected),
+                          "moved_fraction": round(report["moved"] / len(expected), 3),
+                          "ideal_fraction": round(1 / (args.nodes + 1), 3),
+                          "per_node": sizes, "rebalance": report}, indent=2))
+        for f in failures:
+            print(f"FAIL: {f}")
+        print("FAIL" if failures else "OK")
+        return 1 if failures else 0
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--selftest", action="store_true")
+    ap.add_argument("--nodes", type=int, default=3, help="selftest: nodes before the new one is added")
+    ap.add_argument("--records", type=int, default=5000, help="selftest: records to write")
+    ap.add_argument("--redis-server", default="redis-server", help="selftest: redis-server binary")
+    args = ap.parse_args()
+    if args.selftest:
+        sys.exit(selftest(args))
+    if not os.getenv("REDIS_URLS"):
+        sys.exit("set REDIS_URLS to the new node list (including the added node)")
+    import server
+    print(json.dumps(rebalance(server, batch=args.batch, dry_run=args.dry_run), indent=2))
+
+if __name__ == "__main__":
+    main()
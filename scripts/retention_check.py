@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Checks for memory retention (mcp/memory_server/retention.py): the compactor is
+opt-in, both server apps start it when configured, and a compaction pass deletes
+what its rules select (records and their index entries) and nothing else.
+
+Runs the server in-process against REDIS_URL / REDIS_URLS, or an in-memory fakeredis
+when neither is set, under a fresh namespace so a live store's records are never
+matched:
+
+    python scripts/retention_check.py
+    REDIS_URL=redis://localhost:6379 python scripts/retention_check.py
+"""
+import os, sys, json, time, uuid, threading, traceback
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+SERVER_DIR = os.path.join(ROOT, "mcp", "memory_server")
+if SERVER_DIR not in sys.path:
+    sys.path.insert(0, SERVER_DIR)
+
+RULES = [
+    {"name": "heartbeats", "match": {"topic": "heartbeat"}, "group_by": "agent", "keep_last": 2},
+    {"name": "events", "match": {"type": "event"}, "max_age": 1},
+]
+os.environ.update(MCP_NAMESPACE=f"retcheck-{uuid.uuid4().hex[:8]}", MCP_RETENTION=json.dumps(RULES),
+                  MCP_COMPACT_INTERVAL="3600", MCP_TASK_SWEEP_INTERVAL="0")
+
+import retention
+import server
+import server_async
+
+if not (os.getenv("REDIS_URL") or os.getenv("REDIS_URLS")):
+    import fakeredis
+    _fake = fakeredis.FakeServer()
+    server.bind(fakeredis.FakeRedis(server=_fake, decode_responses=True), fakeredis.FakeRedis(server=_fake))
+
+CHECKS = []
+
+def check(fn):
+    CHECKS.append(fn)
+    return fn
+
+def _eq(got, want, what):
+    if got != want:
+        raise AssertionError(f"{what}: got {got!r}, want {want!r}")
+
+def _write(data: dict) -> str:
+    return server.memory_write(server.WriteReq(data=data))["key"]
+
+def _exists(key: str) -> bool:
+    return server.memory_read(server.ReadReq(key=key))["ok"]
+
+@check
+def opt_in_settings():
+    _eq(retention.settings(None, None), ([], 0), "nothing set: no rules, no background pass")
+    _eq(retention.settings(None, "0"), ([], 0), "interval 0 alone")
+    _eq(retention.settings(None, "60"), (retention.DEFAULT_RULES, 60), "interval alone: default rules")
+    _eq(retention.settings(json.dumps(RULES), None), (RULES, retention.DEFAULT_INTERVAL), "rules alone")
+
+@check
+def both_apps_start_compactor():
+    from fastapi.testclient import TestClient
+    started = []
+    loop = server._compact_loop
+    server._compact_loop = lambda: started.append(threading.current_thread().name)
+    try:
+        for app in (server.app, server_async.app):
+            with TestClient(app):
+                pass
+    finally:
+        server._compact_loop = loop
+    _eq(len(started), 2, "compactor threads started (sync, async)")
+
+@check
+def compaction_pass():
+    tag = uuid.uuid4().hex[:8]
+    beats = [_write({"agent": tag, "topic": "heartbeat", "type": "beat", "n": i}) for i in range(5)]
+    old = [_write({"agent": tag, "topic": "note", "type": "event", "n": i}) for i in range(3)]
+    time.sleep(1.2)
+    fresh = _write({"agent": tag, "topic": "note", "type": "event", "n": 3})
+    # keep_last holds per shard: each node keeps its own newest 2
+    kept = [k for k in beats if [b for b in beats if server.ring.node(b) == server.ring.node(k)][-2:].count(k)]
+    dry = server.memory_compact(server.CompactReq(dry_run=True))["report"]
+    _eq({k: v["deleted"] for k, v in dry["rules"].items()}, {"heartbeats": 5 - len(kept), "events": 3},
+        "dry run counts")
+    _eq(all(_exists(k) for k in beats + old), True, "dry run deletes nothing")
+    rep = server.memory_compact(server.CompactReq())["report"]
+    _eq(rep["deleted"], 8 - len(kept), "deleted")
+    _eq([_exists(k) for k in beats], [k in kept for k in beats], "newest heartbeats kept")
+    _eq([_exists(k) for k in old + [fresh]], [False, False, False, True], "expired events deleted")
+    q = server.memory_query(server.QueryReq(where={"agent": tag}, limit=20))
+    _eq(sorted(x["key"] for x in q["results"]), sorted(kept + [fresh]), "index entries removed")
+    _eq(server.memory_compact(server.CompactReq())["report"]["deleted"], 0, "second pass is a no-op")
+
+def main():
+    failed = 0
+    for fn in CHECKS:
+        t0 = time.perf_counter()
+        try:
+            fn()
+            status = "PASS"
+        except Exception as e:
+            failed += 1
+            status = f"FAIL {type(e).__name__}: {e}"
+            if not isinstance(e, AssertionError):
+                traceback.print_exc()
+        print(f"{fn.__name__:28} {(time.perf_counter() - t0) * 1000:7.1f}ms  {status}")
+    print(f"{failed} failed" if failed else "all passed")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
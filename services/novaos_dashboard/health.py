@@ -1,6 +1,6 @@
-import os, json, time
+import os, time
 from fastapi import FastAPI
-from urllib.request import Request, urlopen
+from agents._lib import transport
 
 app = FastAPI()
 
@@ -10,10 +10,12 @@ def health():
 
 def post_mem(payload: dict) -> dict:
     mem_url = os.environ.get("NOVA_MEM_URL", "https://novaosmem.onrender.com").rstrip("/")
-    body = json.dumps({"data": payload}).encode("utf-8")
-    req = Request(f"{mem_url}/tools/memory.write", data=body, headers={"Content-Type": "application/json"})
-    with urlopen(req, timeout=8) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+    return transport.post_json(f"{mem_url}/tools/memory.write", {"data": payload}, timeout=8)
+
+@app.get("/http-stats")
+def http_stats():
+    """Connection reuse of this process's pooled session to the memory service."""
+    return {"ok": True, "http": transport.stats()}
 
 @app.get("/ping-mem")
 def ping_mem():